@@ -0,0 +1 @@
+"""HTTP API served alongside the bot (see main.py)."""
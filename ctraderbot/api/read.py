@@ -0,0 +1,175 @@
+# file: ctraderbot/api/read.py
+"""
+Read-only REST endpoints for dashboards.
+
+Live books (positions, trade couples) are copied on the reactor thread
+from the bot's memory, so they never touch the database. With
+SHARED_BOOKS they are read from the shared-memory segment the bot
+publishes instead (see shm_books.py): no reactor round trip, and it
+works when the API runs in a different process from the bot. History
+(trades, trade details, segments) is paged newest-first by primary key:
+`?before_id=<last id seen>` continues a listing without OFFSET scans.
+Every response carries an ETag and honours If-None-Match; history pages
+are also cached for API_CACHE_TTL seconds.
+"""
+import datetime as dt
+import hashlib
+import json
+import threading
+import time
+from decimal import Decimal
+
+from fastapi import APIRouter, HTTPException, Request, Response
+from sqlalchemy import select
+
+from ..money import book_view
+from ..settings import API_CACHE_TTL, API_PAGE_LIMIT, SHARED_BOOKS_INTERVAL
+
+_MAX_CACHE_ENTRIES = 1024
+
+_cache: dict[str, tuple[float, bytes, str]] = {}
+_cache_lock = threading.Lock()
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.isoformat()
+    if isinstance(value, set):
+        return sorted(value)
+    return str(value)
+
+
+def _encode(payload) -> tuple[bytes, str]:
+    body = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+    return body, '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _respond(request: Request, body: bytes, etag: str, max_age: float) -> Response:
+    headers = {"ETag": etag, "Cache-Control": f"max-age={int(max_age)}"}
+    if_none_match = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in if_none_match or "*" in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _cached(request: Request, build) -> Response:
+    """Serves the page for this exact URL from the cache, or builds and caches it."""
+    key = str(request.url)
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is None or entry[0] <= now:
+        body, etag = _encode(build())
+        entry = (now + API_CACHE_TTL, body, etag)
+        with _cache_lock:
+            if len(_cache) >= _MAX_CACHE_ENTRIES:
+                for stale in [k for k, v in _cache.items() if v[0] <= now] or list(_cache)[:_MAX_CACHE_ENTRIES // 4]:
+                    _cache.pop(stale, None)
+            _cache[key] = entry
+    return _respond(request, entry[1], entry[2], API_CACHE_TTL)
+
+
+def _row_to_dict(row) -> dict:
+    return {column.name: getattr(row, column.key) for column in row.__mapper__.columns}
+
+
+def fetch_page(model, before_id: int | None, limit: int, **filters) -> dict:
+    """One newest-first page of `model` rows, plus the cursor for the next page."""
+    from ..database import SessionSync
+
+    query = select(model).order_by(model.id.desc()).limit(limit)
+    if before_id is not None:
+        query = query.where(model.id < before_id)
+    for name, value in filters.items():
+        if value is not None:
+            query = query.where(getattr(model, name) == value)
+
+    with SessionSync() as s:
+        rows = [_row_to_dict(row) for row in s.execute(query).scalars()]
+    return {
+        "items": rows,
+        "next_before_id": rows[-1]["id"] if len(rows) == limit else None,
+    }
+
+
+def _clamp(limit: int) -> int:
+    return min(max(limit, 1), API_PAGE_LIMIT)
+
+
+def shared_books_stale_after() -> float:
+    """Seconds without a publish after which a reader re-maps the segment."""
+    return max(5 * SHARED_BOOKS_INTERVAL, 5.0)
+
+
+def _shared_position_view(data: dict) -> dict:
+    return book_view({k: v for k, v in data.items() if k != "symbol"})
+
+
+def build_read_router(get_bot, shared_books=None) -> APIRouter:
+    """
+    `get_bot()` returns the running SimpleBot, or None. `shared_books` is
+    an optional SharedBooksReader, preferred over the bot's memory.
+    """
+    router = APIRouter()
+
+    def _shared():
+        if shared_books is None:
+            return None
+        return shared_books.books(stale_after=shared_books_stale_after())
+
+    def _snapshot(copy):
+        from twisted.internet import reactor
+        from twisted.internet.threads import blockingCallFromThread
+
+        bot = get_bot()
+        if not bot or not reactor.running:
+            raise HTTPException(status_code=503, detail="Bot is not currently running.")
+        # The books are mutated on the reactor thread; copy them there
+        return blockingCallFromThread(reactor, copy, bot)
+
+    @router.get("/positions")
+    def positions(request: Request):
+        shared = _shared()
+        if shared is not None:
+            books = {
+                "positions": [{"positionId": pid, **_shared_position_view(data)}
+                              for pid, data in shared["positions"].items()],
+                "latest_price": shared["summary"]["latest_price"],
+            }
+            return _respond(request, *_encode(books), max_age=0)
+        books = _snapshot(lambda bot: {
+            "positions": [{"positionId": pid, **book_view(data)} for pid, data in bot.positions.items()],
+            "latest_price": bot.latest_price,
+        })
+        return _respond(request, *_encode(books), max_age=0)
+
+    @router.get("/trade-couples")
+    def trade_couples(request: Request):
+        shared = _shared()
+        if shared is not None:
+            books = {"trade_couples": [book_view(c) for c in shared["trade_couples"].values()]}
+            return _respond(request, *_encode(books), max_age=0)
+        books = _snapshot(lambda bot: {"trade_couples": [book_view(c) for c in bot.trade_couple.values()]})
+        return _respond(request, *_encode(books), max_age=0)
+
+    @router.get("/trades")
+    def trades(request: Request, before_id: int | None = None, limit: int = 100,
+               status: str | None = None, segment_id: int | None = None):
+        from ..models import Trades
+        return _cached(request, lambda: fetch_page(Trades, before_id, _clamp(limit), status=status, segment_id=segment_id))
+
+    @router.get("/trade-details")
+    def trade_details(request: Request, before_id: int | None = None, limit: int = 100,
+                      trade_id: int | None = None, status: str | None = None):
+        from ..models import TradeDetail
+        return _cached(request, lambda: fetch_page(TradeDetail, before_id, _clamp(limit), trade_id=trade_id, status=status))
+
+    @router.get("/segments")
+    def segments(request: Request, before_id: int | None = None, limit: int = 100,
+                 status: str | None = None, is_pivot: bool | None = None):
+        from ..models import Segments
+        return _cached(request, lambda: fetch_page(Segments, before_id, _clamp(limit), status=status, is_pivot=is_pivot))
+
+    return router
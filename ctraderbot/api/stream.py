@@ -0,0 +1,217 @@
+# file: ctraderbot/api/stream.py
+"""
+Snapshot-plus-delta stream behind the /ws/positions websocket.
+
+The stream keeps a mirror of the dashboard view ({"positions": {...},
+"trade_couples": {...}}, keyed by string ids). A client gets the full
+mirror on connect:
+
+    {"type": "snapshot", "seq": 41, "positions": {...}, "trade_couples": {...}}
+
+and then one message per change, carrying only the fields that changed:
+
+    {"type": "delta", "seq": 42, "positions": {"123": {"netUnrealisedPnL": 1.5}},
+     "removed": {"positions": ["456"]}}
+
+`seq` grows by one per delta. A client that sees a gap sends "resync"
+and receives a fresh snapshot. Connect with `?encoding=msgpack` to get
+binary msgpack frames instead of JSON text.
+
+Updates arrive through /broadcast (PnL ticks); the mirror is also
+re-read from the bot's books on connect, on resync and every
+WS_BOOKS_REFRESH_INTERVAL seconds, which picks up new, closed and
+removed positions and trade couples. With a SharedBooksReader the books
+are read from shared memory instead of the reactor thread, every
+SHARED_BOOKS_INTERVAL seconds.
+
+Changes to the mirror and the frames they produce go out under one lock,
+as do snapshots, so every client sees its snapshot and deltas in seq order.
+"""
+import asyncio
+import json
+
+import msgpack
+from fastapi import WebSocket
+
+from .read import _json_default, shared_books_stale_after
+from ..money import book_view
+from ..settings import WS_BOOKS_REFRESH_INTERVAL, SHARED_BOOKS_INTERVAL
+
+SECTIONS = ("positions", "trade_couples")
+ENCODINGS = ("json", "msgpack")
+
+
+def _jsonable(value):
+    return json.loads(json.dumps(value, default=_json_default))
+
+
+def _diff(old: dict, new: dict) -> tuple[dict, list]:
+    """Per-key changed fields from `old` to `new`, plus the keys that disappeared."""
+    changed = {}
+    for key, fields in new.items():
+        before = old.get(key)
+        if before is None:
+            changed[key] = fields
+            continue
+        fields_changed = {f: v for f, v in fields.items() if before.get(f) != v}
+        if fields_changed:
+            changed[key] = fields_changed
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+def _copy_books(bot) -> dict:
+    """Runs on the reactor thread: the bot's books in the dashboard's shape."""
+    from ..bot.pnl_event import position_payload
+    from ..bot.symbol_cache import symbol_for
+
+    return _jsonable({
+        "positions": {
+            str(pid): position_payload(pid, data, symbol_for(bot, data.get("symbolId")))
+            for pid, data in bot.positions.items()
+        },
+        "trade_couples": {str(tid): book_view(couple) for tid, couple in bot.trade_couple.items()},
+    })
+
+
+def _shared_books_view(books: dict) -> dict:
+    """Books read from shared memory, in the dashboard's shape."""
+    from ..bot.pnl_event import position_payload
+    from ..symbols import DEFAULT_SYMBOL
+
+    return _jsonable({
+        "positions": {
+            str(pid): position_payload(pid, data, data["symbol"] or DEFAULT_SYMBOL)
+            for pid, data in books["positions"].items()
+        },
+        "trade_couples": {str(tid): book_view(couple) for tid, couple in books["trade_couples"].items()},
+    })
+
+
+class PositionStream:
+    def __init__(self, get_bot, shared_books=None):
+        self.get_bot = get_bot
+        self.shared_books = shared_books
+        self.seq = 0
+        self.state: dict[str, dict] = {section: {} for section in SECTIONS}
+        self.clients: dict[WebSocket, str] = {}
+        self.refresh_task: asyncio.Task | None = None
+        # Held while the mirror changes and its frames are sent
+        self.lock = asyncio.Lock()
+
+    # --- Clients ---
+
+    async def connect(self, websocket: WebSocket, encoding: str = "json"):
+        await websocket.accept()
+        if encoding not in ENCODINGS:
+            await websocket.close(code=1003, reason=f"Unknown encoding {encoding!r}")
+            return False
+        await self.refresh_from_books()
+        async with self.lock:
+            self.clients[websocket] = encoding
+            await self._send(websocket, encoding, self.snapshot())
+
+        if self.refresh_task is None or self.refresh_task.done():
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+        return True
+
+    def disconnect(self, websocket: WebSocket):
+        self.clients.pop(websocket, None)
+
+    async def resync(self, websocket: WebSocket):
+        await self.refresh_from_books()
+        async with self.lock:
+            encoding = self.clients.get(websocket)
+            if encoding:
+                await self._send(websocket, encoding, self.snapshot())
+
+    def snapshot(self) -> dict:
+        return {"type": "snapshot", "seq": self.seq, **self.state}
+
+    # --- Updates ---
+
+    async def publish(self, section: str, key, fields: dict):
+        """Merges one entry's fields into the mirror and streams what changed."""
+        key = str(key)
+        fields = _jsonable(fields)
+        async with self.lock:
+            old = self.state[section].get(key)
+            new = {**old, **fields} if old else fields
+            changed, _ = _diff({key: old} if old else {}, {key: new})
+            self.state[section][key] = new
+            if changed:
+                await self._emit({section: changed}, {})
+
+    async def refresh_from_books(self):
+        """Re-reads the bot's books and streams the difference to the mirror."""
+        from twisted.internet import reactor
+        from twisted.internet.threads import blockingCallFromThread
+
+        shared = self.shared_books.books(shared_books_stale_after()) if self.shared_books else None
+        if shared is not None:
+            books = _shared_books_view(shared)
+        else:
+            bot = self.get_bot()
+            if not bot or not reactor.running:
+                return
+            try:
+                books = await asyncio.to_thread(blockingCallFromThread, reactor, _copy_books, bot)
+            except Exception as e:
+                print(f"[WS] Could not read the bot's books: {e}")
+                return
+
+        async with self.lock:
+            changes, removals = {}, {}
+            for section in SECTIONS:
+                changed, removed = _diff(self.state[section], books[section])
+                if changed:
+                    changes[section] = changed
+                if removed:
+                    removals[section] = removed
+            self.state = books
+            if changes or removals:
+                await self._emit(changes, removals)
+
+    async def _refresh_loop(self):
+        while self.clients:
+            await asyncio.sleep(SHARED_BOOKS_INTERVAL if self.shared_books else WS_BOOKS_REFRESH_INTERVAL)
+            await self.refresh_from_books()
+
+    # --- Sending ---
+
+    async def _emit(self, changes: dict, removals: dict):
+        """Streams one delta to every client. Call with self.lock held."""
+        self.seq += 1
+        delta = {"type": "delta", "seq": self.seq, **changes}
+        if removals:
+            delta["removed"] = removals
+
+        # Encode once per encoding, not once per client
+        frames = {}
+        dead = []
+        for websocket, encoding in list(self.clients.items()):
+            if encoding not in frames:
+                frames[encoding] = self._encode(delta, encoding)
+            try:
+                await self._send_frame(websocket, frames[encoding])
+            except Exception as e:
+                print(f"[WS] Dropping client: {e}")
+                dead.append(websocket)
+        for websocket in dead:
+            self.disconnect(websocket)
+
+    @staticmethod
+    def _encode(message: dict, encoding: str):
+        if encoding == "msgpack":
+            return msgpack.packb(message)
+        return json.dumps(message, separators=(",", ":"))
+
+    async def _send(self, websocket, encoding, message):
+        await self._send_frame(websocket, self._encode(message, encoding))
+
+    @staticmethod
+    async def _send_frame(websocket, frame):
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
@@ -0,0 +1 @@
+"""Backtesting of the segment/milestone strategy over recorded ticks."""
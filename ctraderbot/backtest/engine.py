@@ -0,0 +1,264 @@
+# file: ctraderbot/backtest/engine.py
+"""
+Event-driven backtest of the hedge/segment strategy over recorded ticks.
+
+Every running segment holds one trade: a long and a short of the
+milestone's lot size, opened on the same tick. Because each leg's
+thresholds are fixed while it is open, its exit is simply the first tick
+where the price crosses one of two levels, and that scan is vectorized.
+Legs are then processed in exit order through the same rules the live
+bot uses (ctraderbot.strategy): each leg is held against half the
+segment balance, and a trade leaves the segment balance as it was (the
+live bot only records the trade's ending balance, which decides whether
+the segment reached the ending level). With `compound_segments` a
+successful trade's PnL is added to its segment's balance instead, which
+the live bot does not do.
+
+Net and equity are account-level: the PnL of every closed leg against
+the capital injected by pivots.
+
+Simplifications: PnL is quoted in the account currency (e.g. EURUSD on
+a USD account), commission and swap are ignored, and a segment opens its
+next trade on the tick after the previous one finished.
+"""
+import heapq
+import math
+
+import numpy as np
+
+from ..strategy import (
+    LOT_UNITS,
+    LIQUIDATED,
+    SUCCESSFUL,
+    pnl_limits,
+    side_outcome,
+    resulted_balance,
+    should_extend_segment,
+    split_pivot_balance,
+    milestone_for_balance,
+)
+
+# cTrader prices are integers scaled by 10^5
+PRICE_SCALE = 100_000
+
+DEFAULT_PARAMS = {
+    "extend_multiple": 2.0,
+    "liquidation_floor": 0.0,
+    "profit_scale": 1.0,      # scales each milestone's ending_balance - starting_balance
+    "lot_scale": 1.0,         # scales each milestone's lot size
+    "ending_level": None,     # segment balance at which a segment is done (None = never)
+    "max_pivots": 100,        # fresh pivots (capital injections) allowed after liquidations
+    "compound_segments": False,  # add successful trades' PnL to the segment balance (not live behaviour)
+}
+
+_FIRST_WINDOW = 4096
+_MAX_WINDOW = 1 << 18
+
+
+def build_ladder(milestones, profit_scale=1.0, lot_scale=1.0) -> list[dict]:
+    """Applies the sweep multipliers to the milestone ladder (sorted by starting balance)."""
+    ladder = []
+    for m in sorted(milestones, key=lambda m: float(m["starting_balance"])):
+        start = float(m["starting_balance"])
+        ladder.append({
+            "id": m["id"],
+            "starting_balance": start,
+            "ending_balance": start + (float(m["ending_balance"]) - start) * profit_scale,
+            "lot_size": float(m["lot_size"]) * lot_scale,
+        })
+    return ladder
+
+
+def first_cross(prices: np.ndarray, start: int, below: int, above: int) -> int:
+    """First index >= start with price <= below or price > above; len(prices) if none."""
+    n = len(prices)
+    i, window = start, _FIRST_WINDOW
+    while i < n:
+        j = min(i + window, n)
+        chunk = prices[i:j]
+        hits = np.flatnonzero((chunk <= below) | (chunk > above))
+        if hits.size:
+            return i + int(hits[0])
+        i, window = j, min(window * 2, _MAX_WINDOW)
+    return n
+
+
+class _Backtest:
+    def __init__(self, ticks, ladder, initial_level_id, params):
+        self.bid = np.asarray(ticks["bid"])
+        self.ask = np.asarray(ticks["ask"])
+        self.n = len(self.bid)
+        self.ladder = ladder
+        self.initial = next(m for m in ladder if m["id"] == initial_level_id)
+        self.p = params
+
+        self.segments = []
+        self.events = []          # heap of (exit_index, seq, trade, side)
+        self.seq = 0
+        self.stats = {
+            "trades": 0, "trades_successful": 0, "trades_liquidated": 0,
+            "legs_successful": 0, "legs_liquidated": 0,
+            "segments_created": 0, "segments_successful": 0, "segments_liquidated": 0,
+            "pivots_started": 0, "capital_injected": 0.0, "max_segments_running": 0,
+            "realised_pnl": 0.0,
+        }
+
+    # Segments
+
+    def _new_segment(self, balance, is_pivot, index):
+        segment = {"balance": balance, "is_pivot": is_pivot, "status": "running"}
+        self.segments.append(segment)
+        self.stats["segments_created"] += 1
+        running = sum(1 for s in self.segments if s["status"] == "running")
+        self.stats["max_segments_running"] = max(self.stats["max_segments_running"], running)
+        self._open_trade(segment, index)
+        return segment
+
+    def _start_pivot(self, index):
+        if self.stats["pivots_started"] >= self.p["max_pivots"]:
+            return
+        self.stats["pivots_started"] += 1
+        self.stats["capital_injected"] += self.initial["starting_balance"]
+        self._new_segment(self.initial["starting_balance"], True, index)
+
+    def _level_for(self, balance):
+        milestone = milestone_for_balance(self.ladder, balance)
+        if milestone is None:
+            # Past the top of the ladder: stay on the highest level reached
+            reached = [m for m in self.ladder if m["starting_balance"] <= balance]
+            milestone = reached[-1] if reached else self.initial
+        return milestone
+
+    # Trades
+
+    def _open_trade(self, segment, index):
+        if index >= self.n:
+            return
+        milestone = self._level_for(segment["balance"])
+        units = milestone["lot_size"] * LOT_UNITS
+        trade = {
+            "segment": segment,
+            # As in the live bot, each leg is held against half the segment balance
+            "balance": segment["balance"] / 2,
+            "ending_balance": milestone["ending_balance"],
+            "units": units,
+            "open": 2,
+            "pnl": 0.0,
+            "final_status": None,
+            "resulted_balance": None,
+        }
+        self.stats["trades"] += 1
+
+        loss_limit, profit_target = pnl_limits(trade["balance"], trade["ending_balance"], self.p["liquidation_floor"])
+        points_per_money = PRICE_SCALE / units
+
+        # Long: enters at the ask, marked at the bid. pnl = (bid - entry) / points_per_money
+        long_entry = int(self.ask[index])
+        long_exit = first_cross(
+            self.bid, index + 1,
+            long_entry + math.floor(loss_limit * points_per_money),
+            long_entry + math.floor(profit_target * points_per_money),
+        )
+        # Short: enters at the bid, marked at the ask. pnl = (entry - ask) / points_per_money
+        short_entry = int(self.bid[index])
+        short_exit = first_cross(
+            self.ask, index + 1,
+            short_entry + math.ceil(-profit_target * points_per_money) - 1,
+            short_entry + math.ceil(-loss_limit * points_per_money) - 1,
+        )
+
+        trade["long_entry"], trade["short_entry"] = long_entry, short_entry
+        self._push(long_exit, trade, "long")
+        self._push(short_exit, trade, "short")
+        segment["trade"] = trade
+
+    def _push(self, exit_index, trade, side):
+        if exit_index < self.n:
+            heapq.heappush(self.events, (exit_index, self.seq, trade, side))
+            self.seq += 1
+
+    def _close_leg(self, index, trade, side):
+        if side == "long":
+            pnl = (int(self.bid[index]) - trade["long_entry"]) * trade["units"] / PRICE_SCALE
+        else:
+            pnl = (trade["short_entry"] - int(self.ask[index])) * trade["units"] / PRICE_SCALE
+
+        outcome = side_outcome(trade["balance"], pnl, trade["ending_balance"], self.p["liquidation_floor"])
+        if outcome is None:
+            # Integer price levels vs float PnL: the level was crossed, so resolve by sign
+            outcome = SUCCESSFUL if pnl > 0 else LIQUIDATED
+        self.stats["legs_successful" if outcome == SUCCESSFUL else "legs_liquidated"] += 1
+        self.stats["realised_pnl"] += pnl
+        trade["pnl"] += pnl
+
+        # As in the live bot, the last leg to close decides the trade's status and balance
+        trade["final_status"] = outcome
+        trade["resulted_balance"] = resulted_balance(trade["balance"], pnl, outcome)
+        trade["open"] -= 1
+        if trade["open"] == 0:
+            self._finish_trade(index, trade)
+
+    def _finish_trade(self, index, trade):
+        segment = trade["segment"]
+        segment["trade"] = None
+
+        if trade["final_status"] == LIQUIDATED:
+            self.stats["trades_liquidated"] += 1
+            segment["status"] = "liquidated"
+            self.stats["segments_liquidated"] += 1
+            if segment["is_pivot"]:
+                segment["is_pivot"] = False
+                successor = next((s for s in self.segments if s["status"] == "running"), None)
+                if successor is not None:
+                    successor["is_pivot"] = True
+        else:
+            self.stats["trades_successful"] += 1
+            if self.p["compound_segments"]:
+                segment["balance"] += trade["pnl"]
+                reached = segment["balance"]
+            else:
+                # update_parent_trade_status: the trade's ending balance, not the segment's, is checked
+                reached = trade["resulted_balance"]
+            ending_level = self.p["ending_level"]
+            if ending_level is not None and reached >= ending_level:
+                segment["status"] = "successful"
+                self.stats["segments_successful"] += 1
+
+        self._after_trade(index + 1, segment)
+
+    def _after_trade(self, index, segment):
+        """Mirror of _get_or_create_segment_and_trade, run after every finished trade."""
+        pivot = next((s for s in self.segments if s["is_pivot"] and s["status"] == "running"), None)
+        if pivot is None:
+            self._start_pivot(index)
+        elif pivot is segment and should_extend_segment(
+                pivot["balance"], self.initial["starting_balance"], self.p["extend_multiple"]):
+            pivot["balance"], given = split_pivot_balance(pivot["balance"], self.initial["starting_balance"])
+            self._new_segment(given, False, index)
+
+        if segment["status"] == "running" and segment.get("trade") is None:
+            self._open_trade(segment, index)
+
+    def run(self):
+        self._start_pivot(0)
+        while self.events:
+            index, _, trade, side = heapq.heappop(self.events)
+            self._close_leg(index, trade, side)
+
+        stats = self.stats
+        running = [s for s in self.segments if s["status"] == "running"]
+        stats["segments_running"] = len(running)
+        stats["open_trades"] = sum(1 for s in running if s.get("trade"))
+        stats["net"] = stats["realised_pnl"]
+        stats["final_equity"] = stats["capital_injected"] + stats["net"]
+        return stats
+
+
+def run_backtest(ticks, milestones, initial_level_id, params=None) -> dict:
+    """
+    Runs one parameter set over `ticks` ({"bid", "ask"} int64 arrays in
+    points) and returns the summary stats.
+    """
+    p = {**DEFAULT_PARAMS, **(params or {})}
+    ladder = build_ladder(milestones, p["profit_scale"], p["lot_scale"])
+    return _Backtest(ticks, ladder, initial_level_id, p).run()
@@ -0,0 +1,177 @@
+# file: ctraderbot/backtest/sweep.py
+"""
+Parameter sweeps of the backtester across a process pool.
+
+Each worker memory-maps the tick range once (see history/tick_store.py)
+and then runs grid points as they are handed out. Results are gathered
+into one NumPy structured array — one row per grid point — and saved as
+a compact .npy table.
+
+    python -m ctraderbot.backtest.sweep --symbol 1 --from 2024-01-01 --to 2024-04-01 \\
+        --extend-multiple 1.5 2 3 --profit-scale 0.8 1 1.25 --lot-scale 0.5 1 --scaling
+"""
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .engine import DEFAULT_PARAMS, run_backtest
+
+GRID_KEYS = ("extend_multiple", "liquidation_floor", "profit_scale", "lot_scale")
+RESULT_KEYS = (
+    "net", "final_equity", "capital_injected",
+    "trades", "trades_successful", "trades_liquidated",
+    "segments_created", "segments_successful", "segments_liquidated",
+    "pivots_started", "max_segments_running", "open_trades",
+)
+
+# Per-process state, filled by _init_worker
+_worker = {}
+
+
+def expand_grid(grid: dict[str, list]) -> list[dict]:
+    """{"a": [1, 2], "b": [3]} -> [{"a": 1, "b": 3}, {"a": 2, "b": 3}]"""
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def _init_worker(tick_root, symbol_id, start_ms, end_ms, milestones, initial_level_id, fixed_params):
+    from ..history.tick_store import read_ticks
+
+    _worker["ticks"] = read_ticks(tick_root, symbol_id, start_ms, end_ms)
+    _worker["milestones"] = milestones
+    _worker["initial_level_id"] = initial_level_id
+    _worker["fixed_params"] = fixed_params
+
+
+def _run_point(point: dict) -> dict:
+    params = {**_worker["fixed_params"], **point}
+    return run_backtest(_worker["ticks"], _worker["milestones"], _worker["initial_level_id"], params)
+
+
+def run_sweep(points, tick_root, symbol_id, start_ms, end_ms, milestones, initial_level_id,
+              fixed_params=None, processes=None) -> np.ndarray:
+    """Runs every grid point and returns the results table."""
+    processes = processes or os.cpu_count()
+    initargs = (tick_root, symbol_id, start_ms, end_ms, milestones, initial_level_id, fixed_params or {})
+    # Small chunks keep the pool balanced when some grid points run much longer
+    chunksize = max(1, len(points) // (processes * 4))
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=initargs) as pool:
+        results = list(pool.map(_run_point, points, chunksize=chunksize))
+    return results_table(points, results)
+
+
+def results_table(points, results) -> np.ndarray:
+    dtype = [(k, "f8") for k in GRID_KEYS] + [(k, "f8") for k in RESULT_KEYS]
+    table = np.zeros(len(points), dtype=dtype)
+    for i, (point, result) in enumerate(zip(points, results)):
+        row = {**DEFAULT_PARAMS, **point, **result}
+        table[i] = tuple(float(row[k]) for k in GRID_KEYS + RESULT_KEYS)
+    return table
+
+
+def print_table(table: np.ndarray, top: int = 10):
+    ranked = np.sort(table, order="net")[::-1][:top]
+    columns = GRID_KEYS + ("net", "trades", "trades_liquidated", "segments_created", "pivots_started")
+    print(" | ".join(f"{c:>18}" for c in columns))
+    for row in ranked:
+        print(" | ".join(f"{row[c]:>18.4g}" for c in columns))
+
+
+def measure_scaling(points, core_counts, **sweep_args) -> list[dict]:
+    """Wall-clock of the same sweep for each pool size, with speedup against one core."""
+    report = []
+    for count in core_counts:
+        started = time.perf_counter()
+        run_sweep(points, processes=count, **sweep_args)
+        elapsed = time.perf_counter() - started
+        baseline = report[0]["seconds"] if report else elapsed
+        report.append({
+            "processes": count,
+            "seconds": elapsed,
+            "speedup": baseline / elapsed,
+            "efficiency": baseline / elapsed / count,
+            "points_per_s": len(points) / elapsed,
+        })
+        print(f"[BACKTEST] {count:>3} process(es): {elapsed:8.2f}s | speedup x{report[-1]['speedup']:.2f} "
+              f"| efficiency {report[-1]['efficiency']:.0%} | {report[-1]['points_per_s']:.1f} points/s")
+    return report
+
+
+def _core_counts(maximum):
+    counts, n = [], 1
+    while n < maximum:
+        counts.append(n)
+        n *= 2
+    return counts + [maximum]
+
+
+def _load_strategy_config():
+    """Milestone ladder plus initial/ending levels from the bot's database."""
+    from ..database import SessionSync
+    from ..models import Milestone, Constant
+
+    with SessionSync() as s:
+        milestones = [
+            {"id": m.id, "starting_balance": float(m.starting_balance),
+             "ending_balance": float(m.ending_balance), "lot_size": float(m.lot_size)}
+            for m in s.query(Milestone).all()
+        ]
+        constants = {
+            c.variable: c.value
+            for c in s.query(Constant).filter(Constant.is_active == True).all()
+        }
+    ending_level = constants.get("ending_level")
+    return milestones, int(constants["initial_level"]), float(ending_level) if ending_level else None
+
+
+def main():
+    import argparse
+    import datetime as dt
+    from ..settings import TICK_STORE_DIR, SYMBOL_ID
+
+    parser = argparse.ArgumentParser(description="Sweep strategy parameters over recorded ticks")
+    parser.add_argument("--symbol", type=int, default=SYMBOL_ID)
+    parser.add_argument("--from", dest="start", required=True, help="UTC start date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", required=True, help="UTC end date (exclusive), YYYY-MM-DD")
+    parser.add_argument("--ticks", default=TICK_STORE_DIR, help="Tick store root")
+    for key in GRID_KEYS:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=float, nargs="+", default=[DEFAULT_PARAMS[key]])
+    parser.add_argument("--max-pivots", type=int, default=DEFAULT_PARAMS["max_pivots"])
+    parser.add_argument("--compound-segments", action="store_true",
+                        help="Add successful trades' PnL to the segment balance (the live bot does not)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--scaling", action="store_true", help="Also time the sweep at 1, 2, 4, ... processes")
+    parser.add_argument("--out", default="backtest_results.npy")
+    args = parser.parse_args()
+
+    def to_ms(day):
+        return int(dt.datetime.fromisoformat(day).replace(tzinfo=dt.timezone.utc).timestamp() * 1000)
+
+    milestones, initial_level_id, ending_level = _load_strategy_config()
+    points = expand_grid({key: getattr(args, key) for key in GRID_KEYS})
+    sweep_args = {
+        "tick_root": args.ticks, "symbol_id": args.symbol,
+        "start_ms": to_ms(args.start), "end_ms": to_ms(args.end),
+        "milestones": milestones, "initial_level_id": initial_level_id,
+        "fixed_params": {"ending_level": ending_level, "max_pivots": args.max_pivots,
+                         "compound_segments": args.compound_segments},
+    }
+
+    print(f"[BACKTEST] {len(points)} grid point(s) on {args.processes} process(es).")
+    started = time.perf_counter()
+    table = run_sweep(points, processes=args.processes, **sweep_args)
+    print(f"[BACKTEST] Sweep finished in {time.perf_counter() - started:.2f}s.")
+    np.save(args.out, table)
+    print(f"[BACKTEST] Results table ({table.nbytes} bytes) saved to {args.out}.")
+    print_table(table)
+
+    if args.scaling:
+        measure_scaling(points, _core_counts(args.processes), **sweep_args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# file: ctraderbot/bot/account_state.py
+"""
+In-memory account balance and equity.
+
+The balance follows the server's pushes instead of being re-read:
+ProtoOATraderUpdatedEvent, the closing details of deals and
+ProtoOATraderRes all carry the balance with a balanceVersion, and only a
+newer version replaces the current value. Equity is the balance plus the
+open positions' unrealised net PnL, refreshed on every PnL response.
+Both are money ints (see money.py).
+
+Subaccount.balance is written by a debounced background writer: bursts of
+updates are coalesced into one UPDATE at most every
+BALANCE_WRITE_DEBOUNCE seconds, and only the latest value is written.
+"""
+import time
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThread
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import ProtoOATraderReq
+from ..helpers import update_account_balance_in_db
+from ..money import api_money, to_decimal, to_float
+from ..settings import BALANCE_WRITE_DEBOUNCE
+from .leader import is_leader
+from .decoding import decode
+from .outbound import send
+
+
+def new_account_state() -> dict:
+    return {
+        "balance": None,
+        "balance_version": None,
+        "equity": None,
+        "source": None,
+        "updated_at": None,
+        "cycle_pending": False,    # a trade cycle waits for the next ProtoOATraderRes
+        "writer": {
+            "timer": None,
+            "in_flight": False,
+            "written": None,
+            "writes": 0,
+            "coalesced": 0,
+            "failed": 0,
+        },
+    }
+
+
+def apply_balance(bot, balance: int, version=None, source="trader") -> bool:
+    """Sets the balance (money int) unless `version` is older than the one we hold."""
+    account = bot.account
+    current = account["balance_version"]
+    if version is not None and current is not None and version < current:
+        return False
+    if version is not None:
+        account["balance_version"] = version
+
+    changed = balance != account["balance"]
+    account["balance"] = balance
+    account["source"] = source
+    account["updated_at"] = time.time()
+    bot.current_balance = balance
+    if changed:
+        print(f"[ACCOUNT] Balance {to_float(balance):.2f} (from {source}, version {version})")
+        update_equity(bot)
+        _schedule_write(bot)
+    return changed
+
+
+def apply_trader(bot, trader, source="trader") -> bool:
+    """ProtoOATrader (from ProtoOATraderRes or ProtoOATraderUpdatedEvent) -> balance."""
+    version = trader.balanceVersion if trader.HasField("balanceVersion") else None
+    digits = trader.moneyDigits if trader.HasField("moneyDigits") else 2
+    return apply_balance(bot, api_money(trader.balance, digits), version, source)
+
+
+def apply_deal(bot, deal) -> bool:
+    """Closing deals report the account balance right after the close."""
+    if not deal.HasField("closePositionDetail"):
+        return False
+    close = deal.closePositionDetail
+    digits = close.moneyDigits if close.HasField("moneyDigits") else 2
+    return apply_balance(bot, api_money(close.balance, digits), close.balanceVersion, "deal")
+
+
+def update_equity(bot):
+    """Balance plus the unrealised net PnL of every open position."""
+    balance = bot.account["balance"]
+    if balance is None:
+        return
+    unrealised = sum(p.get("unrealisedNetProfit") or 0
+                     for p in bot.positions.values() if p.get("status") == "OPEN")
+    bot.account["equity"] = balance + unrealised
+
+
+def request_trader(bot):
+    """Asks the server for the trader record; the Deferred fires with the balance (money int)."""
+    d = send(bot, ProtoOATraderReq(ctidTraderAccountId=bot.account_id))
+    d.addCallback(_on_trader_fetched, bot)
+    return d
+
+
+def _on_trader_fetched(msg, bot):
+    apply_trader(bot, Protobuf.extract(msg).trader)
+    return bot.account["balance"]
+
+
+def on_trader_res(bot, msg):
+    """ProtoOATraderRes: sync the balance and start the trade cycle that waited for it."""
+    apply_trader(bot, decode(msg).trader)
+    if bot.account["cycle_pending"]:
+        bot.account["cycle_pending"] = False
+        start_next_cycle(bot)
+
+
+def start_next_cycle(bot):
+    """
+    Starts the next trade cycle from the in-memory balance. Only when the
+    balance has never been seen does it wait for a ProtoOATraderRes.
+    """
+    from .trading import _get_or_create_segment_and_trade
+
+    if bot.account["balance"] is None:
+        print("[ACCOUNT] Balance unknown. Requesting trader info before the next cycle.")
+        bot.account["cycle_pending"] = True
+        send(bot, ProtoOATraderReq(ctidTraderAccountId=bot.account_id))
+        return
+    print(f"[>>>] Balance {to_float(bot.account['balance']):.2f} in memory. Starting new trade cycle.")
+    _get_or_create_segment_and_trade(bot)
+
+
+# --- Debounced DB writer ---
+
+def _schedule_write(bot):
+    writer = bot.account["writer"]
+    if writer["timer"] and writer["timer"].active():
+        writer["coalesced"] += 1
+        return
+    writer["timer"] = reactor.callLater(BALANCE_WRITE_DEBOUNCE, flush_balance, bot)
+
+
+def flush_balance(bot):
+    """Writes the latest balance now if it differs from the last one written."""
+    account = bot.account
+    writer = account["writer"]
+    if writer["timer"] and writer["timer"].active():
+        writer["timer"].cancel()
+    writer["timer"] = None
+    balance = account["balance"]
+    if writer["in_flight"] or balance is None or balance == writer["written"]:
+        return None
+    if not is_leader(bot):
+        # The leader writes the same balance; a standby keeps it in memory only
+        return None
+
+    writer["in_flight"] = True
+    d = deferToThread(update_account_balance_in_db, bot.account_pk, to_decimal(balance))
+    d.addCallbacks(_on_written, _on_write_failed, callbackArgs=(bot, balance), errbackArgs=(bot,))
+    return d
+
+
+def _on_written(_, bot, balance):
+    writer = bot.account["writer"]
+    writer["in_flight"] = False
+    writer["written"] = balance
+    writer["writes"] += 1
+    # The balance moved while we were writing: write the newer value too
+    if bot.account["balance"] != balance:
+        _schedule_write(bot)
+
+
+def _on_write_failed(failure, bot):
+    writer = bot.account["writer"]
+    writer["in_flight"] = False
+    writer["failed"] += 1
+    print(f"[ACCOUNT] Balance write failed: {failure.getErrorMessage()}. Retrying.")
+    if not bot.is_shutting_down:
+        _schedule_write(bot)
+
+
+def account_snapshot(bot) -> dict:
+    account = bot.account
+    writer = account["writer"]
+    return {
+        "balance": to_float(account["balance"]),
+        "equity": to_float(account["equity"]),
+        "balance_version": account["balance_version"],
+        "source": account["source"],
+        "updated_at": account["updated_at"],
+        "db_written": to_float(writer["written"]),
+        "db_writes": writer["writes"],
+        "db_coalesced": writer["coalesced"],
+        "db_failed": writer["failed"],
+    }
@@ -1,6 +1,13 @@
 from ctrader_open_api.messages.OpenApiMessages_pb2 import *
 # from .trading import send_market_order
 from twisted.internet.defer import ensureDeferred
+from ..settings import RECORD_TICKS
+from .symbol_cache import load_symbols
+from .leader import is_leader, start_standby, mark_ready
+from .outbound import send, session_ready, SESSION
+from .order_state import is_error_response
+from .decoding import decode
+from .token_refresh import TOKEN_ERROR_CODES
 
 def after_app_auth(bot):
     print("[✓] App authenticated. Authorizing account…")
@@ -8,19 +15,57 @@ def after_app_auth(bot):
         ctidTraderAccountId=bot.account_id,
         accessToken=bot.access_token
     )
-    bot.client.send(req)
+    send(bot, req, SESSION).addCallbacks(
+        check_auth_response, lambda f: print(f"[✖] Account auth got no response: {f.getErrorMessage()}"),
+        callbackArgs=(bot, "Account"),
+    )
+
+
+def check_auth_response(msg, bot, what):
+    """
+    Auth errors belong to the auth request, so on_message does not act on
+    them. A rejected token is refreshed by on_message; anything else stops the bot.
+    """
+    if is_error_response(msg):
+        err = decode(msg)
+        if err.errorCode not in TOKEN_ERROR_CODES:
+            from .stop_operation import graceful_shutdown
+
+            print(f"[✖] {what} auth rejected: {err.errorCode} {getattr(err, 'description', '')}. Shutting down.")
+            graceful_shutdown(bot)
+    return msg
 
 def after_account_auth(bot):
-    # Import the function right here, just before you use it.
-    from .trading import send_market_order
+    from .reconnect import resume_session
+
+    # Schedules are already running when we get here after a reconnect,
+    # so resume the existing session instead of bootstrapping again.
+    if bot.session_started:
+        print("[✓] Account re-authorized. Resuming session…")
+        resume_session(bot)
+        return
+
     print("[✓] Account authorized. Subscribing + sending order…")
-    # bot.client.send(ProtoOASubscribeSpotsReq(
-    #     ctidTraderAccountId=bot.account_id,
-    #     symbolId=[bot.symbol_id],
-    #     subscribeToSpotTimestamp=True,
-    # ))
+    if RECORD_TICKS:
+        bot.subscribed_symbols.add(bot.symbol_id)
+        send(bot, ProtoOASubscribeSpotsReq(
+            ctidTraderAccountId=bot.account_id,
+            symbolId=[bot.symbol_id],
+            subscribeToSpotTimestamp=True,
+        ), SESSION)
 
     # Create initial Segment here!
     
+    bot.session_started = True
+    bot.is_session_ready = True
+    session_ready(bot)
+
+    # Volumes and pips depend on the symbol's metadata: load it before trading
+    d = load_symbols(bot, {bot.symbol_id} | bot.subscribed_symbols)
+    d.addCallback(lambda _: _start_trading(bot) if is_leader(bot) else start_standby(bot))
+
+def _start_trading(bot):
+    from .trading import send_market_order
     send_market_order(bot)
     bot.start_schedules()
+    mark_ready(bot)
@@ -0,0 +1,87 @@
+# file: ctraderbot/bot/books_publisher.py
+"""
+Publishes bot.positions and bot.trade_couple to shared memory (SHARED_BOOKS).
+
+The books are written to the SHARED_BOOKS_NAME segment (see
+ctraderbot/shm_books.py) after every PnL response and every
+SHARED_BOOKS_INTERVAL seconds, which picks up fills, closes and new
+trade couples. Only records that changed are rewritten. Local readers,
+such as the control API in another process, map the segment and read it
+without going through the reactor.
+
+Only the leader publishes, so a standby on the same host can't overwrite
+the live books. A demoted bot lets go of the segment, and the next
+leader clears it and starts over.
+"""
+import time
+
+from ..settings import SHARED_BOOKS, SHARED_BOOKS_NAME, SHARED_BOOKS_SLOTS, SHARED_BOOKS_INTERVAL
+from ..shm_books import SharedBooksWriter
+from .leader import is_leader
+from .scheduler import schedule_interval
+from .symbol_cache import symbol_for
+
+PUBLISH_TASK = "shared_books"
+
+
+def new_shared_books(enabled: bool = SHARED_BOOKS) -> dict:
+    return {
+        "enabled": enabled,
+        "writer": None,
+        "publishes": 0,
+        "records_written": 0,
+        "errors": 0,
+        "last_publish_us": None,
+    }
+
+
+def start_shared_books(bot):
+    if bot.shared_books["enabled"]:
+        print(f"[SHM] Publishing books to shared memory {SHARED_BOOKS_NAME!r} ({SHARED_BOOKS_SLOTS} slots)")
+        schedule_interval(bot, PUBLISH_TASK, SHARED_BOOKS_INTERVAL, publish_books, bot)
+
+
+def publish_books(bot):
+    state = bot.shared_books
+    if not state["enabled"]:
+        return
+    if not is_leader(bot):
+        _release_writer(state)
+        return
+
+    started = time.perf_counter()
+    try:
+        if state["writer"] is None:
+            state["writer"] = SharedBooksWriter(SHARED_BOOKS_NAME, SHARED_BOOKS_SLOTS)
+        written = state["writer"].publish(bot.positions, bot.trade_couple, bot.latest_price,
+                                          lambda symbol_id: symbol_for(bot, symbol_id))
+    except (OSError, ValueError) as e:
+        state["errors"] += 1
+        print(f"[SHM] Could not publish the books: {e}")
+        _release_writer(state)
+        return
+    state["publishes"] += 1
+    state["records_written"] += written
+    state["last_publish_us"] = (time.perf_counter() - started) * 1e6
+
+
+def _release_writer(state, unlink=False):
+    writer, state["writer"] = state["writer"], None
+    if writer is not None:
+        writer.close(unlink=unlink)
+
+
+def stop_shared_books(bot):
+    """Removes the segment, so readers see no books rather than stale ones."""
+    _release_writer(bot.shared_books, unlink=True)
+
+
+def shared_books_snapshot(bot) -> dict:
+    state = bot.shared_books
+    writer = state["writer"]
+    return {
+        "enabled": state["enabled"],
+        "publishing": writer is not None,
+        "overflow": writer.overflow if writer is not None else 0,
+        **{k: v for k, v in state.items() if k not in ("enabled", "writer")},
+    }
@@ -0,0 +1,199 @@
+# file: ctraderbot/bot/deal_ledger.py
+"""
+In-memory deal ledger: every filled ProtoOADeal folded into a
+per-position aggregate.
+
+Deals arrive with execution events (record_deal) and, for anything
+missed while disconnected or before a restart, from ProtoOADealListReq
+pages over a time range (backfill_deals). Deal ids are remembered so a
+deal seen through both paths is counted once.
+
+An aggregate holds the commission of every deal on the position plus the
+gross profit, swap and conversion fees reported by its closing deals, all
+as money ints (see money.py). The final net profit of a position is
+therefore a lookup at close time (net_profit), with no extra request.
+"""
+import time
+
+from twisted.internet.defer import succeed
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import ProtoOADealListReq
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import ProtoOADealStatus
+from ..money import api_money
+from ..settings import DEAL_LIST_MAX_ROWS
+from .order_state import is_error_response
+from .outbound import send, HISTORY
+
+# The server rejects ProtoOADealListReq ranges longer than one week
+DEAL_LIST_MAX_SPAN_MS = 7 * 24 * 3600 * 1000
+
+_FILLED = {ProtoOADealStatus.FILLED, ProtoOADealStatus.PARTIALLY_FILLED}
+
+
+def new_deal_ledger() -> dict:
+    return {
+        "positions": {},      # position_id -> aggregate
+        "seen": set(),        # deal ids already folded in
+        "recorded": 0,
+        "backfilled": 0,
+        "last_backfill": None,
+    }
+
+
+def _new_aggregate(position_id) -> dict:
+    return {
+        "positionId": position_id,
+        "deal_ids": [],
+        "commission": 0,
+        "swap": 0,
+        "gross_profit": 0,
+        "conversion_fee": 0,
+        "filled_volume": 0,
+        "closed_volume": 0,
+        "close_price": None,
+        "balance": None,          # account balance after the last closing deal
+        "balance_version": None,
+        "opened_ms": None,
+        "closed_ms": None,
+    }
+
+
+def record_deal(bot, deal, source="execution") -> bool:
+    """Folds one deal into its position's aggregate. Returns False for duplicates and unfilled deals."""
+    ledger = bot.deal_ledger
+    if deal.dealStatus not in _FILLED or deal.dealId in ledger["seen"]:
+        return False
+    ledger["seen"].add(deal.dealId)
+    ledger["backfilled" if source == "backfill" else "recorded"] += 1
+
+    agg = ledger["positions"].get(deal.positionId)
+    if agg is None:
+        agg = ledger["positions"][deal.positionId] = _new_aggregate(deal.positionId)
+    agg["deal_ids"].append(deal.dealId)
+
+    digits = deal.moneyDigits if deal.HasField("moneyDigits") else 2
+    agg["commission"] += api_money(deal.commission, digits)
+    agg["filled_volume"] += deal.filledVolume
+    if agg["opened_ms"] is None or deal.executionTimestamp < agg["opened_ms"]:
+        agg["opened_ms"] = deal.executionTimestamp
+
+    if deal.HasField("closePositionDetail"):
+        close = deal.closePositionDetail
+        close_digits = close.moneyDigits if close.HasField("moneyDigits") else digits
+        agg["gross_profit"] += api_money(close.grossProfit, close_digits)
+        agg["swap"] += api_money(close.swap, close_digits)
+        agg["conversion_fee"] += api_money(close.pnlConversionFee, close_digits)
+        agg["closed_volume"] += close.closedVolume
+        if agg["closed_ms"] is None or deal.executionTimestamp >= agg["closed_ms"]:
+            agg["closed_ms"] = deal.executionTimestamp
+            agg["close_price"] = deal.executionPrice
+        if agg["balance_version"] is None or close.balanceVersion > agg["balance_version"]:
+            agg["balance_version"] = close.balanceVersion
+            agg["balance"] = api_money(close.balance, close_digits)
+    return True
+
+
+def position_deals(bot, position_id) -> dict | None:
+    return bot.deal_ledger["positions"].get(position_id)
+
+
+def net_profit(agg) -> int:
+    """Realised net profit of a position (money int): gross profit plus swap, commissions and fees."""
+    return agg["gross_profit"] + agg["swap"] + agg["commission"] + agg["conversion_fee"]
+
+
+def forget_position_deals(bot, position_id):
+    agg = bot.deal_ledger["positions"].pop(position_id, None)
+    if agg:
+        bot.deal_ledger["seen"].difference_update(agg["deal_ids"])
+
+
+def backfill_deals(bot, from_ms, to_ms=None, position_ids=None):
+    """
+    Pages through ProtoOADealListReq from `from_ms` to `to_ms` (default
+    now) and records every deal not seen yet, optionally only those of
+    `position_ids`. The Deferred fires with the number of deals added.
+    """
+    to_ms = to_ms or int(time.time() * 1000)
+    if from_ms >= to_ms:
+        return succeed(0)
+    wanted = set(position_ids) if position_ids is not None else None
+    state = {"added": 0, "pages": 0, "truncated": 0, "started": time.monotonic()}
+    print(f"[DEALS] Backfilling deals from {from_ms} to {to_ms}"
+          + (f" for positions {sorted(wanted)}" if wanted is not None else "") + "...")
+    d = _request_page(bot, from_ms, min(from_ms + DEAL_LIST_MAX_SPAN_MS, to_ms), to_ms, wanted, state)
+    d.addCallback(_on_backfill_done, bot, state)
+    d.addErrback(_on_backfill_failed, state)
+    return d
+
+
+def _request_page(bot, window_from, window_to, to_ms, wanted, state):
+    d = send(bot, ProtoOADealListReq(
+        ctidTraderAccountId=bot.account_id,
+        fromTimestamp=window_from,
+        toTimestamp=window_to,
+        maxRows=DEAL_LIST_MAX_ROWS,
+    ), HISTORY)
+    d.addCallback(_on_page, bot, window_from, window_to, to_ms, wanted, state)
+    return d
+
+
+def _on_page(msg, bot, window_from, window_to, to_ms, wanted, state):
+    if is_error_response(msg):
+        raise RuntimeError(f"deal list rejected: {getattr(Protobuf.extract(msg), 'errorCode', '')}")
+    res = Protobuf.extract(msg)
+    state["pages"] += 1
+
+    latest = window_from
+    for deal in res.deal:
+        latest = max(latest, deal.executionTimestamp)
+        if wanted is not None and deal.positionId not in wanted:
+            continue
+        if record_deal(bot, deal, source="backfill"):
+            state["added"] += 1
+
+    if res.hasMore and latest > window_from:
+        # Truncated page: continue from the newest deal (duplicates are skipped by id)
+        return _request_page(bot, latest, window_to, to_ms, wanted, state)
+    if res.hasMore and window_from + 1 < window_to:
+        # A full page inside one millisecond: the same request would return it
+        # again, so step past it. Deals beyond the page in that millisecond are missed.
+        state["truncated"] += 1
+        print(f"[DEALS] More than {DEAL_LIST_MAX_ROWS} deals at {window_from} ms; skipping to the next millisecond.")
+        return _request_page(bot, window_from + 1, window_to, to_ms, wanted, state)
+    if window_to < to_ms:
+        return _request_page(bot, window_to, min(window_to + DEAL_LIST_MAX_SPAN_MS, to_ms), to_ms, wanted, state)
+    return state["added"]
+
+
+def _on_backfill_done(added, bot, state):
+    elapsed = time.monotonic() - state["started"]
+    bot.deal_ledger["last_backfill"] = {"added": added, "pages": state["pages"],
+                                        "truncated": state["truncated"], "seconds": elapsed}
+    print(f"[DEALS] Backfill added {added} deal(s) in {state['pages']} page(s), {elapsed:.2f}s.")
+    return added
+
+
+def _on_backfill_failed(failure, state):
+    print(f"[DEALS] Backfill failed after {state['pages']} page(s): {failure.getErrorMessage()}")
+    return state["added"]
+
+
+def backfill_for_positions(bot, positions):
+    """Backfills the deals of server positions (ProtoOAPosition) we only learned about from a reconcile."""
+    positions = list(positions)
+    if not positions:
+        return succeed(0)
+    from_ms = min(p.tradeData.openTimestamp for p in positions)
+    return backfill_deals(bot, from_ms, position_ids=[p.positionId for p in positions])
+
+
+def ledger_snapshot(bot) -> dict:
+    ledger = bot.deal_ledger
+    return {
+        "positions": len(ledger["positions"]),
+        "deals": len(ledger["seen"]),
+        "recorded": ledger["recorded"],
+        "backfilled": ledger["backfilled"],
+        "last_backfill": ledger["last_backfill"],
+    }
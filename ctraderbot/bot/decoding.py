@@ -0,0 +1,80 @@
+# file: ctraderbot/bot/decoding.py
+"""
+Inbound decoding for on_message.
+
+A ProtoMessage arrives with its payload still as bytes. Routing only
+needs the envelope's payloadType, so the payload is parsed (decode) only
+for types a handler actually reads. Types in IGNORED are counted and
+dropped without decoding: heartbeats, spot-subscribe acks, and responses
+that their own request Deferreds consume. Unhandled types are counted and
+logged by name, never converted with MessageToDict.
+
+The message class for a payloadType is looked up once and cached.
+
+Run `python -m ctraderbot.bot.decoding_bench` to time the old if/elif +
+MessageToDict routing against this on a mixed message stream.
+"""
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiCommonModelMessages_pb2 import ProtoPayloadType
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import ProtoOAPayloadType as PT
+
+HEARTBEAT = ProtoPayloadType.HEARTBEAT_EVENT
+ERROR_RES = ProtoPayloadType.ERROR_RES
+
+# Dropped without decoding. Responses here are read by the Deferred of their request.
+IGNORED = frozenset({
+    HEARTBEAT,                               # counted by the health monitor
+    PT.PROTO_OA_VERSION_RES,                 # latency probe
+    PT.PROTO_OA_SUBSCRIBE_SPOTS_RES,
+    PT.PROTO_OA_UNSUBSCRIBE_SPOTS_RES,
+    PT.PROTO_OA_GET_TRENDBARS_RES,           # history downloader
+    PT.PROTO_OA_GET_TICKDATA_RES,
+    PT.PROTO_OA_SYMBOLS_LIST_RES,            # symbol cache
+    PT.PROTO_OA_SYMBOL_BY_ID_RES,
+    PT.PROTO_OA_DEAL_LIST_RES,               # deal ledger backfill
+    PT.PROTO_OA_RECONCILE_RES,               # reconcile() Deferreds
+})
+
+_classes: dict[int, type] = {}
+
+
+def message_class(payload_type: int):
+    """Message class for a payloadType (None if unknown), cached."""
+    cls = _classes.get(payload_type)
+    if cls is None:
+        proto = Protobuf.get(payload_type, fail=False)
+        if proto is None:
+            return None
+        cls = _classes[payload_type] = type(proto)
+    return cls
+
+
+def payload_name(payload_type: int) -> str:
+    cls = message_class(payload_type)
+    return cls.__name__ if cls is not None else str(payload_type)
+
+
+def decode(msg):
+    """The payload of a ProtoMessage as its message class (Protobuf.extract with a cached lookup)."""
+    payload = message_class(msg.payloadType)()
+    payload.ParseFromString(msg.payload)
+    return payload
+
+
+def new_decode_stats() -> dict:
+    return {
+        "decoded": {},      # payloadType -> count
+        "ignored": {},
+        "unhandled": {},
+    }
+
+
+def count(stats: dict, kind: str, payload_type: int):
+    counts = stats[kind]
+    counts[payload_type] = counts.get(payload_type, 0) + 1
+
+
+def decode_snapshot(bot) -> dict:
+    return {kind: {payload_name(pt): n for pt, n in counts.items()}
+            for kind, counts in bot.decoding.items()}
+
@@ -0,0 +1,112 @@
+# file: ctraderbot/bot/decoding_bench.py
+"""
+Inbound routing: the old if/elif chain + MessageToDict vs the decode table.
+
+    python -m ctraderbot.bot.decoding_bench --messages 200000
+
+Both run over the same mixed stream of ProtoMessages (mostly spots and
+heartbeats, some PnL responses and acks). The table route makes the same
+decisions as event_handlers.on_message, with IGNORED and _HANDLERS, but
+only decodes where the handler would run.
+"""
+import time
+
+from ctrader_open_api import Protobuf
+
+from .decoding import IGNORED, count, decode, new_decode_stats
+from .event_handlers import _HANDLERS
+
+
+def _sample_stream(n: int) -> list:
+    """A message mix like a live session: mostly spots and heartbeats, some PnL, a few acks."""
+    from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage, ProtoHeartbeatEvent
+    from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+        ProtoOASpotEvent, ProtoOAGetPositionUnrealizedPnLRes, ProtoOASubscribeSpotsRes, ProtoOAVersionRes,
+    )
+    from ctrader_open_api.messages.OpenApiModelMessages_pb2 import ProtoOAPositionUnrealizedPnL
+
+    pnl = ProtoOAGetPositionUnrealizedPnLRes(ctidTraderAccountId=1, moneyDigits=2, positionUnrealizedPnL=[
+        ProtoOAPositionUnrealizedPnL(positionId=i, grossUnrealizedPnL=1000 + i, netUnrealizedPnL=900 + i)
+        for i in range(2)
+    ])
+    mix = [ProtoOASpotEvent(ctidTraderAccountId=1, symbolId=1, bid=108000, ask=108010)] * 6 + [
+        ProtoHeartbeatEvent(), ProtoHeartbeatEvent(), pnl, ProtoOASubscribeSpotsRes(ctidTraderAccountId=1),
+        ProtoOAVersionRes(version="104"),
+    ]
+    frames = [ProtoMessage(payloadType=m.payloadType, payload=m.SerializeToString()).SerializeToString()
+              for m in mix]
+    stream = []
+    for i in range(n):
+        msg = ProtoMessage()
+        msg.ParseFromString(frames[i % len(frames)])
+        stream.append(msg)
+    return stream
+
+
+def _old_route_factory():
+    """The routing as it was: a new message object per comparison, MessageToDict for the rest."""
+    from google.protobuf.json_format import MessageToDict
+    from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoHeartbeatEvent
+    from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+        ProtoOAApplicationAuthRes, ProtoOAAccountAuthRes, ProtoOAExecutionEvent,
+        ProtoOAGetPositionUnrealizedPnLRes, ProtoOASpotEvent, ProtoOASubscribeSpotsRes, ProtoOAVersionRes,
+    )
+
+    def route(msg):
+        pt = msg.payloadType
+        if pt == ProtoOAApplicationAuthRes().payloadType:
+            return None
+        elif pt == ProtoOAAccountAuthRes().payloadType:
+            return None
+        elif pt == ProtoOAExecutionEvent().payloadType:
+            return Protobuf.extract(msg)
+        elif pt == ProtoOAGetPositionUnrealizedPnLRes().payloadType:
+            return Protobuf.extract(msg)
+        elif pt == ProtoOASpotEvent().payloadType:
+            return Protobuf.extract(msg)
+        elif pt == ProtoOASubscribeSpotsRes().payloadType:
+            return None
+        elif pt in {ProtoHeartbeatEvent().payloadType, ProtoOAVersionRes().payloadType}:
+            return None
+        return MessageToDict(Protobuf.extract(msg))
+
+    return route
+
+
+def _table_route(msg, stats):
+    pt = msg.payloadType
+    if pt in IGNORED:
+        count(stats, "ignored", pt)
+        return None
+    if pt in _HANDLERS:
+        count(stats, "decoded", pt)
+        return decode(msg)
+    count(stats, "unhandled", pt)
+    return None
+
+
+def benchmark(n: int = 200_000) -> dict:
+    stream = _sample_stream(n)
+    results = {}
+    stats = new_decode_stats()
+    for name, route in (("if_elif", _old_route_factory()), ("table", lambda m: _table_route(m, stats))):
+        started = time.perf_counter()
+        for msg in stream:
+            route(msg)
+        elapsed = time.perf_counter() - started
+        results[name] = {"total_s": elapsed, "ns_per_message": elapsed / n * 1e9}
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time inbound routing: if/elif chain vs decode table")
+    parser.add_argument("--messages", type=int, default=200_000)
+    args = parser.parse_args()
+    for name, r in benchmark(args.messages).items():
+        print(f"[DECODE] {name:>8}: {r['ns_per_message']:8.0f} ns/message ({r['total_s']:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
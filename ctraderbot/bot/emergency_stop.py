@@ -0,0 +1,155 @@
+# file: ctraderbot/bot/emergency_stop.py
+"""
+Emergency stop: close every open position at once and report the outcome.
+
+All close requests are sent back to back (the client's own throttle paces
+them on the wire), then the workflow waits for each position's closing
+execution event, a rejection, or EMERGENCY_STOP_TIMEOUT. The DB is
+updated once for every position that closed, and the Deferred fires with
+a per-position report and the total time-to-flat.
+"""
+import datetime as dt
+import time
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
+from ctrader_open_api import Protobuf
+from ..helpers import mark_positions_closed
+from ..settings import EMERGENCY_STOP_TIMEOUT
+from .order_state import is_error_response
+
+CLOSED = "closed"
+REJECTED = "rejected"
+TIMEOUT = "timeout"
+SKIPPED = "skipped"
+
+
+def emergency_stop(bot, timeout=EMERGENCY_STOP_TIMEOUT) -> Deferred:
+    """
+    Starts the emergency stop (or joins the one in progress). Must run on
+    the reactor thread; fires with the report.
+    """
+    from .trading import close_position
+
+    waiter = Deferred()
+    if bot.emergency_stop:
+        print("[!!!] Emergency stop already in progress. Waiting for its report.")
+        bot.emergency_stop["waiters"].append(waiter)
+        return waiter
+
+    print("[!!!] EMERGENCY STOP INITIATED! Closing all active positions.")
+    run = {
+        "started_at": dt.datetime.now(dt.timezone.utc),
+        "t0": time.monotonic(),
+        "positions": {},
+        "waiters": [waiter],
+        "timer": None,
+    }
+    bot.emergency_stop = run
+
+    for position_id, pos_data in list(bot.positions.items()):
+        if pos_data.get("status") != "OPEN":
+            continue
+        entry = {"positionId": position_id, "volume": pos_data.get("volume", 0), "status": None,
+                 "accepted_ms": None, "closed_ms": None, "error": None}
+        run["positions"][position_id] = entry
+
+        if entry["volume"] <= 0:
+            entry["status"] = SKIPPED
+            entry["error"] = "zero volume"
+            continue
+        d = close_position(bot, position_id, entry["volume"], update_db=False)
+        if d is None:
+            # A close is already in flight (e.g. a liquidation): wait for its execution event
+            entry["note"] = "close already in flight"
+            continue
+        d.addCallback(_on_close_sent, bot, position_id)
+
+    print(f"[INFO] Emergency close commands sent for "
+          f"{sum(1 for e in run['positions'].values() if e['status'] is None and 'note' not in e)} positions.")
+
+    run["timer"] = reactor.callLater(timeout, _finish, bot)
+    _finish_if_done(bot)
+    return waiter
+
+
+def _elapsed_ms(run) -> float:
+    return (time.monotonic() - run["t0"]) * 1000
+
+
+def _on_close_sent(msg, bot, position_id):
+    run = bot.emergency_stop
+    if not run or position_id not in run["positions"]:
+        return
+    entry = run["positions"][position_id]
+    if msg is None or is_error_response(msg):
+        # No response (connection error) or rejected by the server
+        entry["status"] = REJECTED
+        entry["error"] = "no response" if msg is None else \
+            f"rejected by server: {getattr(Protobuf.extract(msg), 'errorCode', '')}"
+        _finish_if_done(bot)
+        return
+    if entry["accepted_ms"] is None:
+        entry["accepted_ms"] = _elapsed_ms(run)
+
+
+def on_position_closed(bot, position_id):
+    """Called from the execution handler when a position reports CLOSED."""
+    run = bot.emergency_stop
+    if not run or position_id not in run["positions"]:
+        return
+    entry = run["positions"][position_id]
+    if entry["status"] in (None, REJECTED):
+        entry["status"] = CLOSED
+        entry["error"] = None
+        entry["closed_ms"] = _elapsed_ms(run)
+        _finish_if_done(bot)
+
+
+def _finish_if_done(bot):
+    run = bot.emergency_stop
+    if run and all(e["status"] is not None for e in run["positions"].values()):
+        _finish(bot)
+
+
+def _finish(bot):
+    run = bot.emergency_stop
+    if not run:
+        return
+    bot.emergency_stop = None
+    if run["timer"] and run["timer"].active():
+        run["timer"].cancel()
+
+    for entry in run["positions"].values():
+        if entry["status"] is None:
+            entry["status"] = TIMEOUT
+
+    closed_ids = [pid for pid, e in run["positions"].items() if e["status"] == CLOSED]
+    still_open = [pid for pid, e in run["positions"].items() if e["status"] != CLOSED]
+    close_times = [e["closed_ms"] for e in run["positions"].values() if e["closed_ms"] is not None]
+    report = {
+        "started_at": run["started_at"].isoformat(),
+        "flat": not still_open,
+        "time_to_flat_ms": max(close_times, default=0.0) if not still_open else None,
+        "elapsed_ms": _elapsed_ms(run),
+        "closed": len(closed_ids),
+        "not_closed": still_open,
+        "positions": list(run["positions"].values()),
+    }
+    print(f"[!!!] Emergency stop finished: {report['closed']} closed, {len(still_open)} not closed, "
+          f"time-to-flat {report['time_to_flat_ms']} ms.")
+
+    # One bulk status update for everything that closed
+    d = deferToThread(mark_positions_closed, closed_ids) if closed_ids else None
+    if d is None:
+        _deliver(run, report)
+        return
+    d.addCallback(lambda rows: report.update(db_rows_updated=rows))
+    d.addErrback(lambda f: report.update(db_error=f.getErrorMessage()))
+    d.addBoth(lambda _: _deliver(run, report))
+
+
+def _deliver(run, report):
+    for waiter in run["waiters"]:
+        waiter.callback(report)
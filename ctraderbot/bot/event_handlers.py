@@ -4,92 +4,120 @@ from ctrader_open_api.messages.OpenApiMessages_pb2 import *
 from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import *       # noqa: F403,E402
 from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F403,E402
 # from ctrader_open_api import Client, Protobuf, TcpProtocol, EndPoints  # noqa: E402
-from ctrader_open_api import Protobuf
 from twisted.internet import reactor
-from google.protobuf.json_format import MessageToDict
-from .auth import after_app_auth, after_account_auth
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import ProtoOAPayloadType as PT
+from .auth import after_app_auth, after_account_auth, check_auth_response
 from .execution import handle_execution
-from .token_refresh import handle_token_refresh
+from .token_refresh import handle_token_refresh, TOKEN_ERROR_CODES
 from .pnl_event import handle_pnl_event
-from .stop_operation import stop_reactor
-from ..helpers import update_account_balance_in_db
-# from .spot_event import handle_spot_event
+from .stop_operation import graceful_shutdown
+from .reconnect import on_connection_lost, on_account_disconnected
+from .health import record_inbound
+from .account_state import apply_trader, on_trader_res
+from .spot_event import handle_spot_event
+from .decoding import IGNORED, count, decode, payload_name
+from .wire_capture import attach_wire_capture
+from .outbound import send, SESSION
 from ..settings import CLIENT_ID, CLIENT_SECRET
-from twisted.internet.threads import deferToThread
 
 def register_callbacks(bot):
     bot.client.setConnectedCallback(lambda _: on_connected(bot))
-    bot.client.setDisconnectedCallback(lambda _, r: on_disconnected(r))
+    bot.client.setDisconnectedCallback(lambda _, r: on_disconnected(bot, r))
     bot.client.setMessageReceivedCallback(lambda _, m: on_message(bot, m))
 
 def on_connected(bot):
     print("[+] Connected. Authenticating app…")
+    attach_wire_capture(bot)
     req = ProtoOAApplicationAuthReq(clientId=CLIENT_ID, clientSecret=CLIENT_SECRET)
-    bot.client.send(req)
+    send(bot, req, SESSION).addCallbacks(check_auth_response, _on_auth_failed,
+                                         callbackArgs=(bot, "Application"), errbackArgs=("Application",))
 
-def on_disconnected(reason):
+def _on_auth_failed(failure, what):
+    # A dropped connection redials and authenticates again; nothing else to do here
+    print(f"[✖] {what} auth got no response: {failure.getErrorMessage()}")
+
+
+def on_disconnected(bot, reason):
     print("[-] Disconnected:", reason)
-    if reactor.running:
-        reactor.stop()
+    on_connection_lost(bot, reason)
 
 def on_message(bot, msg):
-    
-    from .trading import _get_or_create_segment_and_trade
-
     pt = msg.payloadType
-    print(f"[debug] Incoming payloadType = {pt}")
-
-    if pt == ProtoOAApplicationAuthRes().payloadType:
-        after_app_auth(bot)
-    elif pt == ProtoOAAccountAuthRes().payloadType:
-        after_account_auth(bot)
-    elif pt == ProtoOAExecutionEvent().payloadType:
-        handle_execution(bot, Protobuf.extract(msg))
-    elif pt == ProtoOAGetPositionUnrealizedPnLRes().payloadType:
-        handle_pnl_event(bot, msg)
-    elif pt == ProtoOAAccountLogoutRes().payloadType:
-        print("[Info] Logout confirmed by server. Connection will be closed shortly.")
-    elif pt == ProtoOAAccountDisconnectEvent().payloadType:
-        print("[Info] Account disconnected by server.")
-        on_disconnected("Server sent a disconnect event.")
-    elif pt == ProtoOATraderRes().payloadType:
-        trader_res = Protobuf.extract(msg)
-        trader_info = trader_res.trader
-        
-        # Calculate the real balance
-        real_balance = trader_info.balance / (10 ** trader_info.moneyDigits)
-        
-        # Update the bot's in-memory balance
-        bot.current_balance = real_balance
-        
-        # Defer the DB update and the new trade start to a background thread
-        deferToThread(update_account_balance_in_db, bot.account_pk, real_balance)
+    record_inbound(bot, pt)
+
+    # Heartbeats, acks and Deferred-consumed responses: counted, never decoded
+    if pt in IGNORED:
+        count(bot.decoding, "ignored", pt)
+        return
+
+    handler = _HANDLERS.get(pt)
+    if handler is None:
+        count(bot.decoding, "unhandled", pt)
+        print(f"[✖] Unhandled message: {payload_name(pt)}")
+        return
+    count(bot.decoding, "decoded", pt)
+    handler(bot, msg)
+
+
+def _on_logout(bot, msg):
+    print("[Info] Logout confirmed by server. Connection will be closed shortly.")
+
+
+def _on_account_disconnect(bot, msg):
+    print("[Info] Account disconnected by server.")
+    on_account_disconnected(bot)
+
+
+def _on_error(bot, msg):
+    err = decode(msg)
+    error_code = getattr(err, 'errorCode', '')
+
+    if error_code in TOKEN_ERROR_CODES:
+        handle_token_refresh(bot)
+        return
+
+    if error_code in ["MARKET_CLOSED"]:
+        from .trading import send_market_order
+
+        # Correct delay for half an hour is x seconds
+        delay_seconds = 1800 
+        print(f"[SCHEDULER] Market is closed. Retrying in {delay_seconds / 60:.0f} minutes.")
         
-        print(f"[>>>] Balance synced. Starting new trade cycle.")
-        _get_or_create_segment_and_trade(bot)
-        return # Important to stop further processing
-    elif pt in {ProtoOAOrderErrorEvent().payloadType, ProtoOAErrorRes().payloadType}:
-        err = Protobuf.extract(msg)
-        error_code = getattr(err, 'errorCode', '')
-
-        if error_code in ["CH_ACCESS_TOKEN_INVALID", "OA_AUTH_TOKEN_EXPIRED"]:
-            deferToThread(handle_token_refresh, bot)
-            return
-
-        if error_code in ["MARKET_CLOSED"]:
-            from .trading import send_market_order
-
-            # Correct delay for half an hour is x seconds
-            delay_seconds = 1800 
-            print(f"[SCHEDULER] Market is closed. Retrying in {delay_seconds / 60:.0f} minutes.")
-            
-            # Pass the function and its argument separately
-            reactor.callLater(delay_seconds, send_market_order, bot)
-            return
-
-        print("[✖] Server error:", MessageToDict(err))
-        stop_reactor(bot, msg)
-
-    else:
-        elseError = MessageToDict(Protobuf.extract(msg))
-        print("[✖] Unhandled error:", elseError)
+        # Pass the function and its argument separately
+        reactor.callLater(delay_seconds, send_market_order, bot)
+        return
+
+    detail = f"{payload_name(msg.payloadType)} {error_code} {getattr(err, 'description', '')}"
+    # The client fires the request's Deferred right after this callback:
+    # the request that caused the error handles it (retries, requeries, fallbacks)
+    if _owned_by_request(bot, msg):
+        print(f"[✖] Server error for request {msg.clientMsgId}: {detail}")
+        return
+    if msg.payloadType == PT.PROTO_OA_ORDER_ERROR_EVENT:
+        # Order state timeouts re-query the order; nothing to stop for
+        print(f"[✖] Order error: {detail}")
+        return
+
+    print(f"[✖] Server error: {detail}. Shutting down.")
+    graceful_shutdown(bot)
+
+
+def _owned_by_request(bot, msg) -> bool:
+    return bool(msg.clientMsgId) and msg.clientMsgId in getattr(bot.client, "_responseDeferreds", {})
+
+
+# payloadType -> handler(bot, msg); each handler decodes only what it reads
+_HANDLERS = {
+    PT.PROTO_OA_APPLICATION_AUTH_RES: lambda bot, msg: after_app_auth(bot),
+    PT.PROTO_OA_ACCOUNT_AUTH_RES: lambda bot, msg: after_account_auth(bot),
+    PT.PROTO_OA_EXECUTION_EVENT: lambda bot, msg: handle_execution(bot, decode(msg)),
+    PT.PROTO_OA_GET_POSITION_UNREALIZED_PNL_RES: handle_pnl_event,
+    PT.PROTO_OA_SPOT_EVENT: lambda bot, msg: handle_spot_event(bot, decode(msg)),
+    PT.PROTO_OA_ACCOUNT_LOGOUT_RES: _on_logout,
+    PT.PROTO_OA_ACCOUNT_DISCONNECT_EVENT: _on_account_disconnect,
+    # Syncs the in-memory balance (the DB copy is written in the background)
+    PT.PROTO_OA_TRADER_RES: on_trader_res,
+    PT.PROTO_OA_TRADER_UPDATE_EVENT: lambda bot, msg: apply_trader(bot, decode(msg).trader, source="trader_updated"),
+    PT.PROTO_OA_ORDER_ERROR_EVENT: _on_error,
+    PT.PROTO_OA_ERROR_RES: _on_error,
+}
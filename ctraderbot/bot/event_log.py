@@ -0,0 +1,106 @@
+# file: ctraderbot/bot/event_log.py
+"""
+Batched EventLog writer.
+
+Events are stamped when they happen and buffered on the reactor thread;
+a flush task hands each batch to a worker thread for a single executemany
+insert (helpers.insert_event_logs). A batch that fails is put back at the
+front of the buffer and retried on the next flush.
+"""
+import datetime as dt
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThread
+from twisted.python.threadable import isInIOThread
+from ..helpers import insert_event_logs
+from ..settings import EVENT_LOG_FLUSH_INTERVAL, EVENT_LOG_BATCH_SIZE, EVENT_LOG_MAX_BUFFER
+from .scheduler import schedule_interval
+
+FLUSH_TASK = "event_log_flush"
+
+
+def new_event_log_writer() -> dict:
+    return {
+        "buffer": [],
+        "flush_in_flight": False,
+        "stopping": False,
+        "stats": {"logged": 0, "written": 0, "dropped": 0, "flushes": 0, "failed_flushes": 0},
+    }
+
+
+def log_event(bot, trade_id: int, position_id: int | None, event_type: str, details: dict | None = None):
+    """Queues one event. Safe to call from worker threads (e.g. the PnL checks)."""
+    row = {
+        "trade_id": trade_id,
+        "position_id": position_id,
+        "event_type": event_type,
+        "details": details,
+        "created_at": dt.datetime.now(dt.timezone.utc),
+    }
+    if not isInIOThread():
+        reactor.callFromThread(_enqueue, bot, row)
+    else:
+        _enqueue(bot, row)
+
+
+def _enqueue(bot, row):
+    writer = bot.event_log
+    writer["buffer"].append(row)
+    writer["stats"]["logged"] += 1
+    print(f"[EVENT] '{row['event_type']}' for trade {row['trade_id']}, position {row['position_id']}")
+    if len(writer["buffer"]) >= EVENT_LOG_BATCH_SIZE:
+        flush_events(writer)
+
+
+def start_event_log_writer(bot):
+    schedule_interval(bot, FLUSH_TASK, EVENT_LOG_FLUSH_INTERVAL, flush_events, bot.event_log, run_now=False)
+
+
+def flush_events(writer):
+    """Writes up to EVENT_LOG_BATCH_SIZE buffered events. One flush at a time keeps them in order."""
+    if writer["flush_in_flight"] or not writer["buffer"]:
+        return
+    batch = writer["buffer"][:EVENT_LOG_BATCH_SIZE]
+    del writer["buffer"][:EVENT_LOG_BATCH_SIZE]
+    writer["flush_in_flight"] = True
+
+    d = deferToThread(insert_event_logs, batch)
+    d.addCallbacks(
+        _on_flushed, _on_flush_failed,
+        callbackArgs=(writer, batch), errbackArgs=(writer, batch),
+    )
+    return d
+
+
+def _on_flushed(written, writer, batch):
+    writer["flush_in_flight"] = False
+    stats = writer["stats"]
+    stats["written"] += written
+    stats["dropped"] += len(batch) - written
+    stats["flushes"] += 1
+    # Keep draining a backlog (or the shutdown remainder) without waiting a full interval
+    if writer["buffer"] and (writer["stopping"] or len(writer["buffer"]) >= EVENT_LOG_BATCH_SIZE):
+        flush_events(writer)
+
+
+def _on_flush_failed(failure, writer, batch):
+    writer["flush_in_flight"] = False
+    writer["stats"]["failed_flushes"] += 1
+    print(f"[EVENT] Failed to write {len(batch)} event(s): {failure.getErrorMessage()}")
+    if writer["stopping"]:
+        return
+
+    writer["buffer"][:0] = batch
+    overflow = len(writer["buffer"]) - EVENT_LOG_MAX_BUFFER
+    if overflow > 0:
+        # The database has been down for a while: drop the oldest events, not the newest
+        del writer["buffer"][:overflow]
+        writer["stats"]["dropped"] += overflow
+        print(f"[EVENT] Buffer full. Dropped {overflow} oldest event(s).")
+
+
+def stop_event_log_writer(bot):
+    """Writes whatever is still buffered. The flush task is cancelled with the other tasks."""
+    writer = bot.event_log
+    writer["stopping"] = True
+    return flush_events(writer)
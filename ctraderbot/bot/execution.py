@@ -1,5 +1,6 @@
 # execution.py
 import datetime as dt
+from twisted.internet import reactor
 from twisted.internet.defer import ensureDeferred
 from twisted.internet.threads import deferToThread
 from ctrader_open_api.messages.OpenApiMessages_pb2 import *
@@ -8,6 +9,16 @@ from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F
 from ..helpers import *
 from datetime import timezone
 from ..database import SessionSync
+from .order_gateway import track_execution, forget_trade_orders
+from .order_state import mark_closed, forget_position
+from .emergency_stop import on_position_closed
+from .symbol_cache import symbol_for
+from .deal_ledger import record_deal, position_deals, net_profit, forget_position_deals
+from .account_state import apply_deal, start_next_cycle
+from .leader import is_leader
+from ..symbols import volume_to_lots
+from ..money import halve, to_decimal, to_money
+from ..strategy import resulted_balance, SUCCESSFUL
 # from .trading import _get_or_create_segment_and_trade
 
 
@@ -30,6 +41,11 @@ def handle_execution(bot, ev):
     current_volume = pos.tradeData.volume # This is the key for full/partial closes
     execution_type = ev.executionType # ProtoOAExecutionType enum
 
+    # Every fill goes into the deal ledger, so closes are accounted from memory
+    if ev.HasField("deal"):
+        record_deal(bot, deal)
+        apply_deal(bot, deal)
+
     # --- Store/Update Position State in bot.positions ---
     # Always update the latest state of the position in bot.positions.
     # This ensures your bot's internal state accurately reflects what cTrader reports.
@@ -65,6 +81,13 @@ def handle_execution(bot, ev):
           f"Margin={used_margin} | Status={bot.positions[pid]['status']} | coid={coid}")
 
 
+    # Order state + acknowledgement/fill latency for orders sent through the gateway
+    track_execution(bot, coid, execution_type, order_id=order.orderId, position_id=pid)
+
+    # A standby only follows: the leader writes the DB and runs the close workflow
+    if not is_leader(bot):
+        return
+
     # --- Handle Execution Types ---
     if execution_type != ProtoOAExecutionType.ORDER_FILLED:
         print(f"[i] Unhandled Execution Type '{ProtoOAExecutionType.Name(execution_type)}' for pid={pid}, coid={coid}")
@@ -102,7 +125,7 @@ def handle_execution(bot, ev):
                     segment_id = trade.segment_id
 
                     segment = s.query(Segments).get(segment_id)
-                    bot.positions[pid]["total_balance"] = segment.total_balance / 2
+                    bot.positions[pid]["total_balance"] = halve(to_money(segment.total_balance))
 
                 # Create the TradeDetail record with the correct IDs
                 deferToThread(
@@ -111,7 +134,7 @@ def handle_execution(bot, ev):
                     segment_id=segment_id,
                     position_id=pid,
                     side=ProtoOATradeSide.Name(side),
-                    lot_size=current_volume / (100_000.0 * 100), # Convert to standard lots
+                    lot_size=volume_to_lots(symbol_for(bot, pos.tradeData.symbolId), current_volume), # Convert to lots
                     entry_price=entry_price
                 ).addErrback(lambda f: print(f"Failed to create TradeDetail for {pid}: {f}"))
 
@@ -134,6 +157,8 @@ def handle_execution(bot, ev):
     # --- Logic for Closing Positions (Full or Partial) ---
     if pos.positionStatus == 2: # POSITION_STATUS_CLOSED
         print(f"[✓] Position {pid} is reported as CLOSED.")
+        mark_closed(bot, pid)
+        on_position_closed(bot, pid)
 
         # Defer the entire closing workflow to a background thread
         deferToThread(
@@ -141,8 +166,6 @@ def handle_execution(bot, ev):
             bot,
             pid,
             deal.executionPrice,
-            deal.commission,
-            pos.swap
         ).addErrback(lambda f: print(f"[!!!] Closed position workflow failed for {pid}: {f}"))
         
         return # End execution here, the thread will handle the rest
@@ -150,7 +173,7 @@ def handle_execution(bot, ev):
     # --- Fallback for any other unhandled scenario ---
     print(f"[i] Unhandled ORDER_FILLED scenario for pid={pid}, coid={coid}")
 
-def _handle_closed_position_workflow(bot, closed_pid, exit_price, commission, swap):
+def _handle_closed_position_workflow(bot, closed_pid, exit_price):
     """
     Manages the full workflow after a position is confirmed closed.
     This runs in a background thread.
@@ -175,7 +198,22 @@ def _handle_closed_position_workflow(bot, closed_pid, exit_price, commission, sw
 
     # 2. Update the database for the single closed position
     final_status = trade_info.get(f"{closed_side}_status") # 'successful' or 'liquidated'
-    update_trade_detail_on_close(closed_pid, exit_price, commission, swap, final_status)
+
+    # The realised result replaces the estimate taken from the last PnL tick
+    # Commission, swap and fees of every deal on the position are part of it
+    realised = None
+    deals = position_deals(bot, closed_pid)
+    if deals and deals["closed_volume"]:
+        realised = net_profit(deals)
+        trade_info[f"{closed_side}_net_profit"] = realised
+        balance = bot.positions.get(closed_pid, {}).get("total_balance")
+        if final_status == SUCCESSFUL and balance is not None:
+            trade_info["resulted_balance"] = resulted_balance(balance, realised, SUCCESSFUL)
+    symbol = symbol_for(bot, bot.positions.get(closed_pid, {}).get("symbolId"))
+    update_trade_detail_on_close(
+        closed_pid, exit_price, final_status,
+        net_profit=None if realised is None else to_decimal(realised), symbol=symbol,
+    )
 
     # 3. Check if both positions in the couple are now closed
     if closed_side == "long":
@@ -196,12 +234,16 @@ def _handle_closed_position_workflow(bot, closed_pid, exit_price, commission, sw
     print(f"[>>>] Both positions for trade {trade_id} are {other_pos_status}. Finalizing trade cycle.")
     
     # Update the parent Trade row status to successful/liquidated
-    update_parent_trade_status(trade_id, final_status, trade_info["resulted_balance"])
+    update_parent_trade_status(trade_id, final_status, to_decimal(trade_info["resulted_balance"]))
+
+    # 5. Reconcile to verify closure and clean up memory (requests are sent from the reactor thread)
+    reactor.callFromThread(_reconcile_after_close, bot, trade_id, trade_info)
 
-    # 5. Reconcile to verify closure and clean up memory
+def _reconcile_after_close(bot, closed_trade_id, closed_trade_info):
     from .trading import reconcile
     d = reconcile(bot)
-    d.addCallback(_after_reconcile_cleanup, bot=bot, closed_trade_id=trade_id, closed_trade_info=trade_info)
+    d.addCallback(_after_reconcile_cleanup, bot=bot, closed_trade_id=closed_trade_id,
+                  closed_trade_info=closed_trade_info)
     d.addErrback(lambda f: print(f"[!!!] Reconcile after trade close failed: {f}"))
 
 def _after_reconcile_cleanup(reconcile_res, bot, closed_trade_id, closed_trade_info):
@@ -223,6 +265,8 @@ def _after_reconcile_cleanup(reconcile_res, bot, closed_trade_id, closed_trade_i
             # Check if this position is one of the ones that should have been closed.
             if pos.positionId == long_pid or pos.positionId == short_pid:
                 print(f"--> Sending fallback CLOSE command for lingering position {pos.positionId}")
+                # Our record says closed but the server disagrees; track it afresh
+                forget_position(bot, pos.positionId)
                 volume_to_close = pos.tradeData.volume
                 close_position(bot, pos.positionId, volume_to_close)
 
@@ -232,6 +276,11 @@ def _after_reconcile_cleanup(reconcile_res, bot, closed_trade_id, closed_trade_i
     if closed_trade_id in bot.trade_couple:
         del bot.trade_couple[closed_trade_id]
         print(f"[INFO] Removed completed trade {closed_trade_id} from memory.")
+    forget_trade_orders(bot, closed_trade_id)
+    forget_position(bot, long_pid)
+    forget_position(bot, short_pid)
+    forget_position_deals(bot, long_pid)
+    forget_position_deals(bot, short_pid)
     
     # ---- START: NEW DELETION LOGIC ----
     if long_pid and long_pid in bot.positions:
@@ -246,15 +295,12 @@ def _after_reconcile_cleanup(reconcile_res, bot, closed_trade_id, closed_trade_i
     # 3. Trigger the creation of a new trade cycle
     print(f"[>>>] Account is clean. Starting new trade cycle for account {bot.account_pk}")
 
-    # Send a request to get the latest trader info, which includes the balance
-    bot.client.send(ProtoOATraderReq(ctidTraderAccountId=bot.account_id))
-
-    # Moved to trader response event handler
-    # _get_or_create_segment_and_trade(bot)
+    # The balance is already in memory (closing deals and trader updates carry it)
+    start_next_cycle(bot)
 
 def close_all_positions(bot):
     """Close every open position we know about."""
     for position_id, info in list(bot.positions.items()):
         if info["status"] == "OPEN":
             from .trading import close_position
-            close_position(bot, position_id)
+            close_position(bot, position_id, info["volume"])
@@ -0,0 +1,204 @@
+# file: ctraderbot/bot/health.py
+"""
+Connection-health monitor: inbound gaps and heartbeats, RTT probes and PnL
+feed staleness. Outbound heartbeats are left to the client's protocol.
+"""
+import time
+
+from twisted.internet import reactor
+from ctrader_open_api.messages.OpenApiMessages_pb2 import ProtoOAVersionReq
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoHeartbeatEvent
+from ..settings import HEALTH_CHECK_INTERVAL, STALE_FEED_THRESHOLD
+from .scheduler import scheduler_snapshot
+from .pnl_polling import polling_snapshot
+from .deal_ledger import ledger_snapshot
+from .account_state import account_snapshot
+from .leader import leader_snapshot
+from .wire_capture import wire_capture_snapshot
+from .decoding import decode_snapshot
+from .books_publisher import shared_books_snapshot
+from .outbound import send, outbound_snapshot
+
+HEARTBEAT_PAYLOAD_TYPE = ProtoHeartbeatEvent().payloadType
+
+# Weight of the newest sample in the moving averages
+_EWMA_ALPHA = 0.2
+
+
+def new_health_stats() -> dict:
+    return {
+        "messages_received": 0,
+        "heartbeats_received": 0,
+        "last_message_at": None,
+        "avg_gap_s": None,
+        "max_gap_s": 0.0,
+        "rtt_last_ms": None,
+        "rtt_avg_ms": None,
+        "rtt_max_ms": 0.0,
+        "probe_failures": 0,
+        "pnl_requested_at": None,
+        "last_pnl_at": None,
+        "pnl_age_s": None,
+        "stale_pnl_skips": 0,
+        "pnl_request_failures": 0,
+    }
+
+
+def _ewma(previous, sample):
+    return sample if previous is None else previous + _EWMA_ALPHA * (sample - previous)
+
+
+def record_inbound(bot, payload_type: int):
+    """Called for every inbound message; tracks inter-arrival gaps."""
+    now = time.monotonic()
+    health = bot.health
+
+    last = health["last_message_at"]
+    if last is not None:
+        gap = now - last
+        health["avg_gap_s"] = _ewma(health["avg_gap_s"], gap)
+        if gap > health["max_gap_s"]:
+            health["max_gap_s"] = gap
+
+    health["last_message_at"] = now
+    health["messages_received"] += 1
+    if payload_type == HEARTBEAT_PAYLOAD_TYPE:
+        health["heartbeats_received"] += 1
+
+
+def record_pnl_request(bot):
+    """Remembers when the oldest still-unanswered PnL request went out."""
+    if bot.health["pnl_requested_at"] is None:
+        bot.health["pnl_requested_at"] = time.monotonic()
+
+
+def record_pnl_request_failed(bot, failure):
+    """
+    The PnL request timed out or its connection dropped: no response is
+    coming, so the next request starts a fresh age.
+    """
+    health = bot.health
+    if health["pnl_requested_at"] is not None:
+        health["pnl_requested_at"] = None
+        health["pnl_request_failures"] += 1
+        print(f"[HEALTH] PnL request got no response: {failure.getErrorMessage()}")
+
+
+def pnl_response_is_fresh(bot) -> bool:
+    """
+    Called when a PnL response arrives. Returns False when the numbers are
+    older than STALE_FEED_THRESHOLD, so the risk checks can skip this tick.
+    """
+    now = time.monotonic()
+    health = bot.health
+    requested_at = health["pnl_requested_at"]
+    health["pnl_requested_at"] = None
+    health["last_pnl_at"] = now
+
+    if requested_at is None:
+        return True
+
+    age = now - requested_at
+    health["pnl_age_s"] = age
+    if age > STALE_FEED_THRESHOLD:
+        health["stale_pnl_skips"] += 1
+        print(f"[HEALTH] Stale PnL response ({age:.2f}s old). Skipping risk checks for this tick.")
+        return False
+    return True
+
+
+def is_feed_stale(bot) -> bool:
+    """True when positions are open but no PnL update arrived recently."""
+    if not bot.positions:
+        return False
+    last_pnl_at = bot.health["last_pnl_at"]
+    if last_pnl_at is None:
+        return True
+    # The adaptive poller may legitimately wait up to its current interval
+    return time.monotonic() - last_pnl_at > STALE_FEED_THRESHOLD + bot.pnl_polling["interval_s"]
+
+
+def start_health_monitor(bot):
+    """Arms the periodic latency probe and stale-feed check (re-arms it if already running)."""
+    if bot.health_timer and bot.health_timer.active():
+        bot.health_timer.cancel()
+    _health_tick(bot)
+
+
+def _health_tick(bot):
+    bot.health_timer = reactor.callLater(HEALTH_CHECK_INTERVAL, _health_tick, bot)
+    if not bot.is_session_ready:
+        return
+
+    probe_latency(bot)
+
+    if is_feed_stale(bot):
+        print("[HEALTH] WARNING: PnL feed is stale while positions are open.")
+
+
+def probe_latency(bot):
+    """
+    Measures round-trip time with a ProtoOAVersionReq. The request goes
+    through the outbound scheduler (ROUTINE) and the client's send queue,
+    so RTT includes queueing delay.
+    """
+    sent_at = time.monotonic()
+    d = send(bot, ProtoOAVersionReq(), responseTimeoutInSeconds=HEALTH_CHECK_INTERVAL)
+    d.addCallbacks(
+        _on_probe_response, _on_probe_failed,
+        callbackArgs=(bot, sent_at), errbackArgs=(bot,),
+    )
+
+
+def _on_probe_response(_, bot, sent_at):
+    health = bot.health
+    rtt_ms = (time.monotonic() - sent_at) * 1000
+    health["rtt_last_ms"] = rtt_ms
+    health["rtt_avg_ms"] = _ewma(health["rtt_avg_ms"], rtt_ms)
+    if rtt_ms > health["rtt_max_ms"]:
+        health["rtt_max_ms"] = rtt_ms
+
+
+def _on_probe_failed(failure, bot):
+    bot.health["probe_failures"] += 1
+    print(f"[HEALTH] Latency probe failed: {failure.getErrorMessage()}")
+
+
+def health_snapshot(bot) -> dict:
+    """JSON-safe view of the health metrics, used by the /health endpoint."""
+    now = time.monotonic()
+    health = dict(bot.health)
+    stale = is_feed_stale(bot)
+
+    if not bot.is_session_ready:
+        status = "down"
+    elif stale:
+        status = "degraded"
+    else:
+        status = "ok"
+
+    last_message_at = health.pop("last_message_at")
+    last_pnl_at = health.pop("last_pnl_at")
+    health.pop("pnl_requested_at")
+
+    reconnect = {k: v for k, v in bot.reconnect_stats.items() if k != "disconnected_at"}
+
+    return {
+        "status": status,
+        "session_ready": bot.is_session_ready,
+        "feed_stale": stale,
+        "seconds_since_last_message": None if last_message_at is None else now - last_message_at,
+        "seconds_since_last_pnl": None if last_pnl_at is None else now - last_pnl_at,
+        "open_positions": len(bot.positions),
+        **health,
+        "reconnect": reconnect,
+        "tasks": scheduler_snapshot(bot),
+        "pnl_polling": polling_snapshot(bot),
+        "deal_ledger": ledger_snapshot(bot),
+        "account": account_snapshot(bot),
+        "leader": leader_snapshot(bot),
+        "wire_capture": wire_capture_snapshot(bot),
+        "decoding": decode_snapshot(bot),
+        "shared_books": shared_books_snapshot(bot),
+        "outbound": outbound_snapshot(bot),
+    }
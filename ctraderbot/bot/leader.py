@@ -0,0 +1,306 @@
+# file: ctraderbot/bot/leader.py
+"""
+Leader election between bot processes trading the same subaccount.
+
+With LEADER_ELECTION on, a process only trades while it holds the
+subaccount's row in botcore_botlease (helpers.try_acquire_lease). Every
+process tries to take or renew the lease every LEADER_RENEW_INTERVAL
+seconds; a lease lasts LEADER_LEASE_TTL seconds.
+
+The process without the lease is a hot standby: it keeps its own
+authorized session, receives the same account events (deals, balance,
+PnL) and reloads its books read-only from the DB every
+STANDBY_REFRESH_INTERVAL seconds, but sends no orders and writes
+nothing. When the leader stops renewing, the first standby to see the
+lease expired takes it (the epoch goes up by one) and starts trading
+from warm books. Worst-case failover is LEADER_LEASE_TTL +
+LEADER_RENEW_INTERVAL; the measured detect/ready times of the last
+takeover are in leader_snapshot(); `python -m ctraderbot.bot.leader_bench`
+measures failover between two holders on a scratch database.
+
+A leader fences itself: is_leader() turns false LEADER_LEASE_TTL seconds
+after the last successful renewal was *requested*, whether or not the DB
+answered, so it stops trading before any standby can take over. Lease
+times come from each process's clock, which must be NTP-synced.
+"""
+import os
+import socket
+import time
+import uuid
+import datetime as dt
+
+from twisted.internet.threads import deferToThread
+from ..database import SessionSync
+from ..helpers import try_acquire_lease, release_lease
+from ..models import Milestone, Segments, TradeDetail, Trades
+from ..money import halve, to_money
+from ..settings import LEADER_ELECTION, LEADER_LEASE_TTL, LEADER_RENEW_INTERVAL, STANDBY_REFRESH_INTERVAL
+from .scheduler import schedule_interval, cancel_task
+
+LEASE_TASK = "leader_lease"
+STANDBY_TASK = "standby_books"
+
+LEADER = "leader"
+STANDBY = "standby"
+
+
+def new_leader_state(enabled: bool = LEADER_ELECTION) -> dict:
+    return {
+        "enabled": enabled,
+        # Without election the process is always the leader, as before
+        "role": STANDBY if enabled else LEADER,
+        "holder": f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}",
+        "epoch": None,
+        "deadline": None,          # monotonic time the current lease stops covering us
+        "expires_at": None,        # lease expiry in the DB (naive UTC)
+        "current_holder": None,    # who holds it when we don't
+        "in_flight": False,
+        "attempts": 0,
+        "failures": 0,
+        "takeovers": 0,
+        "demotions": 0,
+        "last_takeover": None,     # {"epoch", "previous_holder", "detect_ms", "ready_ms"}
+        "standby_refreshes": 0,
+        "last_refresh_s": None,
+    }
+
+
+def is_leader(bot) -> bool:
+    leader = bot.leader
+    if not leader["enabled"]:
+        return True
+    return leader["role"] == LEADER and time.monotonic() < leader["deadline"]
+
+
+def start_leader_election(bot):
+    """Starts the lease loop. Does nothing when LEADER_ELECTION is off."""
+    leader = bot.leader
+    if not leader["enabled"]:
+        return
+    print(f"[LEADER] Election on as {leader['holder']} (lease {LEADER_LEASE_TTL:.0f}s, "
+          f"renew every {LEADER_RENEW_INTERVAL:.0f}s).")
+    schedule_interval(bot, LEASE_TASK, LEADER_RENEW_INTERVAL, renew_lease, bot)
+
+
+def renew_lease(bot):
+    leader = bot.leader
+    if leader["in_flight"] or bot.is_shutting_down:
+        return None
+    leader["in_flight"] = True
+    leader["attempts"] += 1
+    requested = time.monotonic()
+    d = deferToThread(try_acquire_lease, bot.account_pk, leader["holder"], LEADER_LEASE_TTL)
+    d.addCallbacks(_on_lease_result, _on_lease_failed, callbackArgs=(bot, requested), errbackArgs=(bot,))
+    return d
+
+
+def _on_lease_result(result, bot, requested):
+    leader = bot.leader
+    leader["in_flight"] = False
+    if bot.is_shutting_down:
+        return
+
+    if not result["held"]:
+        leader["current_holder"] = result["holder"]
+        leader["expires_at"] = result["expires_at"]
+        if leader["role"] == LEADER:
+            _demote(bot, f"lease now held by {result['holder']}")
+        return
+
+    leader["epoch"] = result["epoch"]
+    leader["expires_at"] = result["expires_at"]
+    leader["current_holder"] = leader["holder"]
+    leader["deadline"] = requested + LEADER_LEASE_TTL
+    if leader["role"] != LEADER:
+        _promote(bot, result)
+
+
+def _on_lease_failed(failure, bot):
+    leader = bot.leader
+    leader["in_flight"] = False
+    leader["failures"] += 1
+    print(f"[LEADER] Lease request failed: {failure.getErrorMessage()}")
+    # Without a renewal the deadline runs out and is_leader() turns false on its own;
+    # once it has, step down properly so the schedules stop too.
+    if leader["role"] == LEADER and not is_leader(bot):
+        _demote(bot, "lease could not be renewed")
+
+
+def _promote(bot, result):
+    """We hold the lease: start trading from the books the standby kept warm."""
+    from .account_state import flush_balance
+    from .auth import _start_trading
+
+    leader = bot.leader
+    leader["role"] = LEADER
+    leader["takeovers"] += 1
+    cancel_task(bot, STANDBY_TASK)
+
+    takeover = {"epoch": result["epoch"], "previous_holder": result["previous_holder"],
+                "detect_ms": None, "ready_ms": None, "started": time.monotonic()}
+    if result["previous_expires_at"] is not None:
+        # How long the lease sat expired before we noticed (naive UTC, like the column)
+        now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None)
+        takeover["detect_ms"] = max((now - result["previous_expires_at"]).total_seconds(), 0.0) * 1000
+    leader["last_takeover"] = takeover
+    print(f"[LEADER] Took the lease (epoch {result['epoch']}, previous holder "
+          f"{result['previous_holder']}, detected after {takeover['detect_ms']} ms).")
+
+    if bot.is_session_ready:
+        _start_trading(bot)
+    # Otherwise trading starts once the session is up (auth / reconnect check takeover_pending)
+    flush_balance(bot)
+
+
+def takeover_pending(bot) -> bool:
+    """We took the lease but trading has not started yet (the session was down)."""
+    takeover = bot.leader["last_takeover"]
+    return is_leader(bot) and takeover is not None and takeover["ready_ms"] is None
+
+
+def mark_ready(bot):
+    """Records how long the last takeover took until trading was running."""
+    takeover = bot.leader["last_takeover"]
+    if takeover is None or takeover["ready_ms"] is not None:
+        return
+    takeover["ready_ms"] = (time.monotonic() - takeover["started"]) * 1000
+    print(f"[LEADER] Trading as leader {takeover['ready_ms']:.0f} ms after taking the lease.")
+
+
+def _demote(bot, reason):
+    """Lost the lease: stop everything that trades or writes and fall back to standby."""
+    leader = bot.leader
+    leader["role"] = STANDBY
+    leader["demotions"] += 1
+    print(f"[LEADER] Stepping down: {reason}.")
+    cancel_task(bot, "daily_trade")
+    if bot.token_refresh_timer and bot.token_refresh_timer.active():
+        bot.token_refresh_timer.cancel()
+    if bot.is_session_ready:
+        start_standby(bot)
+
+
+def start_standby(bot):
+    """Follows the account read-only until the lease is ours."""
+    from .health import start_health_monitor
+
+    print(f"[LEADER] Standby: lease held by {bot.leader['current_holder']}. Keeping books warm.")
+    bot.schedule_pnl_updates()
+    start_health_monitor(bot)
+    schedule_interval(bot, STANDBY_TASK, STANDBY_REFRESH_INTERVAL, refresh_standby_books, bot)
+
+
+def refresh_standby_books(bot):
+    """Reloads the running trades from the DB and rebuilds the books from the server positions."""
+    from .trading import reconcile
+
+    started = time.monotonic()
+    d = reconcile(bot)
+    d.addCallback(lambda res: deferToThread(_load_running_books, bot.account_pk).addCallback(
+        _apply_standby_books, bot, res, started))
+    d.addErrback(lambda f: print(f"[LEADER] Standby refresh failed: {f.getErrorMessage()}"))
+    return d
+
+
+def _load_running_books(subaccount_id) -> list[dict]:
+    """Running trades with both sides, read-only (runs in a thread)."""
+    rows = []
+    with SessionSync() as s:
+        trades = (s.query(Trades).join(Segments, Trades.segment_id == Segments.id)
+                  .filter(Segments.subaccount_id == subaccount_id, Trades.status == 'running').all())
+        for trade in trades:
+            details = {d.position_type: d for d in s.query(TradeDetail).filter_by(trade_id=trade.id).all()}
+            if "long" not in details or "short" not in details:
+                continue
+            segment = s.query(Segments).get(trade.segment_id)
+            milestone = s.query(Milestone).get(trade.current_level_id)
+            rows.append({
+                "trade_id": trade.id,
+                "total_balance": halve(to_money(segment.total_balance)),
+                "ending_balance": to_money(milestone.ending_balance),
+                "long_position_id": details["long"].position_id,
+                "short_position_id": details["short"].position_id,
+            })
+    return rows
+
+
+def _apply_standby_books(rows, bot, reconcile_res, started):
+    if is_leader(bot):
+        # Took over while the refresh was running; the leader owns the books now
+        return
+    server_positions = {pos.positionId: pos for pos in reconcile_res.position}
+    positions, trade_couple = {}, {}
+    for row in rows:
+        long_pos = server_positions.get(row["long_position_id"])
+        short_pos = server_positions.get(row["short_position_id"])
+        if long_pos is None or short_pos is None:
+            # Half-closed; the leader is resolving it
+            continue
+        for pos in (long_pos, short_pos):
+            previous = bot.positions.get(pos.positionId, {})
+            positions[pos.positionId] = {
+                "symbolId": pos.tradeData.symbolId,
+                "volume": pos.tradeData.volume,
+                "entry_price": pos.price,
+                "used_margin": pos.usedMargin,
+                "swap": pos.swap,
+                "timestamp": previous.get("timestamp") or dt.datetime.now(dt.timezone.utc).isoformat(),
+                "status": "OPEN",
+                "tradeSide": pos.tradeData.tradeSide,
+                "total_balance": row["total_balance"],
+                # Keep the last PnL so equity and the dashboard don't blink
+                "unrealisedNetProfit": previous.get("unrealisedNetProfit"),
+                "grossUnrealisedProfit": previous.get("grossUnrealisedProfit"),
+            }
+        trade_couple[row["trade_id"]] = {
+            "trade_id": row["trade_id"],
+            "ending_balance": row["ending_balance"],
+            "resulted_balance": None,
+            "long_position_id": row["long_position_id"],
+            "long_status": "running",
+            "short_position_id": row["short_position_id"],
+            "short_status": "running",
+        }
+    bot.positions = positions
+    bot.trade_couple = trade_couple
+
+    leader = bot.leader
+    leader["standby_refreshes"] += 1
+    leader["last_refresh_s"] = time.monotonic() - started
+
+
+def release_leadership(bot):
+    """Gives the lease up on shutdown so a standby takes over at its next attempt."""
+    leader = bot.leader
+    cancel_task(bot, LEASE_TASK)
+    if not leader["enabled"] or leader["role"] != LEADER:
+        return None
+    leader["role"] = STANDBY
+    d = deferToThread(release_lease, bot.account_pk, leader["holder"])
+    d.addCallback(lambda released: print(f"[LEADER] Lease released: {released}."))
+    d.addErrback(lambda f: print(f"[LEADER] Could not release the lease: {f.getErrorMessage()}"))
+    return d
+
+
+def leader_snapshot(bot) -> dict:
+    leader = bot.leader
+    takeover = leader["last_takeover"]
+    remaining = None
+    if leader["role"] == LEADER and leader["deadline"] is not None:
+        remaining = max(leader["deadline"] - time.monotonic(), 0.0)
+    return {
+        "enabled": leader["enabled"],
+        "role": leader["role"] if leader["enabled"] else LEADER,
+        "is_leader": is_leader(bot),
+        "holder": leader["holder"],
+        "current_holder": leader["current_holder"],
+        "epoch": leader["epoch"],
+        "lease_remaining_s": remaining,
+        "attempts": leader["attempts"],
+        "failures": leader["failures"],
+        "takeovers": leader["takeovers"],
+        "demotions": leader["demotions"],
+        "last_takeover": None if takeover is None else {k: v for k, v in takeover.items() if k != "started"},
+        "standby_refreshes": leader["standby_refreshes"],
+        "last_refresh_s": leader["last_refresh_s"],
+    }
@@ -0,0 +1,65 @@
+# file: ctraderbot/bot/leader_bench.py
+"""
+Lease failover between two holders.
+
+    python -m ctraderbot.bot.leader_bench --ttl 1 --renew 0.2 --runs 5
+
+Two holders share one lease row in a scratch SQLite database
+(scratch_db): A takes the lease and goes silent, B retries every
+`--renew` seconds like a standby. Each run reports how long after A's
+last renewal B held the lease and how late that was past the expiry.
+"""
+import time
+
+from sqlalchemy import delete
+
+from .. import helpers
+from ..models import BotLease, Subaccount
+from ..scratch_db import bound_sessions, scratch_sessionmaker
+
+
+def measure_failover(url: str = "sqlite://", ttl: float = 1.0, renew: float = 0.2, runs: int = 5) -> list[dict]:
+    factory = scratch_sessionmaker(url, [Subaccount.__table__, BotLease.__table__])
+
+    results = []
+    with bound_sessions(factory, helpers):
+        for _ in range(runs):
+            with factory() as s:
+                s.execute(delete(BotLease))
+                s.commit()
+            first = helpers.try_acquire_lease(1, "A", ttl)
+            silent_at = time.monotonic()
+            if not first["held"] or helpers.try_acquire_lease(1, "B", ttl)["held"]:
+                raise RuntimeError("B took a lease A still holds")
+            while True:
+                time.sleep(renew)
+                taken = helpers.try_acquire_lease(1, "B", ttl)
+                if taken["held"]:
+                    break
+            failover = time.monotonic() - silent_at
+            if helpers.try_acquire_lease(1, "A", ttl)["held"]:
+                raise RuntimeError("A renewed a lease B took over")
+            results.append({"epoch": taken["epoch"], "failover_s": failover, "past_expiry_s": failover - ttl})
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure lease failover between two holders")
+    parser.add_argument("--url", default="sqlite://", help="SQLite URL (default: in-memory)")
+    parser.add_argument("--ttl", type=float, default=1.0, help="lease TTL in seconds")
+    parser.add_argument("--renew", type=float, default=0.2, help="standby retry interval in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure_failover(args.url, args.ttl, args.renew, args.runs)
+    for r in results:
+        print(f"[LEADER] epoch {r['epoch']}: standby held the lease {r['failover_s'] * 1000:.0f} ms after "
+              f"the leader went silent ({r['past_expiry_s'] * 1000:.0f} ms past expiry)")
+    worst = max(r["failover_s"] for r in results)
+    print(f"[LEADER] worst {worst * 1000:.0f} ms, bound ttl + renew = {(args.ttl + args.renew) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
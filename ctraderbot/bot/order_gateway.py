@@ -0,0 +1,239 @@
+# file: ctraderbot/bot/order_gateway.py
+"""
+Order gateway: batched, idempotent, rate-limited order submission.
+
+Intents are `(trade_id, side, volume)` tuples with side 'long' or 'short'.
+Each maps to the deterministic clientOrderId `trade_{id}_{side}_open`, so
+submitting the same intent twice is a no-op. Orders always leave from the
+reactor thread, paced by a token bucket no looser than the outbound
+scheduler's. An order's ack timeout starts when the outbound scheduler
+hands it to the client, not when it is queued. Each order's lifecycle is
+tracked by the state machine in order_state.
+"""
+import time
+from collections import deque
+
+from twisted.internet import reactor
+from twisted.python.threadable import isInIOThread
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import *
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F403,E402
+from ..settings import ORDER_RATE_PER_SECOND, ORDER_BURST, OUTBOUND_RATE_PER_SECOND, OUTBOUND_BURST
+from .leader import is_leader
+from .outbound import send, NotLeader, OPEN
+from .order_state import (
+    PENDING_NEW,
+    ACKED,
+    FILLED,
+    REJECTED,
+    new_order_record,
+    is_error_response,
+    transition,
+    arm_timeout,
+    _cancel_timer,
+)
+
+_SIDE_TO_TRADE_SIDE = {"long": "BUY", "short": "SELL"}
+
+# A looser bucket than the outbound one would only move the wait into its OPEN queue
+_RATE = min(ORDER_RATE_PER_SECOND, OUTBOUND_RATE_PER_SECOND)
+_BURST = min(ORDER_BURST, OUTBOUND_BURST)
+
+
+def new_gateway_state() -> dict:
+    return {
+        "queue": deque(),
+        "tokens": float(_BURST),
+        "refilled_at": time.monotonic(),
+        "drain_call": None,
+        "stats": {
+            "submitted": 0,
+            "duplicates": 0,
+            "sent": 0,
+            "acked": 0,
+            "filled": 0,
+            "rejected": 0,
+            "ack_ms_avg": None,
+            "ack_ms_max": 0.0,
+            "fill_ms_avg": None,
+            "fill_ms_max": 0.0,
+        },
+    }
+
+
+def open_order_coid(trade_id: int, side: str) -> str:
+    return f"trade_{trade_id}_{side}_open"
+
+
+def submit_open_orders(bot, intents):
+    """
+    Queues a batch of opening orders. Safe to call from any thread; the
+    actual work always happens on the reactor thread.
+    """
+    if not isInIOThread():
+        reactor.callFromThread(submit_open_orders, bot, list(intents))
+        return
+    if not is_leader(bot):
+        print("[GATEWAY] Not the leader. Dropping opening orders.")
+        return
+
+    stats = bot.order_gateway["stats"]
+    queued = 0
+    for trade_id, side, volume in intents:
+        coid = open_order_coid(trade_id, side)
+        existing = bot.orders.get(coid)
+        if existing and existing["state"] != REJECTED:
+            stats["duplicates"] += 1
+            print(f"[GATEWAY] Skipping duplicate order {coid} (state={existing['state']}).")
+            continue
+
+        if existing:
+            _cancel_timer(existing)
+        bot.orders[coid] = new_order_record(PENDING_NEW, trade_id=trade_id, side=side, volume=volume)
+        bot.order_gateway["queue"].append(coid)
+        stats["submitted"] += 1
+        queued += 1
+
+    if queued:
+        print(f"[GATEWAY] Queued {queued} order(s); {len(bot.order_gateway['queue'])} waiting.")
+        _drain(bot)
+
+
+def _refill(gateway):
+    now = time.monotonic()
+    elapsed = now - gateway["refilled_at"]
+    gateway["tokens"] = min(float(_BURST), gateway["tokens"] + elapsed * _RATE)
+    gateway["refilled_at"] = now
+
+
+def _drain(bot):
+    gateway = bot.order_gateway
+    gateway["drain_call"] = None
+    _refill(gateway)
+
+    queue = gateway["queue"]
+    while queue and gateway["tokens"] >= 1:
+        gateway["tokens"] -= 1
+        _send(bot, queue.popleft())
+
+    if queue:
+        wait = (1 - gateway["tokens"]) / _RATE
+        gateway["drain_call"] = reactor.callLater(wait, _drain, bot)
+
+
+def _send(bot, coid):
+    order = bot.orders.get(coid)
+    if not order or order["state"] != PENDING_NEW or order["sent_at"] is not None:
+        return
+
+    d = send(bot, ProtoOANewOrderReq(
+        ctidTraderAccountId=bot.account_id, symbolId=bot.symbol_id,
+        orderType=ProtoOAOrderType.MARKET,
+        tradeSide=ProtoOATradeSide.Value(_SIDE_TO_TRADE_SIDE[order["side"]]),
+        volume=order["volume"], clientOrderId=coid,
+    ), OPEN, on_sent=lambda: _on_handed_to_client(bot, coid))
+    # The first response carrying our clientMsgId is the acknowledgement.
+    # A missing one is left to the pending_new timeout.
+    d.addCallbacks(_on_send_response, _on_send_failed, callbackArgs=(bot, coid), errbackArgs=(bot, coid))
+
+
+def _on_send_failed(failure, bot, coid):
+    order = bot.orders.get(coid)
+    if failure.check(NotLeader):
+        print(f"[GATEWAY] {coid} dropped: this process lost the trading lease.")
+        _mark_rejected(bot, coid)
+        return
+    if order and order["state"] == PENDING_NEW and order["sent_at"] is None:
+        # Failed while still in the outbound queue: it never reached the server, send it again
+        print(f"[GATEWAY] {coid} was not sent ({failure.getErrorMessage()}). Re-queueing.")
+        bot.order_gateway["queue"].appendleft(coid)
+        if bot.order_gateway["drain_call"] is None:
+            _drain(bot)
+        return
+    print(f"[GATEWAY] No acknowledgement for {coid}: {failure.getErrorMessage()}")
+
+
+def _on_handed_to_client(bot, coid):
+    """The order left the outbound queue: from here the ack timeout applies."""
+    order = bot.orders.get(coid)
+    if not order or order["state"] != PENDING_NEW:
+        return
+    order["sent_at"] = time.monotonic()
+    arm_timeout(bot, coid)
+    bot.order_gateway["stats"]["sent"] += 1
+
+
+def _update_avg(stats, key, sample):
+    avg_key, max_key = f"{key}_avg", f"{key}_max"
+    previous = stats[avg_key]
+    stats[avg_key] = sample if previous is None else previous + 0.2 * (sample - previous)
+    if sample > stats[max_key]:
+        stats[max_key] = sample
+
+
+def _on_send_response(msg, bot, coid):
+    if is_error_response(msg):
+        payload = Protobuf.extract(msg)
+        print(f"[GATEWAY] {coid} rejected: {getattr(payload, 'errorCode', '')} {getattr(payload, 'description', '')}")
+        _mark_rejected(bot, coid)
+        return
+
+    order_id = None
+    if msg.payloadType == ProtoOAExecutionEvent().payloadType:
+        event = Protobuf.extract(msg)
+        if event.HasField("order"):
+            order_id = event.order.orderId
+    _mark_acked(bot, coid, order_id)
+
+
+def _mark_acked(bot, coid, order_id=None):
+    order = bot.orders.get(coid)
+    if not order or order["sent_at"] is None:
+        return
+    if order_id:
+        order["order_id"] = order_id
+    if order["acked_at"] is not None:
+        return
+    order["acked_at"] = time.monotonic()
+    if order["state"] == PENDING_NEW:
+        transition(bot, coid, ACKED)
+    order["ack_ms"] = (order["acked_at"] - order["sent_at"]) * 1000
+    stats = bot.order_gateway["stats"]
+    stats["acked"] += 1
+    _update_avg(stats, "ack_ms", order["ack_ms"])
+
+
+def _mark_rejected(bot, coid):
+    if transition(bot, coid, REJECTED):
+        bot.order_gateway["stats"]["rejected"] += 1
+
+
+def track_execution(bot, coid, execution_type, order_id=None, position_id=None):
+    """Feeds execution events for our opening orders into the state machine."""
+    order = bot.orders.get(coid)
+    if not order:
+        return
+
+    if execution_type == ProtoOAExecutionType.ORDER_ACCEPTED:
+        _mark_acked(bot, coid, order_id)
+    elif execution_type == ProtoOAExecutionType.ORDER_FILLED and order["filled_at"] is None:
+        _mark_acked(bot, coid, order_id)
+        transition(bot, coid, FILLED, position_id=position_id)
+        order["filled_at"] = time.monotonic()
+        order["fill_ms"] = (order["filled_at"] - order["sent_at"]) * 1000
+        stats = bot.order_gateway["stats"]
+        stats["filled"] += 1
+        _update_avg(stats, "fill_ms", order["fill_ms"])
+        print(f"[GATEWAY] {coid} filled in {order['fill_ms']:.1f}ms (ack {order['ack_ms']:.1f}ms).")
+    elif execution_type == ProtoOAExecutionType.ORDER_REJECTED:
+        _mark_rejected(bot, coid)
+
+
+def forget_trade_orders(bot, trade_id):
+    """Drops the order records of a finished trade."""
+    for side in _SIDE_TO_TRADE_SIDE:
+        order = bot.orders.pop(open_order_coid(trade_id, side), None)
+        if order:
+            _cancel_timer(order)
+            if bot.order_by_position.get(order["position_id"]) == open_order_coid(trade_id, side):
+                del bot.order_by_position[order["position_id"]]
@@ -0,0 +1,367 @@
+# file: ctraderbot/bot/order_state.py
+"""
+Per-order state machine with timeouts.
+
+    pending_new -> acked -> filled -> pending_close -> closed
+          \\          \\                    |
+           +----------+--> rejected        +--> filled (close rejected)
+
+Records live in `bot.orders`, keyed by clientOrderId for orders we opened
+and by `position_{id}` for positions adopted from the server. An order that
+sits in pending_new, acked or pending_close longer than its timeout is
+re-queried with ProtoOAOrderDetailsReq (or a reconcile when the server
+order id is unknown), so a lost or rejected message heals on its own.
+A re-query settles only its own order: a lost close is finished from its
+closing deal, and an opening order that never filled resets only its trade.
+"""
+import time
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThread
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import *
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F403,E402
+from ..settings import (
+    ORDER_ACK_TIMEOUT,
+    ORDER_FILL_TIMEOUT,
+    ORDER_CLOSE_TIMEOUT,
+    ORDER_MAX_RETRIES,
+)
+from .outbound import send
+
+PENDING_NEW = "pending_new"
+ACKED = "acked"
+FILLED = "filled"
+PENDING_CLOSE = "pending_close"
+CLOSED = "closed"
+REJECTED = "rejected"
+
+_ALLOWED = {
+    PENDING_NEW: {ACKED, FILLED, REJECTED},
+    ACKED: {FILLED, REJECTED},
+    FILLED: {PENDING_CLOSE, CLOSED},
+    PENDING_CLOSE: {CLOSED, FILLED},
+    CLOSED: set(),
+    REJECTED: {PENDING_NEW},
+}
+
+_TIMEOUTS = {
+    PENDING_NEW: ORDER_ACK_TIMEOUT,
+    ACKED: ORDER_FILL_TIMEOUT,
+    PENDING_CLOSE: ORDER_CLOSE_TIMEOUT,
+}
+
+# Extra history searched for the closing deal of a close whose event was lost
+_LOST_CLOSE_SLACK_S = 60
+
+_ERROR_PAYLOAD_TYPES = {ProtoOAOrderErrorEvent().payloadType, ProtoOAErrorRes().payloadType}
+
+
+def new_order_record(state, trade_id=None, side=None, volume=0, position_id=None) -> dict:
+    return {
+        "state": state,
+        "state_since": time.monotonic(),
+        "trade_id": trade_id,
+        "side": side,
+        "volume": volume,
+        "position_id": position_id,
+        "order_id": None,
+        "close_order_id": None,
+        "close_volume": None,
+        "retries": 0,
+        "timer": None,
+        "queued_at": time.monotonic(),
+        "sent_at": None,
+        "acked_at": None,
+        "filled_at": None,
+    }
+
+
+def is_error_response(msg) -> bool:
+    return msg.payloadType in _ERROR_PAYLOAD_TYPES
+
+
+def transition(bot, key, new_state, **fields) -> bool:
+    """Moves an order to `new_state` if the transition is legal and (re)arms its timeout."""
+    order = bot.orders.get(key)
+    if not order:
+        return False
+
+    old_state = order["state"]
+    if new_state != old_state and new_state not in _ALLOWED[old_state]:
+        print(f"[ORDER] Ignoring illegal transition {old_state} -> {new_state} for {key}")
+        return False
+
+    order.update(fields)
+    if fields.get("position_id") is not None:
+        bot.order_by_position[fields["position_id"]] = key
+    if new_state == old_state:
+        return True
+
+    _cancel_timer(order)
+    order["state"] = new_state
+    order["state_since"] = time.monotonic()
+    print(f"[ORDER] {key}: {old_state} -> {new_state}")
+
+    # A queued order is not on the wire yet; the gateway arms it on send.
+    if new_state != PENDING_NEW or order["sent_at"] is not None:
+        arm_timeout(bot, key)
+    return True
+
+
+def arm_timeout(bot, key):
+    order = bot.orders[key]
+    _cancel_timer(order)
+    timeout = _TIMEOUTS.get(order["state"])
+    if timeout:
+        order["timer"] = reactor.callLater(timeout, _on_timeout, bot, key, order["state"])
+
+
+def _cancel_timer(order):
+    timer = order.get("timer")
+    if timer and timer.active():
+        timer.cancel()
+    order["timer"] = None
+
+
+# --- Closing side ---
+
+def begin_close(bot, position_id, volume) -> bool:
+    """
+    Moves the position's order to pending_close. Returns False when a close
+    is already in flight (or done), so callers do not send duplicates.
+    """
+    key = bot.order_by_position.get(position_id)
+    if key is None:
+        # Position adopted from the server (reconcile/zombie); track it from here.
+        key = f"position_{position_id}"
+        bot.orders[key] = new_order_record(FILLED, volume=volume, position_id=position_id)
+        bot.order_by_position[position_id] = key
+
+    if bot.orders[key]["state"] in (PENDING_CLOSE, CLOSED):
+        print(f"[ORDER] Close for position {position_id} already {bot.orders[key]['state']}. Skipping.")
+        return False
+    return transition(bot, key, PENDING_CLOSE, close_volume=volume, close_order_id=None)
+
+
+def on_close_response(bot, position_id, msg):
+    """First response to a ProtoOAClosePositionReq: remember the order id or roll back."""
+    key = bot.order_by_position.get(position_id)
+    if key is None:
+        return
+    payload = Protobuf.extract(msg)
+    if is_error_response(msg):
+        print(f"[ORDER] Close for position {position_id} rejected: {getattr(payload, 'errorCode', '')}")
+        if not transition(bot, key, FILLED):
+            return
+        order = bot.orders[key]
+        order["retries"] += 1
+        if order["retries"] > ORDER_MAX_RETRIES:
+            print(f"[ORDER] Close for position {position_id} rejected {order['retries']} times. Giving up.")
+            return
+        # Retry after the normal close timeout instead of hammering the server
+        order["timer"] = reactor.callLater(ORDER_CLOSE_TIMEOUT, _retry_close, bot, key)
+        return
+    if msg.payloadType == ProtoOAExecutionEvent().payloadType and payload.HasField("order"):
+        bot.orders[key]["close_order_id"] = payload.order.orderId
+
+
+def abandon_close(bot, position_id):
+    """The close never left this process (e.g. the lease was lost): back to filled."""
+    key = bot.order_by_position.get(position_id)
+    if key is not None and bot.orders[key]["state"] == PENDING_CLOSE:
+        transition(bot, key, FILLED)
+
+
+def mark_closed(bot, position_id):
+    key = bot.order_by_position.get(position_id)
+    if key is not None:
+        transition(bot, key, CLOSED)
+
+
+def forget_position(bot, position_id):
+    key = bot.order_by_position.pop(position_id, None)
+    if key is not None:
+        order = bot.orders.pop(key, None)
+        if order:
+            _cancel_timer(order)
+
+
+# --- Timeouts and re-queries ---
+
+def _on_timeout(bot, key, expected_state):
+    order = bot.orders.get(key)
+    if not order or order["state"] != expected_state:
+        return
+    order["timer"] = None
+    order["retries"] += 1
+    waited = time.monotonic() - order["state_since"]
+    print(f"[ORDER] {key} stuck in '{expected_state}' for {waited:.1f}s "
+          f"(attempt {order['retries']}/{ORDER_MAX_RETRIES}).")
+
+    if order["retries"] > ORDER_MAX_RETRIES:
+        from .trading import _reconcile_positions
+        print(f"[ORDER] Giving up on {key}. Escalating to full reconciliation.")
+        _reconcile_positions(bot)
+        return
+
+    order_id = order["close_order_id"] if expected_state == PENDING_CLOSE else order["order_id"]
+    if order_id:
+        _query_order_details(bot, key, order_id)
+    else:
+        _requery_via_reconcile(bot, key)
+
+
+def _rearm(bot, key):
+    """The server still reports the order as working; wait another period."""
+    if key in bot.orders:
+        arm_timeout(bot, key)
+
+
+def _on_requery_failed(failure, bot, key):
+    print(f"[ORDER] Re-query for {key} failed: {failure.getErrorMessage()}")
+    _rearm(bot, key)
+
+
+def _query_order_details(bot, key, order_id):
+    d = send(bot, ProtoOAOrderDetailsReq(ctidTraderAccountId=bot.account_id, orderId=order_id))
+    d.addCallback(_on_order_details, bot=bot, key=key)
+    d.addErrback(_on_requery_failed, bot=bot, key=key)
+
+
+def _on_order_details(msg, bot, key):
+    from .deal_ledger import record_deal
+
+    order = bot.orders.get(key)
+    if not order:
+        return
+    if is_error_response(msg):
+        _requery_via_reconcile(bot, key)
+        return
+
+    res = Protobuf.extract(msg)
+    status = res.order.orderStatus
+    print(f"[ORDER] {key} server status: {ProtoOAOrderStatus.Name(status)}")
+
+    if status == ProtoOAOrderStatus.ORDER_STATUS_ACCEPTED:
+        _rearm(bot, key)
+    elif status == ProtoOAOrderStatus.ORDER_STATUS_FILLED:
+        if order["state"] == PENDING_CLOSE and res.deal:
+            # The closing fill event was lost: finish the close workflow from the deal
+            for deal in res.deal:
+                record_deal(bot, deal, source="order_details")
+            _finish_lost_close(bot, key, res.deal[-1].executionPrice)
+        else:
+            # The opening fill event was lost: remember the position so the trade reset closes it
+            if res.deal:
+                transition(bot, key, order["state"], position_id=res.deal[-1].positionId)
+            _requery_via_reconcile(bot, key)
+    else:
+        if order["state"] == PENDING_CLOSE:
+            transition(bot, key, FILLED)
+            _retry_close(bot, key)
+        else:
+            transition(bot, key, REJECTED)
+            _requery_via_reconcile(bot, key)
+
+
+def _finish_lost_close(bot, key, exit_price):
+    from .execution import _handle_closed_position_workflow
+
+    order = bot.orders[key]
+    position_id = order["position_id"]
+    transition(bot, key, CLOSED)
+    if position_id in bot.positions:
+        bot.positions[position_id]["status"] = "CLOSED"
+    # Commission and swap come from the deal ledger
+    deferToThread(
+        _handle_closed_position_workflow,
+        bot, position_id, exit_price,
+    ).addErrback(lambda f: print(f"[!!!] Closed position workflow failed for {position_id}: {f}"))
+
+
+def _retry_close(bot, key):
+    from .trading import close_position
+
+    order = bot.orders.get(key)
+    if not order or order["state"] != FILLED:
+        return
+    volume = order["close_volume"] or bot.positions.get(order["position_id"], {}).get("volume", 0)
+    print(f"[ORDER] Re-sending close for position {order['position_id']}.")
+    close_position(bot, order["position_id"], volume)
+
+
+def _requery_via_reconcile(bot, key):
+    from .trading import reconcile
+
+    d = reconcile(bot)
+    d.addCallback(_on_requery_reconcile, bot=bot, key=key)
+    d.addErrback(_on_requery_failed, bot=bot, key=key)
+
+
+def _on_requery_reconcile(reconcile_res, bot, key):
+    """Resolves this one order from the server's view; other trades are left alone."""
+    from .trading import reset_trade
+
+    order = bot.orders.get(key)
+    if not order:
+        return
+
+    server_position_ids = {pos.positionId for pos in reconcile_res.position}
+    working_coids = {o.clientOrderId for o in reconcile_res.order}
+
+    if order["state"] == PENDING_CLOSE:
+        if order["position_id"] in server_position_ids:
+            transition(bot, key, FILLED)
+            _retry_close(bot, key)
+            return
+        # Gone on the server: the close happened but its event was lost.
+        # Fetch the closing deal for the exit price, then finish the close.
+        _backfill_lost_close(bot, key)
+        return
+
+    if key in working_coids:
+        _rearm(bot, key)
+        return
+
+    # An opening order that is neither working nor tracked: its trade is half-open
+    if order["state"] in (PENDING_NEW, ACKED):
+        transition(bot, key, REJECTED)
+    if order["trade_id"] is not None:
+        print(f"[ORDER] {key} did not open its position. Resetting trade {order['trade_id']}.")
+        extra = [order["position_id"]] if order["position_id"] is not None else []
+        reset_trade(bot, order["trade_id"], reconcile_res, extra)
+
+
+def _backfill_lost_close(bot, key):
+    from .deal_ledger import backfill_deals, position_deals
+
+    order = bot.orders[key]
+    position_id = order["position_id"]
+    deals = position_deals(bot, position_id)
+    if deals and deals["opened_ms"] is not None:
+        from_ms = deals["opened_ms"]
+    else:
+        # The close was sent after the order entered pending_close
+        waited = time.monotonic() - order["state_since"]
+        from_ms = int((time.time() - waited - _LOST_CLOSE_SLACK_S) * 1000)
+
+    d = backfill_deals(bot, from_ms, position_ids=[position_id])
+    d.addCallback(lambda _: _on_lost_close_backfilled(bot, key))
+    d.addErrback(_on_requery_failed, bot=bot, key=key)
+
+
+def _on_lost_close_backfilled(bot, key):
+    from .deal_ledger import position_deals
+    from .trading import _reconcile_positions
+
+    order = bot.orders.get(key)
+    if not order or order["state"] != PENDING_CLOSE:
+        return
+    deals = position_deals(bot, order["position_id"])
+    if deals and deals["close_price"] is not None:
+        _finish_lost_close(bot, key, deals["close_price"])
+        return
+    print(f"[ORDER] No closing deal found for position {order['position_id']}. Escalating to full reconciliation.")
+    transition(bot, key, CLOSED)
+    _reconcile_positions(bot)
@@ -0,0 +1,266 @@
+# file: ctraderbot/bot/outbound.py
+"""
+Outbound scheduler: every request the bot sends goes through send().
+
+Requests wait in one queue per priority class and leave in class order:
+
+    SESSION  auth, spot subscriptions, logout
+    CLOSE    position closes (incl. emergency stop)
+    OPEN     new orders from the order gateway
+    ROUTINE  PnL polls, reconcile, trader/symbol/order-detail requests, latency probes
+    HISTORY  deal list pages
+
+A token bucket (OUTBOUND_RATE_PER_SECOND, OUTBOUND_BURST) limits what
+is handed to the client, and HISTORY also has its own bucket for the
+Open API's tighter limit on historical data. The client gets no more
+than it can put on the wire, so its own FIFO queue stays short and a
+close never waits behind a burst of opens or reconcile traffic. A
+request that has waited OUTBOUND_MAX_WAIT_SECONDS goes ahead of the
+higher classes, so a steady stream of closes or opens cannot starve
+PnL polls or history pages.
+
+While the account session is down (bot.is_session_ready is false) only
+SESSION requests leave; the rest wait for session_ready(). OPEN and CLOSE
+requests that reach the head of their queue after this process lost the
+trading lease are failed with NotLeader instead of sent.
+
+A request sent with a `coalesce` key joins one already waiting under
+that key instead of being queued again, and both callers get the same
+response. PnL polls use this, so a slow queue never holds a backlog of
+identical requests.
+
+`on_sent` is called when a request is handed to the client, for timers
+that should only run once the request is actually on its way.
+
+Call send() from the reactor thread. Requests still waiting when the
+connection or the account session drops are failed with ConnectionLost,
+like the client's own pending requests.
+"""
+import time
+from collections import deque
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+from .leader import is_leader
+from ..settings import (
+    OUTBOUND_RATE_PER_SECOND,
+    OUTBOUND_BURST,
+    OUTBOUND_HISTORY_RATE_PER_SECOND,
+    OUTBOUND_HISTORY_BURST,
+    OUTBOUND_MAX_WAIT_SECONDS,
+)
+
+SESSION = "session"
+CLOSE = "close"
+OPEN = "open"
+ROUTINE = "routine"
+HISTORY = "history"
+
+PRIORITIES = (SESSION, CLOSE, OPEN, ROUTINE, HISTORY)
+
+# Classes only the lease holder may send
+_LEADER_ONLY = (CLOSE, OPEN)
+
+
+class NotLeader(Exception):
+    """A trading request was dropped because this process no longer holds the lease."""
+
+
+def _new_bucket(rate: float, burst: int) -> dict:
+    return {"rate": rate, "burst": float(burst), "tokens": float(burst), "refilled_at": time.monotonic()}
+
+
+def new_outbound_state() -> dict:
+    return {
+        "queues": {priority: deque() for priority in PRIORITIES},
+        "coalesce": {},                # key -> queued entry
+        "buckets": {
+            "all": _new_bucket(OUTBOUND_RATE_PER_SECOND, OUTBOUND_BURST),
+            HISTORY: _new_bucket(OUTBOUND_HISTORY_RATE_PER_SECOND, OUTBOUND_HISTORY_BURST),
+        },
+        "drain_call": None,
+        "stats": {priority: _new_class_stats() for priority in PRIORITIES},
+    }
+
+
+def _new_class_stats() -> dict:
+    return {
+        "queued": 0,
+        "sent": 0,
+        "coalesced": 0,
+        "aged": 0,                    # sent ahead of higher classes after OUTBOUND_MAX_WAIT_SECONDS
+        "failed": 0,
+        "not_leader": 0,
+        "max_depth": 0,
+        "wait_ms_avg": None,
+        "wait_ms_max": 0.0,
+    }
+
+
+def send(bot, message, priority=ROUTINE, coalesce=None, on_sent=None, **kwargs) -> Deferred:
+    """
+    Queues `message` for bot.client.send(message, **kwargs). The Deferred
+    fires with the response, like the client's.
+    """
+    state = bot.outbound
+    stats = state["stats"][priority]
+    d = Deferred()
+
+    entry = state["coalesce"].get(coalesce) if coalesce is not None else None
+    if entry is not None:
+        entry["waiters"].append(d)
+        stats["coalesced"] += 1
+        return d
+
+    entry = {"message": message, "kwargs": kwargs, "priority": priority, "coalesce": coalesce,
+             "on_sent": on_sent, "waiters": [d], "queued_at": time.monotonic()}
+    queue = state["queues"][priority]
+    queue.append(entry)
+    if coalesce is not None:
+        state["coalesce"][coalesce] = entry
+    stats["queued"] += 1
+    if len(queue) > stats["max_depth"]:
+        stats["max_depth"] = len(queue)
+
+    if state["drain_call"] is None:
+        _drain(bot)
+    return d
+
+
+def _refill(bucket, now):
+    bucket["tokens"] = min(bucket["burst"], bucket["tokens"] + (now - bucket["refilled_at"]) * bucket["rate"])
+    bucket["refilled_at"] = now
+
+
+def session_ready(bot):
+    """Sends what was held while the account session was down. Call once bot.is_session_ready is set."""
+    if bot.outbound["drain_call"] is None:
+        _drain(bot)
+
+
+def _open_classes(bot):
+    return PRIORITIES if bot.is_session_ready else (SESSION,)
+
+
+def _drain(bot):
+    state = bot.outbound
+    state["drain_call"] = None
+    now = time.monotonic()
+    buckets = state["buckets"]
+    for bucket in buckets.values():
+        _refill(bucket, now)
+
+    shared = buckets["all"]
+    classes = _open_classes(bot)
+    _drop_if_not_leader(bot, classes)
+    wait = None
+    while shared["tokens"] >= 1:
+        # Requests past their max wait first, then the highest class with one waiting
+        aged = [p for p in classes if state["queues"][p]
+                and now - state["queues"][p][0]["queued_at"] >= OUTBOUND_MAX_WAIT_SECONDS]
+        for priority in aged + [p for p in classes if p not in aged]:
+            queue = state["queues"][priority]
+            if not queue:
+                continue
+            own = buckets.get(priority)
+            if own is not None and own["tokens"] < 1:
+                wait = _min(wait, (1 - own["tokens"]) / own["rate"])
+                continue
+            shared["tokens"] -= 1
+            if own is not None:
+                own["tokens"] -= 1
+            if priority in aged:
+                state["stats"][priority]["aged"] += 1
+            _send(bot, queue.popleft(), now)
+            break
+        else:
+            break
+    else:
+        if any(state["queues"][p] for p in classes):
+            wait = _min(wait, (1 - shared["tokens"]) / shared["rate"])
+
+    if wait is not None:
+        state["drain_call"] = reactor.callLater(wait, _drain, bot)
+
+
+def _drop_if_not_leader(bot, classes):
+    if is_leader(bot):
+        return
+    state = bot.outbound
+    for priority in _LEADER_ONLY:
+        queue = state["queues"][priority]
+        if priority not in classes or not queue:
+            continue
+        entries = list(queue)
+        queue.clear()
+        state["stats"][priority]["not_leader"] += len(entries)
+        print(f"[OUTBOUND] Not the leader. Dropping {len(entries)} queued {priority} request(s).")
+        for entry in entries:
+            if entry["coalesce"] is not None:
+                state["coalesce"].pop(entry["coalesce"], None)
+            for waiter in entry["waiters"]:
+                waiter.errback(NotLeader("lease lost before the request was sent"))
+
+
+def _min(a, b):
+    return b if a is None else min(a, b)
+
+
+def _send(bot, entry, now):
+    state = bot.outbound
+    if entry["coalesce"] is not None:
+        state["coalesce"].pop(entry["coalesce"], None)
+
+    stats = state["stats"][entry["priority"]]
+    stats["sent"] += 1
+    wait_ms = (now - entry["queued_at"]) * 1000
+    previous = stats["wait_ms_avg"]
+    stats["wait_ms_avg"] = wait_ms if previous is None else previous + 0.2 * (wait_ms - previous)
+    if wait_ms > stats["wait_ms_max"]:
+        stats["wait_ms_max"] = wait_ms
+
+    if entry["on_sent"] is not None:
+        entry["on_sent"]()
+    d = bot.client.send(entry["message"], **entry["kwargs"])
+    d.addCallbacks(_fan_out, _fan_out_failure, callbackArgs=(entry["waiters"],),
+                   errbackArgs=(entry["waiters"],))
+
+
+def _fan_out(msg, waiters):
+    for waiter in waiters:
+        waiter.callback(msg)
+
+
+def _fan_out_failure(failure, waiters):
+    for waiter in waiters:
+        waiter.errback(failure)
+
+
+def fail_queued(bot, reason):
+    """Errbacks every request that has not been handed to the client yet."""
+    state = bot.outbound
+    if state["drain_call"] is not None and state["drain_call"].active():
+        state["drain_call"].cancel()
+    state["drain_call"] = None
+    state["coalesce"].clear()
+
+    failed = 0
+    for priority, queue in state["queues"].items():
+        entries = list(queue)
+        queue.clear()
+        state["stats"][priority]["failed"] += len(entries)
+        for entry in entries:
+            for waiter in entry["waiters"]:
+                failed += 1
+                waiter.errback(ConnectionLost(reason))
+    if failed:
+        print(f"[OUTBOUND] Failed {failed} queued request(s): {reason}")
+
+
+def outbound_snapshot(bot) -> dict:
+    state = bot.outbound
+    return {
+        priority: {"depth": len(state["queues"][priority]), **state["stats"][priority]}
+        for priority in PRIORITIES
+    }
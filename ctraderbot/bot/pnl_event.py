@@ -2,55 +2,75 @@
 import datetime as dt
 import asyncio
 import httpx
-from ctrader_open_api import Protobuf
 from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F403,E402
 from twisted.internet.threads import deferToThread
 from ..database import SessionSync
 from ..models import Trades, TradeDetail
-from ..helpers import create_event_log # Import the new helper
+from .event_log import log_event
+from .symbol_cache import symbol_for
+from ..symbols import DEFAULT_SYMBOL, volume_to_lots
+from ..money import api_money, to_float
+from .health import pnl_response_is_fresh
+from .pnl_polling import adapt_pnl_polling
+from .account_state import update_equity
+from .leader import is_leader
+from .decoding import decode
+from .books_publisher import publish_books
+from ..strategy import side_outcome, resulted_balance, LIQUIDATED, SUCCESSFUL
 
 def handle_pnl_event(bot, msg):
-    pnl_res = Protobuf.extract(msg)
+    pnl_res = decode(msg)
     money_digits = pnl_res.moneyDigits
+    # Risk checks must not act on numbers that arrived too late
+    is_fresh = pnl_response_is_fresh(bot)
     # print(f"[DEBUG] UnrealizedPnLRes: {pnl_res}")
 
     for pnl_data in pnl_res.positionUnrealizedPnL:
         position_id = pnl_data.positionId
-        unrealized_pnl = pnl_data.netUnrealizedPnL / (10 ** money_digits)
-        gross_unrealized_pnl = pnl_data.grossUnrealizedPnL / (10 ** money_digits)
+        # Money ints (see money.py): exact, and no float/Decimal conversion per tick
+        unrealized_pnl = api_money(pnl_data.netUnrealizedPnL, money_digits)
+        gross_unrealized_pnl = api_money(pnl_data.grossUnrealizedPnL, money_digits)
 
         if position_id in bot.positions:
             bot.positions[position_id]["unrealisedNetProfit"] = unrealized_pnl
             bot.positions[position_id]["grossUnrealisedProfit"] = gross_unrealized_pnl
             
+            halved_balance = bot.positions[position_id]["total_balance"]
+
             # Broadcast the update
             pos_data = bot.positions[position_id]
-            actual_position_volume = pos_data["volume"] * 0.01
-            display_lot = actual_position_volume / 100_000.0
-
-            # display_lot = pos_data["volume"] / 100_000.0 # Standard lots
+            update_payload = position_payload(position_id, pos_data, symbol_for(bot, pos_data.get("symbolId")))
 
-            current_balance_float = float(bot.positions[position_id]["total_balance"])
-            halved_balance_float = current_balance_float
-            # halved_balance_float = current_balance_float / 2
-            
-            update_payload = {
-                "positionId":    position_id,
-                # "symbolId":      pos_data["symbolId"],
-                "total_balance":   round(current_balance_float, 5),
-                "lot":           display_lot,
-                "entry_price":   round(pos_data["entry_price"], 5),
-                # "price":         bot.latest_price, # You can use the latest mid-price for display
-                "netUnrealisedPnL": round(unrealized_pnl, 2),
-                "grossUnrealisedPnL": round(gross_unrealized_pnl, 2), # Added for completeness
-                "status":        pos_data["status"],
-            }
-
-            deferToThread(_check_trade_status_on_pnl, bot, position_id, halved_balance_float, unrealized_pnl)
+            if is_fresh and is_leader(bot):
+                deferToThread(_check_trade_status_on_pnl, bot, position_id, halved_balance, unrealized_pnl)
 
             print(f"[DEBUG] PnL: {update_payload}")
             asyncio.create_task(broadcast_position_update(update_payload))
 
+    update_equity(bot)
+
+    # Poll faster when a position is close to liquidation or its profit goal
+    adapt_pnl_polling(bot)
+
+    # Local readers of the shared-memory books see every tick
+    publish_books(bot)
+
+def position_payload(position_id, pos_data, symbol=DEFAULT_SYMBOL) -> dict:
+    """The dashboard's view of one position (websocket updates and snapshots)."""
+    display_lot = volume_to_lots(symbol, pos_data.get("volume", 0))
+
+    return {
+        "positionId":    position_id,
+        # "symbolId":      pos_data["symbolId"],
+        "total_balance":   to_float(pos_data.get("total_balance") or 0),
+        "lot":           display_lot,
+        "entry_price":   round(pos_data.get("entry_price") or 0, symbol["digits"]),
+        # "price":         bot.latest_price, # You can use the latest mid-price for display
+        "netUnrealisedPnL": round(to_float(pos_data.get("unrealisedNetProfit") or 0), 2),
+        "grossUnrealisedPnL": round(to_float(pos_data.get("grossUnrealisedProfit") or 0), 2), # Added for completeness
+        "status":        pos_data.get("status"),
+    }
+
 async def broadcast_position_update(data):
     async with httpx.AsyncClient() as client:
         await client.post("http://localhost:9000/broadcast", json=data)
@@ -84,47 +104,37 @@ def _check_trade_status_on_pnl(bot, position_id, halved_balance, pnl):
     
     print(f"[DEBUG] Trade Couple: {trade_info}")
 
-    ending_balance = float(trade_info["ending_balance"])
+    ending_balance = trade_info["ending_balance"]
     new_status = None
 
+    outcome = side_outcome(halved_balance, pnl, ending_balance)
+
     # 2. Check for Liquidation in memory
-    if halved_balance + pnl <= 0:
+    if outcome == LIQUIDATED:
         print(f"[!!!] LIQUIDATION DETECTED for position {position_id} in trade {trade_id}")
         new_status = 'liquidated'
         trade_info[f"{position_side}_status"] = new_status
-        trade_info["resulted_balance"] = 0
+        trade_info["resulted_balance"] = resulted_balance(halved_balance, pnl, outcome)
         log_details = {
-            "pnl": pnl,
-            "halved_balance": halved_balance,
+            "pnl": to_float(pnl),
+            "halved_balance": to_float(halved_balance),
             "reason": "Balance plus PnL reached zero or less."
         }
-        deferToThread(
-            create_event_log,
-            trade_id=trade_id,
-            position_id=position_id,
-            event_type=new_status,
-            details=log_details
-        )
+        log_event(bot, trade_id, position_id, new_status, log_details)
 
     # 3. Check for Success in memory
-    elif halved_balance + pnl > ending_balance:
+    elif outcome == SUCCESSFUL:
         print(f"[$$$] SUCCESS DETECTED for position {position_id} in trade {trade_id}")
         new_status = 'successful'
         trade_info[f"{position_side}_status"] = new_status
-        trade_info["resulted_balance"] = halved_balance + pnl
+        trade_info["resulted_balance"] = resulted_balance(halved_balance, pnl, outcome)
         log_details = {
-            "pnl": pnl,
-            "halved_balance": halved_balance,
-            "ending_balance_target": ending_balance,
+            "pnl": to_float(pnl),
+            "halved_balance": to_float(halved_balance),
+            "ending_balance_target": to_float(ending_balance),
             "reason": "Profit goal reached."
         }
-        deferToThread(
-            create_event_log,
-            trade_id=trade_id,
-            position_id=position_id,
-            event_type=new_status,
-            details=log_details
-        )
+        log_event(bot, trade_id, position_id, new_status, log_details)
 
     # 4. If a status change occurred, trigger the background DB update
     if new_status:
@@ -0,0 +1,153 @@
+# file: ctraderbot/bot/pnl_polling.py
+"""
+Adaptive PnL polling.
+
+After every PnL response each running position's distance to its two
+thresholds (liquidation at balance + PnL = 0, success above
+ending_balance) is measured as a fraction of the band between them. The
+closest position sets the polling interval: the minimum at or inside
+PNL_POLL_NEAR_MARGIN, PNL_POLL_MAX_INTERVAL at or beyond
+PNL_POLL_FAR_MARGIN, geometric in between.
+
+Every poll is a request through the outbound scheduler and draws on the
+OUTBOUND_RATE_PER_SECOND budget that orders and closes share. The
+minimum is PNL_POLL_MIN_INTERVAL, raised where needed so polls use at
+most PNL_POLL_MAX_SHARE of that budget. Closes still go first, and a
+poll that finds one waiting is merged into it.
+"""
+import math
+import time
+
+from .scheduler import set_interval
+from ..strategy import pnl_limits
+from ..settings import (
+    PNL_POLL_INTERVAL,
+    PNL_POLL_MIN_INTERVAL,
+    PNL_POLL_MAX_INTERVAL,
+    PNL_POLL_NEAR_MARGIN,
+    PNL_POLL_FAR_MARGIN,
+    PNL_POLL_MAX_SHARE,
+    OUTBOUND_RATE_PER_SECOND,
+)
+
+PNL_TASK = "pnl_updates"
+
+_EWMA_ALPHA = 0.2
+# Slow down only when the new interval is this much longer (speeding up is immediate)
+_SLOWDOWN_HYSTERESIS = 1.25
+
+# Polling any faster would take more than PNL_POLL_MAX_SHARE of the outbound budget
+_MIN_INTERVAL = max(PNL_POLL_MIN_INTERVAL, 1 / (OUTBOUND_RATE_PER_SECOND * PNL_POLL_MAX_SHARE))
+
+
+def new_polling_stats() -> dict:
+    return {
+        "interval_s": PNL_POLL_INTERVAL,
+        "interval_changes": 0,
+        "responses": 0,
+        "last_response_at": None,
+        "poll_rate_hz": None,
+        "closest_position_id": None,
+        "closest_margin": None,
+        "detections": 0,
+        "detection_latency_last_ms": None,
+        "detection_latency_avg_ms": None,
+        "detection_latency_max_ms": 0.0,
+        "detected": set(),
+    }
+
+
+def position_margins(bot) -> dict[int, float]:
+    """
+    position_id -> distance to the nearer threshold as a fraction of the
+    band between them (1.0 = at the midpoint, 0 or less = crossed).
+    """
+    margins = {}
+    for couple in bot.trade_couple.values():
+        ending_balance = couple.get("ending_balance")
+        if ending_balance is None:
+            continue
+        for side in ("long", "short"):
+            position_id = couple.get(f"{side}_position_id")
+            position = bot.positions.get(position_id)
+            if position is None or couple.get(f"{side}_status") != "running":
+                continue
+            pnl = position.get("unrealisedNetProfit")
+            if pnl is None:
+                continue
+            loss_limit, profit_target = pnl_limits(position["total_balance"], ending_balance)
+            half_band = (profit_target - loss_limit) / 2
+            if half_band <= 0:
+                margins[position_id] = 0.0
+                continue
+            margins[position_id] = min(pnl - loss_limit, profit_target - pnl) / half_band
+    return margins
+
+
+def interval_for_margin(margin) -> float:
+    """Polling interval for the closest position's margin (None = nothing open)."""
+    if margin is None or margin >= PNL_POLL_FAR_MARGIN:
+        return PNL_POLL_MAX_INTERVAL
+    if margin <= PNL_POLL_NEAR_MARGIN:
+        return _MIN_INTERVAL
+    # Geometric interpolation: each step closer shortens the interval by the same factor
+    t = (margin - PNL_POLL_NEAR_MARGIN) / (PNL_POLL_FAR_MARGIN - PNL_POLL_NEAR_MARGIN)
+    return _MIN_INTERVAL * math.exp(t * math.log(PNL_POLL_MAX_INTERVAL / _MIN_INTERVAL))
+
+
+def adapt_pnl_polling(bot):
+    """Called on the reactor thread after each PnL response has been applied."""
+    stats = bot.pnl_polling
+    now = time.monotonic()
+
+    previous = stats["last_response_at"]
+    stats["last_response_at"] = now
+    stats["responses"] += 1
+    if previous is not None and now > previous:
+        rate = 1 / (now - previous)
+        stats["poll_rate_hz"] = rate if stats["poll_rate_hz"] is None else \
+            stats["poll_rate_hz"] + _EWMA_ALPHA * (rate - stats["poll_rate_hz"])
+
+    margins = position_margins(bot)
+    _record_detections(bot, margins, now, previous)
+
+    running = {pid: m for pid, m in margins.items() if m > 0}
+    closest = min(running, key=running.get) if running else None
+    stats["closest_position_id"] = closest
+    stats["closest_margin"] = running.get(closest)
+
+    interval = interval_for_margin(stats["closest_margin"])
+    current = stats["interval_s"]
+    if interval < current or interval > current * _SLOWDOWN_HYSTERESIS:
+        stats["interval_s"] = interval
+        stats["interval_changes"] += 1
+        set_interval(bot, PNL_TASK, interval)
+
+
+def _record_detections(bot, margins, now, previous):
+    """
+    A crossed threshold happened at some point since the previous response;
+    the gap between responses plus the request's round trip bounds how late
+    it was seen.
+    """
+    stats = bot.pnl_polling
+    stats["detected"] &= set(bot.positions)
+    if previous is None:
+        return
+
+    for position_id, margin in margins.items():
+        if margin > 0 or position_id in stats["detected"]:
+            continue
+        stats["detected"].add(position_id)
+        latency_ms = ((now - previous) + (bot.health["pnl_age_s"] or 0)) * 1000
+        stats["detections"] += 1
+        stats["detection_latency_last_ms"] = latency_ms
+        avg = stats["detection_latency_avg_ms"]
+        stats["detection_latency_avg_ms"] = latency_ms if avg is None else avg + _EWMA_ALPHA * (latency_ms - avg)
+        stats["detection_latency_max_ms"] = max(stats["detection_latency_max_ms"], latency_ms)
+        print(f"[PNL] Threshold crossing on position {position_id} seen within {latency_ms:.0f}ms.")
+
+
+def polling_snapshot(bot) -> dict:
+    """JSON-safe view of the polling stats."""
+    return {k: v for k, v in bot.pnl_polling.items() if k not in ("detected", "last_response_at")}
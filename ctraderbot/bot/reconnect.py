@@ -0,0 +1,184 @@
+# file: ctraderbot/bot/reconnect.py
+"""Reconnect supervisor: keeps the bot alive across transient disconnects."""
+import random
+import time
+
+from twisted.application.internet import backoffPolicy
+from twisted.internet import reactor
+from twisted.internet.error import ConnectionLost
+from ctrader_open_api.messages.OpenApiMessages_pb2 import *
+from ..settings import RECONNECT_INITIAL_DELAY, RECONNECT_MAX_DELAY, RECONNECT_FACTOR
+from .deal_ledger import backfill_deals
+from .leader import is_leader, refresh_standby_books, takeover_pending
+from .outbound import send, fail_queued, session_ready, SESSION
+
+# Deal backfill after an outage starts this many seconds before the drop was noticed
+_DEAL_BACKFILL_SLACK_S = 60
+
+
+def build_retry_policy():
+    """
+    Retry policy for the ClientService redial loop: exponential backoff
+    capped at RECONNECT_MAX_DELAY, plus up to one second of random jitter.
+    """
+    return backoffPolicy(
+        initialDelay=RECONNECT_INITIAL_DELAY,
+        maxDelay=RECONNECT_MAX_DELAY,
+        factor=RECONNECT_FACTOR,
+        jitter=random.random,
+    )
+
+
+def _backoff_delay(attempt: int) -> float:
+    """Same curve as build_retry_policy, used for account-level re-auth."""
+    delay = min(RECONNECT_INITIAL_DELAY * (RECONNECT_FACTOR ** attempt), RECONNECT_MAX_DELAY)
+    return delay + random.random()
+
+
+def fail_pending_requests(bot, reason):
+    """Errbacks every request still queued or waiting for a response."""
+    # Requests still waiting in the outbound queues would go out before the next auth
+    fail_queued(bot, reason)
+
+    pending = list(bot.pending_requests.items())
+    bot.pending_requests.clear()
+    for request_key, waiters in pending:
+        for d in waiters:
+            if not d.called:
+                print(f"[RECONNECT] Failing pending request '{request_key}': {reason}")
+                d.errback(ConnectionLost(reason))
+
+
+def on_connection_lost(bot, reason):
+    """
+    Called on every TCP disconnect. A graceful shutdown still stops the
+    reactor; anything else is left to the ClientService, which redials
+    using the retry policy and triggers on_connected again.
+    """
+    if bot.is_shutting_down:
+        if reactor.running:
+            reactor.stop()
+        return
+
+    stats = bot.reconnect_stats
+    if bot.is_session_ready:
+        stats["disconnects"] += 1
+        stats["disconnected_at"] = time.monotonic()
+
+    bot.is_session_ready = False
+    fail_pending_requests(bot, "connection lost")
+    print(f"[RECONNECT] Connection lost ({reason}). Waiting for the client to redial...")
+
+
+def on_account_disconnected(bot):
+    """
+    The server dropped the account session but kept the socket open.
+    Re-run account auth with backoff instead of tearing the process down.
+    """
+    from .auth import after_app_auth
+
+    stats = bot.reconnect_stats
+    if bot.is_session_ready:
+        stats["disconnects"] += 1
+        stats["disconnected_at"] = time.monotonic()
+
+    bot.is_session_ready = False
+    fail_pending_requests(bot, "account disconnected")
+
+    delay = _backoff_delay(stats["auth_attempts"])
+    stats["auth_attempts"] += 1
+    print(f"[RECONNECT] Account session dropped. Re-authorizing in {delay:.1f}s "
+          f"(attempt {stats['auth_attempts']}).")
+    reactor.callLater(delay, after_app_auth, bot)
+
+
+def resume_session(bot):
+    """
+    Runs after account auth succeeds on an existing bot. Schedules are
+    already armed, so we only re-subscribe and reconcile the in-memory
+    books against what the server reports.
+    """
+    from .trading import reconcile
+
+    stats = bot.reconnect_stats
+    stats["auth_attempts"] = 0
+    resume_started = time.monotonic()
+
+    if stats["disconnected_at"] is not None:
+        outage = resume_started - stats["disconnected_at"]
+        stats["last_outage_s"] = outage
+        stats["max_outage_s"] = max(stats["max_outage_s"], outage)
+        stats["disconnected_at"] = None
+        print(f"[RECONNECT] Session restored after {outage:.2f}s offline.")
+
+    if bot.subscribed_symbols:
+        send(bot, ProtoOASubscribeSpotsReq(
+            ctidTraderAccountId=bot.account_id,
+            symbolId=sorted(bot.subscribed_symbols),
+            subscribeToSpotTimestamp=True,
+        ), SESSION)
+
+    # Part of re-establishing the session: other classes are held until it completes
+    d = reconcile(bot, SESSION)
+    d.addCallback(_on_resume_reconcile, bot=bot, resume_started=resume_started,
+                  outage=stats["last_outage_s"])
+    d.addErrback(lambda f: print(f"[!!!] Resume reconcile failed: {f}"))
+
+
+def _on_resume_reconcile(reconcile_res, bot, resume_started, outage=None):
+    """
+    Delta reconcile: refresh positions we already track and only fall
+    back to the full DB-driven reconcile when the books disagree.
+    """
+    from .trading import _on_reconcile_response
+
+    server_positions = {pos.positionId: pos for pos in reconcile_res.position}
+    known_ids = {pid for pid, pos in bot.positions.items() if pos.get("status") == "OPEN"}
+
+    vanished = known_ids - server_positions.keys()
+    unknown = server_positions.keys() - bot.positions.keys()
+
+    # Deals executed while we were offline never reached the ledger
+    if outage is not None:
+        since_ms = int((time.time() - outage - _DEAL_BACKFILL_SLACK_S) * 1000)
+        backfill_deals(bot, since_ms, position_ids=known_ids | server_positions.keys())
+
+    for pid in known_ids & server_positions.keys():
+        pos = server_positions[pid]
+        bot.positions[pid].update({
+            "volume": pos.tradeData.volume,
+            "used_margin": pos.usedMargin,
+            "swap": pos.swap,
+        })
+
+    if vanished or unknown:
+        print(f"[RECONNECT] Books drifted while offline. Vanished: {sorted(vanished)} | "
+              f"Unknown: {sorted(unknown)}. Running full reconciliation.")
+        # Positions closed while we were away never produced an execution
+        # event; drop them so the full reconcile resets their trades.
+        for pid in vanished:
+            del bot.positions[pid]
+        for trade_id, couple in list(bot.trade_couple.items()):
+            if couple.get("long_position_id") in vanished or couple.get("short_position_id") in vanished:
+                del bot.trade_couple[trade_id]
+        if is_leader(bot):
+            _on_reconcile_response(reconcile_res, bot)
+        else:
+            # A standby only re-reads; the leader repairs the trades
+            refresh_standby_books(bot)
+    else:
+        print(f"[RECONNECT] Books match the server ({len(known_ids)} open position(s)).")
+
+    stats = bot.reconnect_stats
+    stats["reconnects"] += 1
+    stats["last_resume_s"] = time.monotonic() - resume_started
+    bot.is_session_ready = True
+    session_ready(bot)
+    print(f"[RECONNECT] Resume complete in {stats['last_resume_s']:.3f}s | "
+          f"reconnects={stats['reconnects']} disconnects={stats['disconnects']} "
+          f"last_outage={stats['last_outage_s']}")
+
+    # The lease was taken while the session was down
+    if takeover_pending(bot):
+        from .auth import _start_trading
+        _start_trading(bot)
@@ -0,0 +1,304 @@
+# file: ctraderbot/bot/scheduler.py
+"""
+Task scheduler: fixed-rate intervals and cron specs on the reactor.
+
+Interval tasks run on slots `anchor + k * interval` measured on the
+monotonic clock, so handler cost never shifts the period. Cron tasks
+(`"minute hour day-of-month month day-of-week"`) are evaluated in the
+host's local time or a named timezone, so a 19:00 task stays at 19:00
+local time across DST. Every task keeps its timer handle in
+`bot.tasks[name]`, never overlaps itself, and records run-time metrics.
+A task cancelled while it runs is not re-armed.
+"""
+import datetime as dt
+import random
+import time
+from zoneinfo import ZoneInfo
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+
+# Long cron sleeps are re-checked at least this often, so wall-clock
+# adjustments (NTP steps, suspend) cannot make a task fire late by much.
+_MAX_SLEEP = 3600.0
+
+_CRON_FIELDS = (
+    ("minute", 0, 59),
+    ("hour", 0, 23),
+    ("dom", 1, 31),
+    ("month", 1, 12),
+    ("dow", 0, 7),
+)
+
+
+# --- Cron specs ---
+
+def parse_cron(spec: str) -> dict:
+    """Parses a five-field cron spec supporting `*`, lists, ranges and steps."""
+    parts = spec.split()
+    if len(parts) != 5:
+        raise ValueError(f"Cron spec needs 5 fields, got {spec!r}")
+
+    cron = {}
+    for text, (name, low, high) in zip(parts, _CRON_FIELDS):
+        values = set()
+        for item in text.split(","):
+            base, _, step = item.partition("/")
+            if base == "*":
+                start, end = low, high
+            elif "-" in base:
+                start, end = (int(v) for v in base.split("-"))
+            else:
+                start = end = int(base)
+            if start < low or end > high:
+                raise ValueError(f"Cron field {name}={item!r} out of range {low}-{high}")
+            values.update(range(start, end + 1, int(step) if step else 1))
+        cron[name] = values
+        cron[f"{name}_any"] = text == "*"
+
+    # 7 is an alias for Sunday
+    if 7 in cron["dow"]:
+        cron["dow"] = (cron["dow"] - {7}) | {0}
+    return cron
+
+
+def _day_matches(cron, day: dt.date) -> bool:
+    if day.month not in cron["month"]:
+        return False
+    dom_ok = day.day in cron["dom"]
+    dow_ok = (day.weekday() + 1) % 7 in cron["dow"]
+    # Classic cron: when both day fields are restricted, either may match
+    if not cron["dom_any"] and not cron["dow_any"]:
+        return dom_ok or dow_ok
+    return dom_ok and dow_ok
+
+
+def next_cron_time(cron: dict, after: dt.datetime, tz: ZoneInfo | None) -> dt.datetime:
+    """
+    First matching instant strictly after `after` (aware), returned in UTC.
+    `tz` None means the host's local time (with its DST rules).
+    """
+    local = after.astimezone(tz).replace(second=0, microsecond=0, tzinfo=None) + dt.timedelta(minutes=1)
+    hours, minutes = sorted(cron["hour"]), sorted(cron["minute"])
+
+    day = local.date()
+    for _ in range(366 * 5):
+        if _day_matches(cron, day):
+            for hour in hours:
+                for minute in minutes:
+                    candidate = dt.datetime.combine(day, dt.time(hour, minute))
+                    if candidate < local:
+                        continue
+                    # Times inside a DST gap resolve to the instant just after it;
+                    # a naive candidate (tz None) is read as local time
+                    fire_at = candidate.replace(tzinfo=tz).astimezone(dt.timezone.utc)
+                    if fire_at > after:
+                        return fire_at
+        day += dt.timedelta(days=1)
+    raise ValueError("Cron spec never fires")
+
+
+# --- Tasks ---
+
+def _new_task(name, kind, func, args, jitter) -> dict:
+    return {
+        "name": name,
+        "kind": kind,
+        "func": func,
+        "args": args,
+        "jitter": jitter,
+        "timer": None,
+        "running": False,
+        "due": None,
+        "stats": {
+            "runs": 0,
+            "failures": 0,
+            "overruns": 0,
+            "skipped": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "avg_duration_ms": None,
+            "max_duration_ms": 0.0,
+            "max_lateness_ms": 0.0,
+        },
+    }
+
+
+def schedule_interval(bot, name, interval, func, *args, jitter=0.0, run_now=True) -> dict:
+    """Runs `func(*args)` every `interval` seconds at a fixed rate."""
+    task = _new_task(name, f"every {interval:g}s", func, args, jitter)
+    task["interval"] = interval
+    task["anchor"] = time.monotonic()
+    task["slot"] = 0 if run_now else 1
+    _register(bot, task)
+    _arm_interval(task)
+    print(f"[SCHEDULER] '{name}' scheduled {task['kind']}.")
+    return task
+
+
+def schedule_cron(bot, name, spec, func, *args, timezone=None, jitter=0.0) -> dict:
+    """Runs `func(*args)` whenever the cron `spec` matches in `timezone` (None: local time)."""
+    task = _new_task(name, f"cron '{spec}' {timezone or 'local'}", func, args, jitter)
+    task["cron"] = parse_cron(spec)
+    task["tz"] = ZoneInfo(timezone) if timezone else None
+    _register(bot, task)
+    _arm_cron(task)
+    print(f"[SCHEDULER] '{name}' scheduled ({task['kind']}). Next run at {task['due'].isoformat()}.")
+    return task
+
+
+def set_interval(bot, name, interval):
+    """Changes an interval task's period. The new rate starts from now."""
+    task = bot.tasks.get(name)
+    if not task or task.get("interval") is None or task["interval"] == interval:
+        return
+    _cancel_timer(task)
+    task["interval"] = interval
+    task["anchor"] = time.monotonic()
+    task["slot"] = 1
+    _arm_interval(task)
+
+
+def cancel_task(bot, name):
+    task = bot.tasks.pop(name, None)
+    if task:
+        _cancel_timer(task)
+
+
+def cancel_all_tasks(bot):
+    for name in list(bot.tasks):
+        cancel_task(bot, name)
+
+
+def _register(bot, task):
+    cancel_task(bot, task["name"])
+    bot.tasks[task["name"]] = task
+    task["tasks"] = bot.tasks
+
+
+def _is_registered(task) -> bool:
+    # cancel_task() (or a reschedule under the same name) replaces or drops it
+    return task["tasks"].get(task["name"]) is task
+
+
+def _cancel_timer(task):
+    if task["timer"] and task["timer"].active():
+        task["timer"].cancel()
+    task["timer"] = None
+
+
+def _jitter(task) -> float:
+    return random.uniform(0, task["jitter"]) if task["jitter"] else 0.0
+
+
+def _arm_interval(task):
+    task["due"] = task["anchor"] + task["slot"] * task["interval"]
+    delay = max(task["due"] - time.monotonic(), 0) + _jitter(task)
+    task["timer"] = reactor.callLater(delay, _fire_interval, task)
+
+
+def _arm_cron(task):
+    now = dt.datetime.now(dt.timezone.utc)
+    task["due"] = next_cron_time(task["cron"], now, task["tz"])
+    task["fire_jitter"] = _jitter(task)
+    _sleep_until_cron(task)
+
+
+def _sleep_until_cron(task):
+    remaining = (task["due"] - dt.datetime.now(dt.timezone.utc)).total_seconds() + task["fire_jitter"]
+    if remaining > _MAX_SLEEP:
+        task["timer"] = reactor.callLater(_MAX_SLEEP, _sleep_until_cron, task)
+    else:
+        task["timer"] = reactor.callLater(max(remaining, 0), _fire_cron, task)
+
+
+def _fire_interval(task):
+    now = time.monotonic()
+    _run(task, lateness=now - task["due"])
+    if not _is_registered(task) or task["timer"] is not None and task["timer"].active():
+        # Cancelled, or re-armed by set_interval() during the run
+        return
+
+    # Next slot strictly in the future; slots missed while late count as overruns
+    next_slot = int((now - task["anchor"]) // task["interval"]) + 1
+    missed = next_slot - task["slot"] - 1
+    if missed > 0:
+        task["stats"]["overruns"] += missed
+        print(f"[SCHEDULER] '{task['name']}' missed {missed} slot(s).")
+    task["slot"] = next_slot
+    _arm_interval(task)
+
+
+def _fire_cron(task):
+    lateness = (dt.datetime.now(dt.timezone.utc) - task["due"]).total_seconds() - task["fire_jitter"]
+    _run(task, lateness=lateness)
+    if _is_registered(task):
+        _arm_cron(task)
+
+
+def _run(task, lateness):
+    stats = task["stats"]
+    stats["max_lateness_ms"] = max(stats["max_lateness_ms"], lateness * 1000)
+
+    if task["running"]:
+        # The previous run (a pending Deferred) has not finished: never overlap
+        stats["overruns"] += 1
+        stats["skipped"] += 1
+        print(f"[SCHEDULER] '{task['name']}' is still running. Skipping this run.")
+        return
+
+    task["running"] = True
+    started = time.monotonic()
+    stats["last_run_at"] = dt.datetime.now(dt.timezone.utc).isoformat()
+    try:
+        result = task["func"](*task["args"])
+    except Exception as e:
+        print(f"[SCHEDULER] '{task['name']}' failed: {e}")
+        stats["failures"] += 1
+        _finish(task, started)
+        return
+
+    if isinstance(result, Deferred):
+        result.addErrback(_on_run_failed, task)
+        result.addBoth(lambda _: _finish(task, started))
+    else:
+        _finish(task, started)
+
+
+def _on_run_failed(failure, task):
+    task["stats"]["failures"] += 1
+    print(f"[SCHEDULER] '{task['name']}' failed: {failure.getErrorMessage()}")
+
+
+def _finish(task, started):
+    task["running"] = False
+    duration_ms = (time.monotonic() - started) * 1000
+    stats = task["stats"]
+    stats["runs"] += 1
+    stats["last_duration_ms"] = duration_ms
+    previous = stats["avg_duration_ms"]
+    stats["avg_duration_ms"] = duration_ms if previous is None else previous + 0.2 * (duration_ms - previous)
+    stats["max_duration_ms"] = max(stats["max_duration_ms"], duration_ms)
+
+    interval = task.get("interval")
+    if interval and duration_ms > interval * 1000:
+        stats["overruns"] += 1
+        print(f"[SCHEDULER] '{task['name']}' took {duration_ms:.0f}ms, longer than its {interval:g}s period.")
+
+
+def scheduler_snapshot(bot) -> dict:
+    """JSON-safe view of every task's schedule and metrics."""
+    snapshot = {}
+    for name, task in bot.tasks.items():
+        due = task["due"]
+        if isinstance(due, dt.datetime):
+            next_run_in = (due - dt.datetime.now(dt.timezone.utc)).total_seconds()
+        else:
+            next_run_in = None if due is None else due - time.monotonic()
+        snapshot[name] = {
+            "schedule": task["kind"],
+            "running": task["running"],
+            "next_run_in_s": next_run_in,
+            **task["stats"],
+        }
+    return snapshot
@@ -4,8 +4,25 @@ from .trading import request_unrealized_pnl
 from .event_handlers import register_callbacks
 from twisted.internet import reactor
 import datetime
+from ..settings import DAILY_TASK_CRON, SCHEDULER_TIMEZONE, SCHEDULER_JITTER
 from .trading import _get_or_create_segment_and_trade, _open_positions_for_trade
+from .token_refresh import start_token_refresh
+from .health import new_health_stats, start_health_monitor
+from .order_gateway import new_gateway_state
+from .spot_event import new_tick_recorder, start_tick_recorder
+from .scheduler import schedule_interval, schedule_cron
+from .pnl_polling import PNL_TASK, new_polling_stats
+from .event_log import new_event_log_writer, start_event_log_writer
+from .emergency_stop import emergency_stop
+from .deal_ledger import new_deal_ledger
+from .account_state import new_account_state
+from .leader import new_leader_state, start_leader_election
+from .wire_capture import new_wire_capture, start_wire_capture
+from .decoding import new_decode_stats
+from .books_publisher import new_shared_books, start_shared_books
+from .outbound import new_outbound_state
 from twisted.internet.threads import deferToThread
+from twisted.internet.defer import Deferred
 
 
 class SimpleBot:
@@ -18,15 +35,79 @@ class SimpleBot:
         self.is_shutting_down = False
         self.positions: dict[int, dict] = {}
         self.trade_couple: dict[int, dict] = {}
-        self.pnl_timer = None
+        self.tasks: dict[str, dict] = {}  # scheduler: task name -> task (timer handle + metrics)
         self.is_refreshing_token = False # Add this line
+        self.token_expires_at = None
+        self.token_refresh_timer = None
+        self.token_refresh_waiters: list = []
+
+        # Connection/session state used by the reconnect supervisor
+        self.session_started = False
+        self.is_session_ready = False
+        self.pending_requests: dict[str, list[Deferred]] = {}
+        self.subscribed_symbols: set[int] = set()
+        self.reconnect_stats = {
+            "disconnects": 0,
+            "reconnects": 0,
+            "auth_attempts": 0,
+            "disconnected_at": None,
+            "last_outage_s": None,
+            "max_outage_s": 0.0,
+            "last_resume_s": None,
+        }
+        self.health = new_health_stats()
+        self.health_timer = None
+        self.pnl_polling = new_polling_stats()
+
+        # Order gateway: clientOrderId -> order record, plus the send queue
+        self.orders: dict[str, dict] = {}
+        self.order_by_position: dict[int, str] = {}
+        self.order_gateway = new_gateway_state()
+
+        # Every request leaves through prioritized, rate-limited queues (see outbound.py)
+        self.outbound = new_outbound_state()
 
         self.current_balance = None # Used to initalize price from boot
+        # Balance/equity kept from server events (see account_state.py); current_balance mirrors it
+        self.account = new_account_state()
+
+        # Emergency stop in progress (see emergency_stop.py), or None
+        self.emergency_stop = None
+
+        # Latest quotes: symbol_id -> (bid, ask) in points, plus the traded symbol's mid price
+        self.last_quotes: dict[int, tuple[int, int]] = {}
+        self.latest_price: float = 0.0
+        self.tick_recorder = new_tick_recorder()
+
+        # Symbol metadata: symbol_id -> record from ctraderbot/symbols.py (see symbol_cache.py)
+        self.symbols: dict[int, dict] = {}
+
+        # Liquidation/success events, written to EventLog in batches
+        self.event_log = new_event_log_writer()
+
+        # Every filled deal, aggregated per position (see deal_ledger.py)
+        self.deal_ledger = new_deal_ledger()
+
+        # Lease-based leader election between processes (see leader.py)
+        self.leader = new_leader_state()
+
+        # Raw frames in and out, appended to a rotated binary log (WIRE_CAPTURE)
+        self.wire_capture = new_wire_capture()
+
+        # Inbound messages decoded / ignored undecoded / unhandled, per payloadType (see decoding.py)
+        self.decoding = new_decode_stats()
+
+        # Books mirrored into shared memory for local readers (SHARED_BOOKS, see books_publisher.py)
+        self.shared_books = new_shared_books()
 
         register_callbacks(self)
 
     def start(self):
         self.client.startService()
+        # Trade only while holding the subaccount's lease (LEADER_ELECTION)
+        start_leader_election(self)
+        start_wire_capture(self)
+        start_shared_books(self)
         reactor.run()
     
     def start_schedules(self):
@@ -34,39 +115,38 @@ class SimpleBot:
         # Start your other tasks
         self.schedule_pnl_updates()
 
+        # Refresh the access token ahead of its expiry
+        start_token_refresh(self)
+
+        # Heartbeats, latency probes and stale-feed detection
+        start_health_monitor(self)
+
+        # Persist spot ticks to the columnar tick store (RECORD_TICKS)
+        start_tick_recorder(self)
+
+        # Batched EventLog inserts
+        start_event_log_writer(self)
+
         # Start the new specific task for 19:00
         # self.schedule_periodic_task()
         self.schedule_daily_task_at_19()
     
     def schedule_pnl_updates(self):
-        """Schedules the bot to request PnL updates every 1 seconds."""
-        request_unrealized_pnl(self)
-        reactor.callLater(1, self.schedule_pnl_updates)
+        """Requests PnL updates; the interval then adapts to the positions (pnl_polling.py)."""
+        schedule_interval(self, PNL_TASK, self.pnl_polling["interval_s"], request_unrealized_pnl, self)
     
     def schedule_daily_task_at_19(self):
-        """Calculates the delay to the next 19:00 and schedules the task."""
-        now = datetime.datetime.now()
-        
-        # Set the target time to today at 19:00
-        target_time = now.replace(hour=19, minute=0, second=0, microsecond=0)
-        
-        # If it's already past 19:00 today, schedule it for tomorrow
-        if now > target_time:
-            print("[SCHEDULER] It's past 19:00 today. Scheduling for tomorrow.")
-            target_time += datetime.timedelta(days=1)
-            
-        # Calculate the delay in seconds
-        delay_seconds = (target_time - now).total_seconds()
-        
-        print(f"[SCHEDULER] Specific 19:00 task will run at {target_time} (in {delay_seconds:.0f} seconds).")
-        reactor.callLater(delay_seconds, self.run_daily_task_at_19)
+        """Schedules the daily segment/trade check (DAILY_TASK_CRON in SCHEDULER_TIMEZONE)."""
+        schedule_cron(
+            self, "daily_trade", DAILY_TASK_CRON, self.run_daily_task_at_19,
+            timezone=SCHEDULER_TIMEZONE, jitter=SCHEDULER_JITTER,
+        )
 
     def run_daily_task_at_19(self):
         """
         This is the actual task that will run at 19:00.
-        It reschedules itself to run again the next day.
+        The scheduler re-arms it for the next matching time.
         """
-        from twisted.internet import reactor
         print(f"🎉 [SCHEDULER] Running periodic task at {datetime.datetime.now()}! 🎉")
         
         # 1. Ask the function to do one specific thing: check and maybe create a trade.
@@ -75,52 +155,27 @@ class SimpleBot:
         # 2. Only act if something new was actually created.
         if new_trade:
             # 3. Perform the specific action needed: open positions for this new trade.
-            deferToThread(_open_positions_for_trade, new_trade, self)
-        
-        # Reschedule this task to run again tomorrow (24 hours * 3600 seconds)
-        # This creates a recurring daily task.
-        reactor.callLater(24 * 3600, self.run_daily_task_at_19)
+            return deferToThread(_open_positions_for_trade, new_trade, self)
     
     def emergency_stop_all_trades(self):
         """
-        Iterates through all known running positions and sends a close command for each.
+        Closes all open positions at once. Returns a Deferred that fires with
+        the per-position report once every close is confirmed or timed out.
         """
-        print("[!!!] EMERGENCY STOP INITIATED! Attempting to close all active positions.")
-        
-        # Make a copy of the items to avoid issues with modifying the dict while iterating
-        positions_to_close = list(self.positions.items())
-        
-        if not positions_to_close:
-            print("[INFO] No active positions found in memory to close.")
-            return
-
-        closed_count = 0
-        for position_id, pos_data in positions_to_close:
-            if pos_data.get("status") == "OPEN":
-                from .trading import close_position
-                volume_to_close = pos_data.get("volume", 0)
-                if volume_to_close > 0:
-                    print(f"--> Sending EMERGENCY CLOSE for position {position_id}")
-                    close_position(self, position_id, volume_to_close)
-                    closed_count += 1
-        
-        print(f"[INFO] Emergency close commands sent for {closed_count} positions.")
+        return emergency_stop(self)
 
     ##### DEVELOPMENT METHODS ONLY #####
 
     def schedule_periodic_task(self):
-        """Schedules a task to run for the first time after 2 minutes."""
-        from twisted.internet import reactor
+        """Schedules a task to run every 2 minutes, first run after 2 minutes."""
         print("[SCHEDULER] Starting periodic task. First run in 2 minutes.")
-        # Schedule the first execution after 120 seconds.
-        reactor.callLater(120, self.run_periodic_task)
+        schedule_interval(self, "periodic_trade", 120, self.run_periodic_task, run_now=False)
 
     def run_periodic_task(self):
         """
         This is the actual task that will run every 2 minutes.
-        It reschedules itself to run again.
+        The scheduler re-arms it.
         """
-        from twisted.internet import reactor
         print(f"🎉 [SCHEDULER] Running periodic task at {datetime.datetime.now()}! 🎉")
         
         # 1. Ask the function to do one specific thing: check and maybe create a trade.
@@ -129,8 +184,4 @@ class SimpleBot:
         # 2. Only act if something new was actually created.
         if new_trade:
             # 3. Perform the specific action needed: open positions for this new trade.
-            deferToThread(_open_positions_for_trade, new_trade, self)
-        
-        # --- Reschedule this same task to run again in 2 minutes (120 seconds) ---
-        print("[SCHEDULER] Rescheduling task for 2 minutes from now.")
-        reactor.callLater(120, self.run_periodic_task)
+            return deferToThread(_open_positions_for_trade, new_trade, self)
@@ -0,0 +1,116 @@
+# file: ctraderbot/bot/spot_event.py
+"""
+Spot (tick) handling: keeps the latest quote per symbol and, when
+RECORD_TICKS is on, buffers ticks for the columnar tick store.
+"""
+import time
+
+from twisted.internet import reactor
+from twisted.internet.threads import deferToThread
+from ..history.tick_store import append_ticks, last_timestamp
+from ..settings import RECORD_TICKS, TICK_STORE_DIR, TICK_FLUSH_INTERVAL
+
+# cTrader sends prices as integers scaled by 10^5
+PRICE_SCALE = 100000
+
+
+def new_tick_recorder() -> dict:
+    return {
+        "buffers": {},          # symbol_id -> {"ts": [], "bid": [], "ask": []}
+        "last_ts": {},          # symbol_id -> newest timestamp accepted
+        "flush_in_flight": False,
+        "stopping": False,
+        "timer": None,
+        "stats": {"recorded": 0, "written": 0, "out_of_order": 0, "flushes": 0},
+    }
+
+
+def handle_spot_event(bot, ev):
+    symbol_id = ev.symbolId
+    # A spot event only carries the side(s) that changed; carry the other forward.
+    bid, ask = bot.last_quotes.get(symbol_id, (0, 0))
+    if ev.HasField("bid"):
+        bid = ev.bid
+    if ev.HasField("ask"):
+        ask = ev.ask
+    bot.last_quotes[symbol_id] = (bid, ask)
+
+    if symbol_id == bot.symbol_id and bid and ask:
+        bot.latest_price = (bid + ask) / 2 / PRICE_SCALE
+
+    if RECORD_TICKS and bid and ask:
+        ts = ev.tickTimestamp if ev.HasField("tickTimestamp") else int(time.time() * 1000)
+        _record_tick(bot.tick_recorder, symbol_id, ts, bid, ask)
+
+
+def _record_tick(recorder, symbol_id, ts, bid, ask):
+    # Partitions must stay sorted for the binary-search reader
+    if ts < recorder["last_ts"].get(symbol_id, 0):
+        recorder["stats"]["out_of_order"] += 1
+        return
+    recorder["last_ts"][symbol_id] = ts
+
+    buf = recorder["buffers"].setdefault(symbol_id, {"ts": [], "bid": [], "ask": []})
+    buf["ts"].append(ts)
+    buf["bid"].append(bid)
+    buf["ask"].append(ask)
+    recorder["stats"]["recorded"] += 1
+
+
+def start_tick_recorder(bot):
+    """Loads each subscribed symbol's last stored timestamp and arms the flush loop."""
+    if not RECORD_TICKS:
+        return
+    recorder = bot.tick_recorder
+    for symbol_id in bot.subscribed_symbols:
+        recorder["last_ts"].setdefault(symbol_id, last_timestamp(TICK_STORE_DIR, symbol_id) or 0)
+    print(f"[TICKS] Recording ticks for {sorted(bot.subscribed_symbols)} into {TICK_STORE_DIR}")
+    if recorder["timer"] and recorder["timer"].active():
+        recorder["timer"].cancel()
+    _flush_loop(bot)
+
+
+def _flush_loop(bot):
+    bot.tick_recorder["timer"] = reactor.callLater(TICK_FLUSH_INTERVAL, _flush_loop, bot)
+    flush_ticks(bot.tick_recorder)
+
+
+def flush_ticks(recorder):
+    """Hands the buffered ticks to a worker thread. One flush at a time keeps appends ordered."""
+    if recorder["flush_in_flight"] or not recorder["buffers"]:
+        return
+    batch, recorder["buffers"] = recorder["buffers"], {}
+    recorder["flush_in_flight"] = True
+
+    d = deferToThread(_write_batch, batch)
+    d.addCallbacks(_on_flushed, _on_flush_failed, callbackArgs=(recorder,), errbackArgs=(recorder,))
+    return d
+
+
+def _write_batch(batch) -> int:
+    return sum(
+        append_ticks(TICK_STORE_DIR, symbol_id, buf["ts"], buf["bid"], buf["ask"])
+        for symbol_id, buf in batch.items()
+    )
+
+
+def _on_flushed(written, recorder):
+    recorder["flush_in_flight"] = False
+    recorder["stats"]["written"] += written
+    recorder["stats"]["flushes"] += 1
+    if recorder["stopping"] and recorder["buffers"]:
+        flush_ticks(recorder)
+
+
+def _on_flush_failed(failure, recorder):
+    recorder["flush_in_flight"] = False
+    print(f"[TICKS] Failed to write tick batch: {failure.getErrorMessage()}")
+
+
+def stop_tick_recorder(bot):
+    """Cancels the flush loop and writes whatever is still buffered."""
+    recorder = bot.tick_recorder
+    recorder["stopping"] = True
+    if recorder["timer"] and recorder["timer"].active():
+        recorder["timer"].cancel()
+    flush_ticks(recorder)
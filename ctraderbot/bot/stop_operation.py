@@ -1,4 +1,12 @@
 from twisted.internet import reactor
+from .spot_event import stop_tick_recorder
+from .scheduler import cancel_all_tasks
+from .event_log import stop_event_log_writer
+from .account_state import flush_balance
+from .leader import release_leadership
+from .wire_capture import stop_wire_capture
+from .books_publisher import stop_shared_books
+from .outbound import send, SESSION
 from ctrader_open_api import Protobuf
 from ctrader_open_api.messages.OpenApiMessages_pb2 import *
 from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import *       # noqa: F403,E402
@@ -16,14 +24,25 @@ def graceful_shutdown(bot):
     bot.is_shutting_down = True
 
     # --- THIS IS THE CRITICAL FIX ---
-    # Cancel the main heartbeat timer to stop the loop.
-    if bot.pnl_timer and bot.pnl_timer.active():
-        print("[Info] Cancelling main bot loop timer...")
-        bot.pnl_timer.cancel()
+    # Cancel the scheduled tasks (PnL polling, daily task) to stop the loops.
+    print("[Info] Cancelling scheduled tasks...")
+    cancel_all_tasks(bot)
+
+    if bot.health_timer and bot.health_timer.active():
+        bot.health_timer.cancel()
+    if bot.token_refresh_timer and bot.token_refresh_timer.active():
+        bot.token_refresh_timer.cancel()
+
+    stop_tick_recorder(bot)
+    stop_event_log_writer(bot)
+    flush_balance(bot)
+    release_leadership(bot)
+    stop_wire_capture(bot)
+    stop_shared_books(bot)
 
     print("[→] Sending logout request for a graceful shutdown...")
     request = ProtoOAAccountLogoutReq(ctidTraderAccountId=bot.account_id)
-    bot.client.send(request)
+    send(bot, request, SESSION)
 
 def stop_reactor(bot, msg):
     """
@@ -0,0 +1,52 @@
+# file: ctraderbot/bot/symbol_cache.py
+"""
+Symbol metadata cache.
+
+Loaded once per session with ProtoOASymbolsListReq (names) and
+ProtoOASymbolByIdReq (digits, pip position, lot size, volume limits),
+then read by every volume, pip and PnL conversion through symbol_for().
+"""
+from twisted.internet.defer import gatherResults
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import ProtoOASymbolsListReq, ProtoOASymbolByIdReq
+from ..symbols import DEFAULT_SYMBOL, symbol_from_proto
+from .order_state import is_error_response
+from .outbound import send
+
+
+def symbol_for(bot, symbol_id=None) -> dict:
+    """Cached record for `symbol_id` (default: the traded symbol), or the EURUSD defaults."""
+    return bot.symbols.get(symbol_id or bot.symbol_id, DEFAULT_SYMBOL)
+
+
+def load_symbols(bot, symbol_ids):
+    """Fetches and caches the given symbols. The Deferred fires with bot.symbols, even on failure."""
+    symbol_ids = sorted(set(symbol_ids))
+    names_d = send(bot, ProtoOASymbolsListReq(ctidTraderAccountId=bot.account_id))
+    details_d = send(bot, ProtoOASymbolByIdReq(ctidTraderAccountId=bot.account_id, symbolId=symbol_ids))
+
+    d = gatherResults([names_d, details_d], consumeErrors=True)
+    d.addCallback(_store_symbols, bot)
+    d.addErrback(_on_load_failed, bot, symbol_ids)
+    return d
+
+
+def _store_symbols(responses, bot):
+    names_msg, details_msg = responses
+    if is_error_response(names_msg) or is_error_response(details_msg):
+        raise RuntimeError("symbol request rejected by server")
+
+    names = {s.symbolId: s.symbolName for s in Protobuf.extract(names_msg).symbol}
+    for symbol in Protobuf.extract(details_msg).symbol:
+        record = symbol_from_proto(symbol, names.get(symbol.symbolId))
+        bot.symbols[symbol.symbolId] = record
+        print(f"[SYMBOL] {record['name'] or symbol.symbolId}: digits={record['digits']} "
+              f"pipPosition={record['pip_position']} lotSize={record['lot_size']} "
+              f"volume min/step={record['min_volume']}/{record['step_volume']}")
+    return bot.symbols
+
+
+def _on_load_failed(failure, bot, symbol_ids):
+    print(f"[SYMBOL] Could not load symbols {symbol_ids}: {failure.getErrorMessage()}. "
+          f"Using EURUSD defaults.")
+    return bot.symbols
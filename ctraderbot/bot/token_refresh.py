@@ -1,95 +1,159 @@
-import os
-import requests
-import mysql.connector
-from datetime import datetime, timedelta
-from ..settings import *
+# file: ctraderbot/bot/token_refresh.py
+"""Access-token refresh, run ahead of `expires_at` and on auth errors."""
+import asyncio
+import datetime as dt
+from datetime import timezone
+
+import httpx
 from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from ..helpers import fetch_active_token, rotate_access_token
+from ..settings import (
+    CLIENT_ID,
+    CLIENT_SECRET,
+    TOKEN_URL,
+    TOKEN_REFRESH_MARGIN,
+    TOKEN_REFRESH_RETRY_DELAY,
+)
+
+# Server error codes that mean "refresh the access token and re-authorize"
+TOKEN_ERROR_CODES = ("CH_ACCESS_TOKEN_INVALID", "OA_AUTH_TOKEN_EXPIRED")
+
+# One pooled client for every refresh; keeps the TLS connection warm.
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=15,
+            limits=httpx.Limits(max_connections=2, max_keepalive_connections=1),
+        )
+    return _http_client
+
+
+async def _request_new_tokens():
+    """
+    Exchanges the stored refresh token for a new pair and persists it.
+    Returns (access_token, expires_at).
+    """
+    token = await fetch_active_token()
+    if not token.refresh_token:
+        raise RuntimeError("No active refresh token found in the database.")
+    print(f"🔄 Using refresh token: ...{token.refresh_token[-6:]}")
+
+    resp = await _get_http_client().post(TOKEN_URL, data={
+        "grant_type": "refresh_token",
+        "refresh_token": token.refresh_token,
+        "client_id": CLIENT_ID,
+        "client_secret": CLIENT_SECRET,
+    })
+    resp.raise_for_status()
+
+    data = resp.json()
+    if data.get("errorCode"):
+        raise RuntimeError(f"cTrader API Error: {data['errorCode']} - {data.get('description')}")
+
+    expires_at = dt.datetime.now(timezone.utc) + dt.timedelta(seconds=data["expires_in"])
+    await rotate_access_token(token.user_id, data["accessToken"], data["refreshToken"], expires_at)
+    print("📦 New tokens saved to database.")
+
+    return data["accessToken"], expires_at
+
+
+def start_token_refresh(bot):
+    """Loads the active token's expiry and arms the proactive refresh timer."""
+    async def _load_expiry():
+        return (await fetch_active_token()).expires_at
+
+    d = Deferred.fromFuture(asyncio.ensure_future(_load_expiry()))
+
+    def _on_expiry_loaded(expires_at):
+        bot.token_expires_at = expires_at
+        schedule_token_refresh(bot)
+
+    d.addCallback(_on_expiry_loaded)
+    d.addErrback(lambda f: print(f"[TOKEN] Could not load token expiry: {f}"))
+
+
+def schedule_token_refresh(bot):
+    """(Re)arms the refresh timer TOKEN_REFRESH_MARGIN seconds before expiry."""
+    if bot.token_refresh_timer and bot.token_refresh_timer.active():
+        bot.token_refresh_timer.cancel()
+    if bot.is_shutting_down:
+        # A refresh that was in flight during shutdown does not re-arm the timer
+        return
+
+    expires_at = bot.token_expires_at
+    if expires_at is None:
+        print("[TOKEN] Active token has no expires_at. Refreshing now to learn it.")
+        delay = 0
+    else:
+        # DateTime columns come back naive; they are stored in UTC.
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        remaining = (expires_at - dt.datetime.now(timezone.utc)).total_seconds()
+        delay = max(remaining - TOKEN_REFRESH_MARGIN, 0)
+        print(f"[TOKEN] Access token expires at {expires_at}. Refresh in {delay:.0f}s.")
+
+    bot.token_refresh_timer = reactor.callLater(delay, refresh_access_token, bot)
+
+
+def refresh_access_token(bot, on_success=None):
+    """
+    Starts a refresh unless one is already in flight. `on_success(bot)` runs
+    once the new token is in memory; concurrent callers share one request.
+    """
+    if on_success and on_success not in bot.token_refresh_waiters:
+        bot.token_refresh_waiters.append(on_success)
 
-def handle_token_refresh(bot):
-    from .event_handlers import on_connected
-    
-    # Prevent infinite refresh loops
     if bot.is_refreshing_token:
-        print("[!!!] FATAL: Already attempting to refresh token. Shutting down to prevent loop.")
-        if reactor.running: reactor.stop()
+        print("[TOKEN] Refresh already in flight. Waiting for it to finish.")
         return
 
     bot.is_refreshing_token = True
-    token_url = "https://openapi.ctrader.com/apps/token"
-    
-    db = None # Initialize db connection to None
-    try:
-        # 1. Fetch the latest refresh token from your database
-        db = mysql.connector.connect(
-            host=DB_HOST,
-            user=DB_USER,
-            password=DB_PASS,
-            database=DB_NAME
-        )
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT refresh_token FROM botcore_token WHERE is_used = TRUE ORDER BY created_at DESC LIMIT 1")
-        row = cursor.fetchone()
-
-        if not row:
-            raise RuntimeError("No active refresh token found in the database.")
-
-        refresh_token_val = row["refresh_token"]
-        print(f"🔄 Using refresh token: ...{refresh_token_val[-6:]}")
-
-        # 2. Request new access token
-        resp = requests.post(token_url, data={
-            "grant_type": "refresh_token",
-            "refresh_token": refresh_token_val,
-            "client_id": CLIENT_ID,
-            "client_secret": CLIENT_SECRET
-        }, timeout=15) # Add a timeout for safety
-
-        resp.raise_for_status() # Raises an exception for bad status codes (4xx or 5xx)
-
-        data = resp.json()
-        if data.get("errorCode"):
-            raise RuntimeError(f"cTrader API Error: {data['errorCode']} - {data.get('description')}")
-
-        new_access_token = data["accessToken"]
-        new_refresh_token = data["refreshToken"]
-        expires_at = datetime.now() + timedelta(seconds=data["expires_in"])
-        
-        print("✅ Token refreshed successfully!")
-
-        # 3. Store the new tokens
-        cursor.execute("UPDATE botcore_token SET is_used = FALSE WHERE is_used = TRUE")
-        cursor.execute("""
-            INSERT INTO botcore_token (access_token, refresh_token, is_used, expires_at, created_at, user_id)
-            VALUES (%s, %s, TRUE, %s, %s, 1)
-        """, (new_access_token, new_refresh_token, expires_at, datetime.now()))
-        db.commit()
-        
-        print("📦 New tokens saved to database.")
-
-        bot.access_token = new_access_token
-        print("[SUCCESS] New access token fetched and updated in bot's memory.")
-        
-        # Reset the flag and restart the authentication process
-        bot.is_refreshing_token = False
-        # --- START OF THE FIX ---
-        # The original operation that failed was account authorization.
-        # Instead of starting a new connection, we directly re-attempt
-        # that specific step with the new token.
-        print("[INFO] Resuming account authorization with the new token...")
-        from .auth import after_app_auth
-        after_app_auth(bot) # This function sends the correct AccountAuthReq
-        # --- END OF THE FIX ---
-
-        # on_connected(bot)
-
-    except Exception as e:
-        print(f"[!!!] FATAL: An unexpected error occurred during token refresh: {e}")
-        if reactor.running:
-            reactor.stop()
-    # finally:
-    #     if db and db.is_connected():
-    #         cursor.close()
-    #         db.close()
-            
-    #     if reactor.running:
-    #         reactor.stop()
\ No newline at end of file
+    d = Deferred.fromFuture(asyncio.ensure_future(_request_new_tokens()))
+    d.addCallbacks(
+        _on_token_refreshed, _on_refresh_failed,
+        callbackArgs=(bot,), errbackArgs=(bot,),
+    )
+
+
+def _on_token_refreshed(result, bot):
+    access_token, expires_at = result
+    # The live session stays authorized; the new token is used from the
+    # next account auth onward, so trading is not interrupted.
+    bot.access_token = access_token
+    bot.token_expires_at = expires_at
+    bot.is_refreshing_token = False
+    print("[SUCCESS] New access token fetched and updated in bot's memory.")
+
+    schedule_token_refresh(bot)
+
+    waiters, bot.token_refresh_waiters = bot.token_refresh_waiters, []
+    for callback in waiters:
+        callback(bot)
+
+
+def _on_refresh_failed(failure, bot):
+    bot.is_refreshing_token = False
+    print(f"[!!!] Token refresh failed: {failure.getErrorMessage()}. "
+          f"Retrying in {TOKEN_REFRESH_RETRY_DELAY:.0f}s.")
+    # Waiters are kept so a pending re-auth still happens after the retry.
+    if bot.token_refresh_timer and bot.token_refresh_timer.active():
+        bot.token_refresh_timer.cancel()
+    if bot.is_shutting_down:
+        return
+    bot.token_refresh_timer = reactor.callLater(TOKEN_REFRESH_RETRY_DELAY, refresh_access_token, bot)
+
+
+def handle_token_refresh(bot):
+    """
+    Reactive path for CH_ACCESS_TOKEN_INVALID / OA_AUTH_TOKEN_EXPIRED:
+    refresh, then resume account authorization with the new token.
+    """
+    from .auth import after_app_auth
+
+    print("[INFO] Server rejected the access token. Refreshing before re-authorizing...")
+    refresh_access_token(bot, on_success=after_app_auth)
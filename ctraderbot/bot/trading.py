@@ -5,32 +5,53 @@ from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import *
 from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *
 from twisted.internet import reactor
 from twisted.internet.defer import Deferred
+from twisted.python.threadable import isInIOThread
 from ..helpers import *
 from twisted.internet.threads import deferToThread
 from ..database import SessionSync
-from .event_handlers import on_message
+from .health import record_pnl_request, record_pnl_request_failed
+from .order_gateway import submit_open_orders
+from .order_state import begin_close, on_close_response, abandon_close, is_error_response
+from .symbol_cache import symbol_for
+from .deal_ledger import backfill_for_positions
+from .account_state import request_trader
+from .leader import is_leader
+from .outbound import send, NotLeader, CLOSE, ROUTINE
+from ..trade_cycle import start_trade_cycle
+from ..strategy import order_volume
+from ..money import to_float, to_money
 from ctrader_open_api import Protobuf
 from datetime import datetime, timedelta, timezone
-from decimal import Decimal
 
 def send_market_order(bot):
     """
     This is the main entry point from the bot's auth flow.
-    It now kicks off the process by first fetching the account balance.
+    It kicks off the process from the account balance: the in-memory one
+    if the server has already reported it, otherwise a ProtoOATraderReq,
+    and the DB copy only if that request fails.
     """
+    balance = bot.account["balance"]
+    if balance is not None:
+        _on_balance_fetched(balance, bot)
+        return
+
     print("[Info] Fetching account balance to begin trade logic...")
-    # Start the chain by fetching the balance from the DB in a thread
-    d = deferToThread(fetch_account_balance, bot.account_pk)
+    d = request_trader(bot)
+    d.addErrback(_fetch_balance_from_db, bot)
     # When the balance is returned, the _on_balance_fetched callback will be executed
     d.addCallback(_on_balance_fetched, bot)
     d.addErrback(lambda failure: print(f"[DB ERROR] Failed to fetch account balance: {failure}"))
 
+def _fetch_balance_from_db(failure, bot):
+    print(f"[Info] Trader request failed ({failure.getErrorMessage()}). Reading the balance from the DB.")
+    return deferToThread(fetch_account_balance, bot.account_pk)
+
 def _on_balance_fetched(balance, bot):
     """
     Callback executed after the account balance is fetched from the database.
     It sets the balance on the bot instance and then proceeds with the main logic.
     """
-    print(f"[Info] Fetched current account balance: {balance}")
+    print(f"[Info] Fetched current account balance: {to_float(balance)}")
     bot.current_balance = balance  # Set the attribute here
 
     # --- START: This is the corrected startup logic ---
@@ -46,7 +67,7 @@ def _on_balance_fetched(balance, bot):
          deferToThread(_open_positions_for_trade, active_trade, bot)
     else:
         print("[STARTUP] Existing trades found. Proceeding with full reconciliation.")
-        _reconcile_positions(bot)
+        _reconcile_positions(bot, backfill=True)
     # --- END: Corrected startup logic ---
 
 def _get_or_create_segment_and_trade(bot_instance):
@@ -54,133 +75,47 @@ def _get_or_create_segment_and_trade(bot_instance):
     This function's job is to ensure the database reflects the intended state
     by creating new segments or trades if conditions are met.
     It no longer opens positions directly.
+
+    The pivot update, segment insert and trade insert happen in one
+    transaction (see trade_cycle.py); returns the new trade as a TradeRow,
+    or None when no cycle starts.
     """
-    pivot_segment = fetch_running_pivot_segment(bot_instance.account_pk)
-    if pivot_segment is None:
-        with SessionSync() as s:
-            constant = s.query(Constant).where(
-                Constant.variable == 'initial_level',
-                Constant.is_active == True
-            ).first()
-
-            # Create a new pivot segment and its first trade
-            milestone = s.query(Milestone).where(
-                Milestone.id == int(constant.value)
-            ).first()
-        
-        if not milestone: raise RuntimeError("No milestone found for current balance.")
-        
-        new_pivot = create_new_segment(
-            subaccount_id=bot_instance.account_pk, 
-            milestone_id=milestone.id,
-            total_balance=milestone.starting_balance, 
-            pair="EURUSD", 
-            is_pivot=True
-        )
-
-        new_trade = create_trade(
-            segment_id=new_pivot.id, 
-            milestone_id=milestone.id,
-            current_balance=milestone.starting_balance
-        )
-
-        return new_trade
-    else:
-        # --- 1. Check the Time Condition ---
-        print(f"Detected Pivot Segment ID: {pivot_segment.uuid}")
-
-        ### Every 19:00, we check if the segment should be extended.
-        # pivot_open_date_aware = pivot_segment.opened_at.replace(tzinfo=timezone.utc)
-        # target_datetime_utc = (pivot_open_date_aware + timedelta(days=1)).replace(
-        #     hour=17, minute=0, second=0, microsecond=0
-        # )   
-        # time_condition_met = datetime.now(timezone.utc) >= target_datetime_utc
-
-        ### Every 2 minutes, we check if the segment should be extended.
-        # pivot_open_date_aware = pivot_segment.opened_at.replace(tzinfo=timezone.utc)
-        # time_since_open = datetime.now(timezone.utc) - pivot_open_date_aware
-        # time_condition_met = time_since_open.total_seconds() >= 120
-
-        # --- 2. Check the Balance Condition ---
-        
-        with SessionSync() as s:
-            initial_level = s.query(Constant).where(
-                Constant.variable == 'initial_level',
-                Constant.is_active == True,
-            ).first()
-
-            # Find the milestone that corresponds to the current balance
-            milestone = s.query(Milestone).where(
-                Milestone.id == initial_level.value
-            ).first()
-                
-            milestone_balance = float(milestone.starting_balance)
-            
-            balance_condition_met = pivot_segment.total_balance >= (2 * milestone_balance)
-        
-        if balance_condition_met:
-            print("Extending Segments. Creating a new one.")
-            given_balance = pivot_segment.total_balance - Decimal(str(milestone_balance))
-            curr_pivot_balance = Decimal(str(milestone_balance))
-
-            # --- START: Add this block to update the database ---
-            print(f"[DB UPDATE] Updating pivot segment {pivot_segment.id} balance to: {curr_pivot_balance}")
-            pivot_segment.total_balance = curr_pivot_balance
-            with SessionSync() as s:
-                # Use merge() to update the existing detached object in the new session
-                s.merge(pivot_segment)
-                s.commit()
-            # --- END: Block to update the database ---
-
-            new_segment = create_new_segment(
-                subaccount_id=bot_instance.account_pk,
-                milestone_id=milestone.id,
-                total_balance=given_balance,
-                pair="EURUSD"  # Assuming default
-            )
-
-            # Create the new trade record
-            new_trade = create_trade(
-                segment_id=new_segment.id,
-                milestone_id=milestone.id,
-                current_balance=given_balance
-            )
-
-            return new_trade # Return the new trade object
-
-            # Immediately open the positions for the new trade we just created.
-            # We run this in a thread to avoid blocking the main loop.
-            # print(f"[Action] Triggering position opening for new Trade ID: {new_trade.id}")
-            # deferToThread(_open_positions_for_trade, new_trade, bot_instance)
-
-    return None # Signal that the DB state is ready
-
-def _reconcile_positions(bot_instance):
+    ### Every 19:00, we check if the segment should be extended.
+    # pivot_open_date_aware = pivot_segment.opened_at.replace(tzinfo=timezone.utc)
+    # target_datetime_utc = (pivot_open_date_aware + timedelta(days=1)).replace(
+    #     hour=17, minute=0, second=0, microsecond=0
+    # )   
+    # time_condition_met = datetime.now(timezone.utc) >= target_datetime_utc
+
+    ### Every 2 minutes, we check if the segment should be extended.
+    # pivot_open_date_aware = pivot_segment.opened_at.replace(tzinfo=timezone.utc)
+    # time_since_open = datetime.now(timezone.utc) - pivot_open_date_aware
+    # time_condition_met = time_since_open.total_seconds() >= 120
+
+    started = start_trade_cycle(bot_instance.account_pk, pair="EURUSD")  # Assuming default
+    if started is None:
+        return None
+    if started.pivot_balance is not None:
+        print("Extending Segments. Created a new one.")
+    return started.trade
+
+def _reconcile_positions(bot_instance, backfill=False):
     """
     Orchestrates the entire reconciliation process.
     1. Fetches server state (all open positions).
     2. Fetches DB state (all 'running' TradeDetails).
     3. Compares the two and issues commands to align the server state
        with the state intended by the database.
+    With `backfill`, deals of the open positions are loaded into the deal
+    ledger too (startup only; a resumed session backfills its own outage).
     """
     print("[Reconcile] Starting full state reconciliation...")
 
-    # Create a Deferred to handle the asynchronous response from the server
-    d = Deferred()
-    d.addCallback(_on_reconcile_response, bot=bot_instance)
+    d = reconcile(bot_instance)
+    d.addCallback(_on_reconcile_response, bot=bot_instance, backfill=backfill)
     d.addErrback(lambda failure: print(f"[ERROR] Reconcile request failed: {failure}"))
 
-    # Temporarily override the message handler to catch the specific response
-    def custom_message_handler(_, msg):
-        if msg.payloadType == ProtoOAReconcileRes().payloadType:
-            d.callback(Protobuf.extract(msg))
-            # IMPORTANT: Restore the original message handler after we're done.
-            bot_instance.client.setMessageReceivedCallback(lambda _, m: on_message(bot_instance, m))
-
-    bot_instance.client.setMessageReceivedCallback(custom_message_handler)
-    bot_instance.client.send(ProtoOAReconcileReq(ctidTraderAccountId=bot_instance.account_id))
-
-def _on_reconcile_response(reconcile_res, bot):
+def _on_reconcile_response(reconcile_res, bot, backfill=False):
     """
     Contains the core logic for comparing DB state vs. Server state
     based on the user's defined rules.
@@ -206,6 +141,7 @@ def _on_reconcile_response(reconcile_res, bot):
                 close_position(bot, pos_id, position_obj.tradeData.volume)
 
         # --- Process each running trade from our database ---
+        replacement_trades = []
         for trade in running_trades:
             details = s.query(TradeDetail).filter_by(trade_id=trade.id).all()
             
@@ -237,13 +173,13 @@ def _on_reconcile_response(reconcile_res, bot):
                         "timestamp": datetime.now(timezone.utc).isoformat(), 
                         "status": "OPEN",
                         "tradeSide": pos.tradeData.tradeSide, 
-                        "total_balance": segment.total_balance
+                        "total_balance": to_money(segment.total_balance)
                     }
                 # Load trade couple into memory
                 milestone = s.query(Milestone).get(trade.current_level_id)
                 bot.trade_couple[trade.id] = {
                     "trade_id": trade.id, 
-                    "ending_balance": milestone.ending_balance,
+                    "ending_balance": to_money(milestone.ending_balance),
                     "resulted_balance": None,
                     "long_position_id": long_detail.position_id, 
                     "long_status": "running",
@@ -256,7 +192,15 @@ def _on_reconcile_response(reconcile_res, bot):
             # This covers all the other scenarios you described.
             else:
                 print(f"[MISMATCH] Trade {trade.id} is in a broken state. Resetting.")
-                _reset_and_recreate_trade(bot, trade, server_positions, s)
+                replacement_trades.append(_reset_and_recreate_trade(bot, trade, server_positions, s))
+
+    # Open every replacement trade as one batch through the order gateway
+    if replacement_trades:
+        deferToThread(_open_positions_for_trades, replacement_trades, bot)
+
+    # At startup their opening deals predate this session: load them so closes are accounted exactly
+    if backfill:
+        backfill_for_positions(bot, server_positions.values())
 
 def _reset_and_recreate_trade(bot, old_trade, server_positions, db_session):
     """
@@ -264,7 +208,7 @@ def _reset_and_recreate_trade(bot, old_trade, server_positions, db_session):
     1. Closes any lingering server positions for the trade.
     2. Marks the old trade and its details as 'closed' in the DB.
     3. Creates a new trade record for the same segment.
-    4. Opens new positions for the new trade.
+    4. Returns the new trade so the caller can open its positions.
     """
     print(f"--> Resetting Trade ID: {old_trade.id}")
     
@@ -295,9 +239,30 @@ def _reset_and_recreate_trade(bot, old_trade, server_positions, db_session):
     # Commit all DB changes (closing old, creating new)
     db_session.commit()
     
-    # 4. Open fresh positions for the new trade
-    # We defer this to a thread to avoid blocking the main loop
-    deferToThread(_open_positions_for_trade, new_trade, bot)
+    # 4. The caller opens fresh positions for all replacement trades in one batch
+    return new_trade
+
+def reset_trade(bot, trade_id, reconcile_res, extra_position_ids=()):
+    """
+    Resets one running trade that an order re-query found half-open and
+    opens its replacement. `extra_position_ids` are server positions of the
+    trade the DB does not know about yet (an opening fill whose event was lost).
+    """
+    server_positions = {pos.positionId: pos for pos in reconcile_res.position}
+    for pid in extra_position_ids:
+        if pid in server_positions:
+            print(f"--> Closing untracked position {pid} of Trade ID: {trade_id}")
+            close_position(bot, pid, server_positions[pid].tradeData.volume)
+
+    with SessionSync() as s:
+        trade = s.query(Trades).get(trade_id)
+        if not trade or trade.status != 'running':
+            return
+        new_trade = _reset_and_recreate_trade(bot, trade, server_positions, s)
+
+    # Closing events of the old legs find no couple and leave the DB alone
+    bot.trade_couple.pop(trade_id, None)
+    deferToThread(_open_positions_for_trades, [new_trade], bot)
 
 def _open_positions_for_trade(trade: Trades, bot_instance):
     """
@@ -305,46 +270,72 @@ def _open_positions_for_trade(trade: Trades, bot_instance):
     """
     if not trade:
         return
+    _open_positions_for_trades([trade], bot_instance)
 
+def _open_positions_for_trades(trades: list[Trades], bot_instance):
+    """
+    Opens the hedging positions for a batch of trades. Runs in a worker
+    thread for the milestone lookup, then hands the orders to the gateway,
+    which sends them from the reactor thread.
+    """
+    milestone_ids = {trade.current_level_id for trade in trades}
     with SessionSync() as s:
-        milestone = s.query(Milestone).get(trade.current_level_id)
+        milestones = {
+            m.id: m for m in s.query(Milestone).filter(Milestone.id.in_(milestone_ids)).all()
+        }
+
+    batch = []
+    for trade in trades:
+        milestone = milestones.get(trade.current_level_id)
         if not milestone:
             print(f"[ERROR] Cannot find milestone for Trade {trade.id}. Skipping.")
-            return
-    
-    ending_balance = milestone.ending_balance
-    lot_size = int(float(milestone.lot_size) * 100 * 100000)
-
-    bot_instance.trade_couple[trade.id] = {
-        "trade_id": trade.id,
-        "ending_balance": ending_balance,
-        "resulted_balance": None,
-        "long_position_id": None, # This will be set at execution response
-        "long_status": None,
-        "short_position_id": None, # This will be set at execution response
-        "short_status": None,
-    }
-
-    print(f"--- Opening positions for new Trade ID: {trade.id} with lot size {lot_size} ---")
-
-    # Open LONG position
-    bot_instance.client.send(ProtoOANewOrderReq(
-        ctidTraderAccountId=bot_instance.account_id, symbolId=bot_instance.symbol_id,
-        orderType=ProtoOAOrderType.MARKET, tradeSide=ProtoOATradeSide.Value("BUY"),
-        volume=lot_size, clientOrderId=f"trade_{trade.id}_long_open"
-    ))
-    
-    # Open SHORT position
-    bot_instance.client.send(ProtoOANewOrderReq(
-        ctidTraderAccountId=bot_instance.account_id, symbolId=bot_instance.symbol_id,
-        orderType=ProtoOAOrderType.MARKET, tradeSide=ProtoOATradeSide.Value("SELL"),
-        volume=lot_size, clientOrderId=f"trade_{trade.id}_short_open"
-    ))
-
-def close_position(bot, position_id, volume_to_close):
+            continue
+        try:
+            lot_size = order_volume(milestone.lot_size, symbol_for(bot_instance))
+        except ValueError as e:
+            print(f"[ERROR] Cannot size orders for Trade {trade.id} (milestone {milestone.id}): {e}. Skipping.")
+            continue
+        batch.append((trade.id, to_money(milestone.ending_balance), lot_size))
+
+    if batch:
+        reactor.callFromThread(_submit_trade_openings, bot_instance, batch)
+
+def _submit_trade_openings(bot_instance, batch):
+    """Registers the trade couples and queues both legs of every trade."""
+    intents = []
+    for trade_id, ending_balance, lot_size in batch:
+        bot_instance.trade_couple.setdefault(trade_id, {
+            "trade_id": trade_id,
+            "ending_balance": ending_balance,
+            "resulted_balance": None,
+            "long_position_id": None, # This will be set at execution response
+            "long_status": None,
+            "short_position_id": None, # This will be set at execution response
+            "short_status": None,
+        })
+        print(f"--- Opening positions for new Trade ID: {trade_id} with lot size {lot_size} ---")
+        intents.append((trade_id, "long", lot_size))
+        intents.append((trade_id, "short", lot_size))
+
+    submit_open_orders(bot_instance, intents)
+
+def close_position(bot, position_id, volume_to_close, update_db=True):
+    """
+    Sends a close request and returns its Deferred (None when skipped).
+    With update_db=False the caller writes the DB status itself (emergency stop).
+    From a worker thread the close is handed to the reactor thread and None is returned.
+    """
+    if not isInIOThread():
+        reactor.callFromThread(close_position, bot, position_id, volume_to_close, update_db)
+        return None
     if position_id is None:
         print("[!] No open position to close.")
         return
+    if not is_leader(bot):
+        print(f"[LEADER] Not the leader. Not closing position {position_id}.")
+        return
+    if not begin_close(bot, position_id, volume_to_close):
+        return
 
     print(f"[→] Scheduled close for position {position_id} with volume {volume_to_close}")
     req = ProtoOAClosePositionReq(
@@ -354,10 +345,25 @@ def close_position(bot, position_id, volume_to_close):
         # mode=ProtoOAClosePositionMode.MARKET  # or whatever mode you prefer
     )
     
-    d = bot.client.send(req)
-    # This callback will execute the status update after the close request is sent.
-    d.addCallback(lambda _: _update_status_on_close(position_id))
-    d.addErrback(lambda f: print("[✖] Close failed:", f))
+    d = send(bot, req, CLOSE)
+    # This callback will execute the status update once the server accepts the close.
+    # A lost response is left to the pending_close timeout in order_state.
+    d.addCallback(_on_close_response, bot=bot, position_id=position_id, update_db=update_db)
+    d.addErrback(_on_close_failed, bot=bot, position_id=position_id)
+    return d
+
+def _on_close_failed(failure, bot, position_id):
+    if failure.check(NotLeader):
+        print(f"[LEADER] Lost the lease before the close for position {position_id} was sent.")
+        abandon_close(bot, position_id)
+        return
+    print("[✖] Close failed:", failure)
+
+def _on_close_response(msg, bot, position_id, update_db=True):
+    on_close_response(bot, position_id, msg)
+    if update_db and not is_error_response(msg):
+        deferToThread(_update_status_on_close, position_id)
+    return msg
 
 def _update_status_on_close(position_id: int):
     """
@@ -388,23 +394,50 @@ def _update_status_on_close(position_id: int):
         s.commit()
 
 def request_unrealized_pnl(bot):
+    # Skip polling while the session is down; the reconnect supervisor
+    # reconciles the books once the account is authorized again.
+    if not bot.is_session_ready:
+        return
+    record_pnl_request(bot)
     request = ProtoOAGetPositionUnrealizedPnLReq(ctidTraderAccountId=bot.account_id)
-    bot.client.send(request)
+    # One PnL request waiting is enough; a poll that finds one queued joins it
+    send(bot, request, coalesce="pnl").addErrback(lambda f: record_pnl_request_failed(bot, f))
 
-def reconcile(bot):
+def reconcile(bot, priority=ROUTINE):
     """
     Sends a reconcile request and returns a Deferred that will fire with the response.
+    Callers that arrive while a reconcile is in flight share its response.
     """
     d = Deferred()
+    # Tracked so the reconnect supervisor can fail it if the connection drops
+    waiters = bot.pending_requests.get("reconcile")
+    if waiters is not None:
+        waiters.append(d)
+        return d
+    waiters = bot.pending_requests["reconcile"] = [d]
+
+    send(bot, ProtoOAReconcileReq(ctidTraderAccountId=bot.account_id), priority).addCallbacks(
+        _on_reconcile_res, _on_reconcile_failed,
+        callbackArgs=(bot, waiters), errbackArgs=(bot, waiters),
+    )
+    return d
+
+def _take_reconcile_waiters(bot, waiters):
+    # A reconnect may already have failed these and started a new reconcile
+    if bot.pending_requests.get("reconcile") is waiters:
+        del bot.pending_requests["reconcile"]
+    return [w for w in waiters if not w.called]
+
+def _on_reconcile_res(msg, bot, waiters):
+    if is_error_response(msg):
+        error = RuntimeError(f"reconcile rejected: {getattr(Protobuf.extract(msg), 'errorCode', '')}")
+        for waiter in _take_reconcile_waiters(bot, waiters):
+            waiter.errback(error)
+        return
+    reconcile_res = Protobuf.extract(msg)
+    for waiter in _take_reconcile_waiters(bot, waiters):
+        waiter.callback(reconcile_res)
 
-    # Temporarily override the message handler to capture the specific response
-    def custom_reconcile_handler(_, msg):
-        if msg.payloadType == ProtoOAReconcileRes().payloadType:
-            # When we get the response, fire the Deferred with the message payload
-            d.callback(Protobuf.extract(msg))
-            # IMPORTANT: Restore the original message handler immediately
-            bot.client.setMessageReceivedCallback(lambda _, m: on_message(bot, m))
-
-    bot.client.setMessageReceivedCallback(custom_reconcile_handler)
-    bot.client.send(ProtoOAReconcileReq(ctidTraderAccountId=bot.account_id))
-    return d
\ No newline at end of file
+def _on_reconcile_failed(failure, bot, waiters):
+    for waiter in _take_reconcile_waiters(bot, waiters):
+        waiter.errback(failure)
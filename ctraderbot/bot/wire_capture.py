@@ -0,0 +1,309 @@
+# file: ctraderbot/bot/wire_capture.py
+"""
+Wire capture and replay.
+
+With WIRE_CAPTURE on, every frame the protocol sends or receives (app
+and account auth, requests, responses, events, heartbeats) is stamped,
+stripped of credentials (wire_log.redact) and buffered on the reactor
+thread, and a flush task appends the batch to the rotated binary log in
+WIRE_CAPTURE_DIR from a worker thread (see history/wire_log.py).
+
+replay_capture() feeds the inbound frames of a capture back through a
+bot's message callback, either as fast as possible or at the original
+pace, and reports per-payload handler time. With a ReplayClient the
+bot's own requests are answered by the captured responses, so
+request/response flows (reconcile, symbol loads, deal backfill) run as
+they did live. See ctraderbot/replay.py for the command line.
+"""
+import time
+from collections import defaultdict, deque
+
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+from twisted.internet.threads import deferToThread
+from ..history.wire_log import (
+    INBOUND, OUTBOUND, REDACTED_TYPES, WireRecord, append_records, iter_capture, payload_type_of, redact,
+)
+from ..settings import (
+    WIRE_CAPTURE,
+    WIRE_CAPTURE_DIR,
+    WIRE_CAPTURE_MAX_BYTES,
+    WIRE_CAPTURE_KEEP,
+    WIRE_CAPTURE_FLUSH_INTERVAL,
+    WIRE_CAPTURE_MAX_BUFFER,
+)
+from .scheduler import schedule_interval
+
+FLUSH_TASK = "wire_capture_flush"
+
+# Fast replay hands control back to the reactor after this many frames
+_REPLAY_BATCH = 500
+
+
+def new_wire_capture(enabled: bool = WIRE_CAPTURE) -> dict:
+    return {
+        "enabled": enabled,
+        "buffer": [],
+        "flush_in_flight": False,
+        "stopping": False,
+        "stats": {"inbound": 0, "outbound": 0, "bytes_written": 0, "dropped": 0,
+                  "flushes": 0, "failed_flushes": 0},
+    }
+
+
+# --- Capture ---
+
+def attach_wire_capture(bot):
+    """Hooks the current connection's protocol. Called on every (re)connect."""
+    if not bot.wire_capture["enabled"]:
+        return
+    d = bot.client.whenConnected(failAfterFailures=1)
+    d.addCallbacks(_hook_protocol, lambda _: None, callbackArgs=(bot.wire_capture,))
+
+
+def _hook_protocol(protocol, capture):
+    if getattr(protocol, "_wire_capture", None) is capture:
+        return
+    protocol._wire_capture = capture
+    string_received = protocol.stringReceived
+    send_string = protocol.sendString
+
+    def _received(data):
+        capture_frame(capture, INBOUND, data)
+        return string_received(data)
+
+    def _sent(data):
+        capture_frame(capture, OUTBOUND, data)
+        return send_string(data)
+
+    protocol.stringReceived = _received
+    protocol.sendString = _sent
+
+
+def capture_frame(capture, direction: int, data: bytes):
+    payload_type = payload_type_of(data)
+    # Auth and token frames are stored without their secrets
+    capture["buffer"].append(WireRecord(time.time_ns(), direction, payload_type, redact(payload_type, bytes(data))))
+    capture["stats"]["inbound" if direction == INBOUND else "outbound"] += 1
+    overflow = len(capture["buffer"]) - WIRE_CAPTURE_MAX_BUFFER
+    if overflow > 0:
+        # The disk is not keeping up: drop the oldest frames, not the newest
+        del capture["buffer"][:overflow]
+        capture["stats"]["dropped"] += overflow
+
+
+def start_wire_capture(bot):
+    if bot.wire_capture["enabled"]:
+        print(f"[WIRE] Capturing frames into {WIRE_CAPTURE_DIR}")
+        schedule_interval(bot, FLUSH_TASK, WIRE_CAPTURE_FLUSH_INTERVAL, flush_wire_capture,
+                          bot.wire_capture, run_now=False)
+
+
+def flush_wire_capture(capture):
+    """Hands the buffered frames to a worker thread. One flush at a time keeps the log ordered."""
+    if capture["flush_in_flight"] or not capture["buffer"]:
+        return None
+    batch, capture["buffer"] = capture["buffer"], []
+    capture["flush_in_flight"] = True
+
+    d = deferToThread(append_records, WIRE_CAPTURE_DIR, batch, WIRE_CAPTURE_MAX_BYTES, WIRE_CAPTURE_KEEP)
+    d.addCallbacks(_on_flushed, _on_flush_failed, callbackArgs=(capture,), errbackArgs=(capture, batch))
+    return d
+
+
+def _on_flushed(written, capture):
+    capture["flush_in_flight"] = False
+    capture["stats"]["bytes_written"] += written
+    capture["stats"]["flushes"] += 1
+    if capture["stopping"] and capture["buffer"]:
+        flush_wire_capture(capture)
+
+
+def _on_flush_failed(failure, capture, batch):
+    capture["flush_in_flight"] = False
+    capture["stats"]["failed_flushes"] += 1
+    print(f"[WIRE] Failed to write {len(batch)} frame(s): {failure.getErrorMessage()}")
+    if capture["stopping"]:
+        return
+    capture["buffer"][:0] = batch
+
+
+def stop_wire_capture(bot):
+    """Writes whatever is still buffered. The flush task is cancelled with the other tasks."""
+    capture = bot.wire_capture
+    capture["stopping"] = True
+    return flush_wire_capture(capture)
+
+
+def wire_capture_snapshot(bot) -> dict:
+    capture = bot.wire_capture
+    return {"enabled": capture["enabled"], "buffered": len(capture["buffer"]), **capture["stats"]}
+
+
+# --- Replay ---
+
+class ReplayClient:
+    """
+    Stands in for ctrader_open_api.Client when replaying a capture offline.
+    Requests are not sent anywhere: each one is paired, by payloadType and
+    in order, with the request the live bot sent at that point of the
+    capture, and its Deferred fires with the captured response to it.
+    """
+
+    def __init__(self):
+        self.sent = []
+        self._waiting = {}                            # captured clientMsgId -> Deferred
+        self._live = defaultdict(deque)               # payloadType -> Deferreds not yet paired
+        self._captured = defaultdict(deque)           # payloadType -> captured clientMsgIds not yet paired
+
+    @property
+    def _responseDeferreds(self):
+        # Same role as Client._responseDeferreds: clientMsgIds a request is waiting on
+        return self._waiting
+
+    def setConnectedCallback(self, callback):
+        self._connectedCallback = callback
+
+    def setDisconnectedCallback(self, callback):
+        self._disconnectedCallback = callback
+
+    def setMessageReceivedCallback(self, callback):
+        self._messageReceivedCallback = callback
+
+    def startService(self):
+        pass
+
+    def whenConnected(self, failAfterFailures=None):
+        # No protocol to hand out: heartbeats and capture hooks simply don't run
+        return Deferred()
+
+    def send(self, message, clientMsgId=None, responseTimeoutInSeconds=5, **params):
+        d = Deferred()
+        self.sent.append(message)
+        captured = self._captured[message.payloadType]
+        if captured:
+            self._waiting[captured.popleft()] = d
+        else:
+            self._live[message.payloadType].append(d)
+        return d
+
+    def expect(self, msg):
+        """A request from the capture: pair it with the bot's own request of the same type."""
+        if not msg.clientMsgId:
+            return
+        live = self._live[msg.payloadType]
+        if live:
+            self._waiting[msg.clientMsgId] = live.popleft()
+        else:
+            self._captured[msg.payloadType].append(msg.clientMsgId)
+
+    def _received(self, msg):
+        # Same order as Client._received: the callback first, then the request's Deferred
+        self._messageReceivedCallback(self, msg)
+        d = self._waiting.pop(msg.clientMsgId, None) if msg.clientMsgId else None
+        if d is not None:
+            d.callback(msg)
+
+
+def replay_capture(bot, source, pace: str = "fast", speed: float = 1.0) -> Deferred:
+    """
+    Feeds the inbound frames of `source` (a capture file or directory)
+    through bot.client. `pace` is "fast" (back to back, yielding to the
+    reactor every few hundred frames) or "original" (the captured gaps,
+    divided by `speed`). The Deferred fires with the replay stats.
+    """
+    if pace not in ("fast", "original"):
+        raise ValueError(f"unknown pace {pace!r}")
+    records = iter_capture(source)
+    stats = {
+        "frames": 0,
+        "outbound_skipped": 0,
+        "redacted_skipped": 0,
+        "errors": 0,
+        "handler_s": 0.0,
+        "by_type": defaultdict(lambda: {"count": 0, "handler_s": 0.0, "max_us": 0.0}),
+        "started": time.monotonic(),
+        "first_ts_ns": None,
+    }
+    done = Deferred()
+    reactor.callLater(0, _replay_next, bot, records, pace, speed, stats, done)
+    return done
+
+
+def _deliver(bot, rec, stats):
+    client = bot.client
+    msg = rec.message()
+    if rec.direction == OUTBOUND:
+        stats["outbound_skipped"] += 1
+        if isinstance(client, ReplayClient):
+            client.expect(msg)
+        return
+    if rec.payload_type in REDACTED_TYPES and not msg.payload:
+        # A credential frame stored as a bare envelope: nothing a handler could read
+        stats["redacted_skipped"] += 1
+        return
+
+    started = time.perf_counter()
+    try:
+        if isinstance(client, ReplayClient):
+            client._received(msg)
+        else:
+            client._messageReceivedCallback(client, msg)
+    except Exception as e:
+        # Keep going, like the live protocol would after a failing handler
+        stats["errors"] += 1
+        print(f"[WIRE] Handler failed on payloadType {rec.payload_type}: {e!r}")
+    elapsed = time.perf_counter() - started
+
+    stats["frames"] += 1
+    stats["handler_s"] += elapsed
+    by_type = stats["by_type"][rec.payload_type]
+    by_type["count"] += 1
+    by_type["handler_s"] += elapsed
+    by_type["max_us"] = max(by_type["max_us"], elapsed * 1e6)
+
+
+def _replay_next(bot, records, pace, speed, stats, done, pending=None):
+    """Delivers frames until one is not due yet (original pace) or a batch is done (fast)."""
+    try:
+        for _ in range(_REPLAY_BATCH):
+            rec = pending or next(records)
+            pending = None
+            if pace == "original":
+                if stats["first_ts_ns"] is None:
+                    stats["first_ts_ns"] = rec.ts_ns
+                delay = (stats["started"] + (rec.ts_ns - stats["first_ts_ns"]) / 1e9 / speed
+                         - time.monotonic())
+                if delay > 0:
+                    reactor.callLater(delay, _replay_next, bot, records, pace, speed, stats, done, rec)
+                    return
+            _deliver(bot, rec, stats)
+        reactor.callLater(0, _replay_next, bot, records, pace, speed, stats, done)
+    except StopIteration:
+        done.callback(replay_report(stats))
+    except Exception as e:
+        done.errback(e)
+
+
+def replay_report(stats) -> dict:
+    from ctrader_open_api import Protobuf
+
+    elapsed = time.monotonic() - stats["started"]
+    by_type = {}
+    for payload_type, t in sorted(stats["by_type"].items(), key=lambda kv: -kv[1]["handler_s"]):
+        proto = Protobuf.get(payload_type, fail=False)
+        by_type[type(proto).__name__ if proto is not None else str(payload_type)] = {
+            "count": t["count"],
+            "mean_us": t["handler_s"] / t["count"] * 1e6,
+            "max_us": t["max_us"],
+        }
+    return {
+        "frames": stats["frames"],
+        "outbound_skipped": stats["outbound_skipped"],
+        "redacted_skipped": stats["redacted_skipped"],
+        "errors": stats["errors"],
+        "seconds": elapsed,
+        "frames_per_s": stats["frames"] / elapsed if elapsed else None,
+        "handler_s": stats["handler_s"],
+        "by_type": by_type,
+    }
@@ -1,13 +1,35 @@
 """Platform‑independent Twisted↔︎asyncio reactor setup."""
 from __future__ import annotations
 import asyncio
+import os
 import sys
 
 
-def setup_asyncio_reactor() -> asyncio.AbstractEventLoop:
-    """Install the AsyncIO reactor and return the fresh event‑loop."""
+def _env_uvloop() -> bool:
+    # settings.py imports ctrader_open_api, which imports the default reactor: read .env directly
+    from dotenv import load_dotenv, find_dotenv
+
+    load_dotenv(dotenv_path=find_dotenv())
+    return os.getenv("USE_UVLOOP", "false").lower() in ("1", "true", "yes")
+
+
+def setup_asyncio_reactor(use_uvloop: bool | None = None) -> asyncio.AbstractEventLoop:
+    """
+    Install the AsyncIO reactor and return the fresh event‑loop. With
+    use_uvloop (default: the USE_UVLOOP env var) the loop is a uvloop one,
+    if the package is installed.
+    """
+    if use_uvloop is None:
+        use_uvloop = _env_uvloop()
     if sys.platform == "win32":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    elif use_uvloop:
+        try:
+            import uvloop
+        except ImportError:
+            print("[WARN] uvloop requested but not installed. Using the default event loop.")
+        else:
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
@@ -15,10 +15,10 @@ def main():
 
     # --- Step 2: Now that the reactor is installed, import everything else. ---
     import argparse
-    from ctrader_open_api import Client, TcpProtocol
     from .helpers import fetch_access_token, fetch_main_account
-    from .settings import HOST, PORT, SYMBOL_ID
+    from .settings import SYMBOL_ID
     from .bot.simple_bot import SimpleBot
+    from .transport import build_client
     from .database import engine, Base
 
     # --- Step 3: Proceed with the rest of the application logic. ---
@@ -47,7 +47,8 @@ def main():
     print(f"[DEBUG] Token retrieved | Account PK: {account_pk} | Account ID: {account_id}")
 
     # Start the bot
-    client = Client(HOST, PORT, TcpProtocol)
+    # Twisted's ctrader_open_api.Client or the asyncio transport (OPENAPI_TRANSPORT)
+    client = build_client()
     bot = SimpleBot(client, token, account_pk, account_id, SYMBOL_ID, args.hold)
     
     print("[DEBUG] Bot initialized, starting reactor...")
@@ -2,7 +2,7 @@
 """Utility coroutines shared across modules."""
 from __future__ import annotations
 
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, update
 from sqlalchemy.orm import Session as SyncSession
 import uuid
 from .database import Session, SessionSync
@@ -11,6 +11,8 @@ from datetime import timezone
 import datetime as dt
 from decimal import Decimal
 from sqlalchemy import and_
+from .symbols import DEFAULT_SYMBOL, pips_between
+from .money import to_money
 
 async def fetch_access_token() -> str:
     """Return the latest *active* access‑token from DB or raise."""
@@ -26,6 +28,36 @@ async def fetch_access_token() -> str:
             raise RuntimeError("No valid access token found in DB")
         return row[0]
 
+async def fetch_active_token() -> Token:
+    """Return the latest *active* Token row (access, refresh and expiry) or raise."""
+    async with Session() as s:
+        result = await s.execute(
+            select(Token)
+            .where(Token.is_used.is_(True))
+            .order_by(desc(Token.created_at))
+            .limit(1)
+        )
+        token = result.scalars().first()
+        if not token:
+            raise RuntimeError("No valid access token found in DB")
+        return token
+
+async def rotate_access_token(user_id: int, access_token: str, refresh_token: str, expires_at: dt.datetime):
+    """Retire the active token and store the refreshed pair in one transaction."""
+    async with Session() as s:
+        async with s.begin():
+            await s.execute(
+                update(Token).where(Token.is_used.is_(True)).values(is_used=False)
+            )
+            s.add(Token(
+                user_id=user_id,
+                access_token=access_token,
+                refresh_token=refresh_token,
+                is_used=True,
+                expires_at=expires_at,
+                created_at=dt.datetime.now(timezone.utc),
+            ))
+
 async def fetch_main_account() -> int:
     """Return the *main* account from DB or raise."""
     async with Session() as s:
@@ -167,79 +199,20 @@ def create_trade_detail(trade_id: int, segment_id: int, position_id: int, side:
         print(f"Successfully created new TradeDetail: ID={new_trade_detail.id}, PosID={position_id}")
         return new_trade_detail
 
-def update_trade_on_close(position_id: int, exit_price: float, commission: float, swap: float):
-    """
-    Finds the TradeDetail by position_id and updates it with closing data.
-    If all details for a trade are closed, it updates the parent Trade as well.
-    This version includes checks to prevent double-updates and has a more accurate P/L calculation.
-    """
-    with SessionSync() as s:
-        # 1. Find the specific TradeDetail
-        trade_detail = s.query(TradeDetail).filter_by(position_id=position_id).first()
-        if not trade_detail:
-            print(f"[DB ERROR] Could not find TradeDetail for positionId: {position_id}")
-            return
-
-        # --- FIX 1: Prevent double-updates ---
-        # If this detail has already been closed, do nothing.
-        if trade_detail.status == 'closed' and trade_detail.closed_at is not None:
-            print(f"[DB INFO] TradeDetail for position {position_id} is already closed. No action taken.")
-            return
-        
-        # Mark the detail as closed
-        trade_detail.exit_price = exit_price
-        trade_detail.closed_at = dt.datetime.now(dt.timezone.utc)
-        trade_detail.status = 'closed' # Explicitly set the status
-        
-        # Calculate pips
-        pips = (exit_price - float(trade_detail.entry_price)) * 10000
-        if trade_detail.position_type == 'short':
-            pips = -pips
-        trade_detail.pips = pips
-        
-        print(f"[DB UPDATE] Closed TradeDetail {trade_detail.id} for Pos {position_id}. Pips: {pips:.2f}")
-
-        # 2. Check if the parent Trade is now complete
-        parent_trade_id = trade_detail.trade_id
-        # We need to re-query the details within the same session to get the most up-to-date state
-        sibling_details = s.query(TradeDetail).filter_by(trade_id=parent_trade_id).all()
-        
-        all_closed = all(detail.status == 'closed' for detail in sibling_details)
-
-        if all_closed:
-            parent_trade = s.query(Trades).get(parent_trade_id)
-            print(f"[DB UPDATE] All details for Trade {parent_trade.id} are closed. Finalizing parent trade.")
-            
-            # --- FIX 2: More Accurate P/L Calculation ---
-            # Now includes commission and swap fees.
-            total_pnl = 0
-            for detail in sibling_details:
-                lot_size_units = float(detail.lot_size) * 100000
-                price_pnl = (float(detail.exit_price) - float(detail.entry_price)) * lot_size_units
-                if detail.position_type == 'short':
-                    price_pnl = -price_pnl
-                total_pnl += price_pnl
-
-            # The final P/L should account for costs. Note: commission and swap from cTrader are usually negative.
-            # We add them directly. The final commission/swap will be the sum from the last deal event.
-            final_pnl = total_pnl + commission + swap
-
-            parent_trade.ending_balance = float(parent_trade.starting_balance) + final_pnl
-            parent_trade.status = 'successful' if final_pnl >= 0 else 'liquidated'
-            parent_trade.closed_at = dt.datetime.now(dt.timezone.utc)
-
-        s.commit()
-
-def fetch_account_balance(account_pk: int) -> float:
-    """Fetches the current balance for a given subaccount primary key."""
+def fetch_account_balance(account_pk: int) -> int:
+    """Fetches the current balance (money int, see money.py) for a given subaccount primary key."""
     with SessionSync() as s:
         subaccount = s.query(Subaccount).get(account_pk)
         if not subaccount:
             raise RuntimeError(f"Subaccount with pk {account_pk} not found.")
-        return float(subaccount.balance)
+        return to_money(subaccount.balance)
 
-def update_trade_detail_on_close(position_id: int, exit_price: float, commission: float, swap: float, final_status: str):
-    """Updates a single TradeDetail row when a position is closed."""
+def update_trade_detail_on_close(position_id: int, exit_price: float, final_status: str, net_profit: Decimal | None = None, symbol: dict = DEFAULT_SYMBOL):
+    """
+    Updates a single TradeDetail row when a position is closed.
+    `net_profit` is the realised result from the deal ledger (gross profit plus
+    commission and swap); it feeds the parent trade's ending balance, so it is only logged here.
+    """
     with SessionSync() as s:
         trade_detail = s.query(TradeDetail).filter_by(position_id=position_id).first()
         if not trade_detail or trade_detail.status != 'running':
@@ -250,15 +223,14 @@ def update_trade_detail_on_close(position_id: int, exit_price: float, commission
         trade_detail.status = final_status # 'successful' or 'liquidated'
         
         # Calculate pips
-        pips = (exit_price - float(trade_detail.entry_price)) * 10000
-        if trade_detail.position_type == 'short':
-            pips = -pips
+        pips = pips_between(symbol, trade_detail.entry_price, exit_price, trade_detail.position_type == 'short')
         trade_detail.pips = pips
         
-        print(f"[DB UPDATE] Set TradeDetail for Pos {position_id} to '{final_status}'.")
+        net = "" if net_profit is None else f" Net: {net_profit:.2f}"
+        print(f"[DB UPDATE] Set TradeDetail for Pos {position_id} to '{final_status}'. Pips: {pips:.2f}.{net}")
         s.commit()
 
-def update_parent_trade_status(trade_id: int, final_status: str, resulted_balance: float):
+def update_parent_trade_status(trade_id: int, final_status: str, resulted_balance: Decimal):
     """
     Updates the parent Trade row to a final status, calculates the final
     balance, determines the achieved level, and updates the parent Segment.
@@ -369,7 +341,7 @@ def update_parent_trade_status(trade_id: int, final_status: str, resulted_balanc
         
         s.commit()
 
-def update_account_balance_in_db(account_pk: int, new_balance: float):
+def update_account_balance_in_db(account_pk: int, new_balance: Decimal):
     """
     Updates the balance for a specific subaccount in the database.
     """
@@ -382,29 +354,172 @@ def update_account_balance_in_db(account_pk: int, new_balance: float):
         else:
             print(f"[DB WARN] Could not find subaccount with pk {account_pk} to update balance.")
 
-# NEW FUNCTION TO LOG EVENTS
-def create_event_log(trade_id: int, position_id: int, event_type: str, details: dict):
+def mark_positions_closed(position_ids: list[int]) -> int:
     """
-    Creates a new EventLog entry in the database.
+    Sets the TradeDetail rows of `position_ids` and their parent Trades to
+    'closed' in one transaction (two UPDATE statements, not one per row).
+    Returns the number of TradeDetail rows changed.
     """
-    from .models import EventLog, Trades
+    if not position_ids:
+        return 0
+    now = dt.datetime.now(timezone.utc)
     with SessionSync() as s:
-        try:
-            # First, ensure the trade exists
-            trade = s.query(Trades).get(trade_id)
-            if not trade:
-                print(f"[DB ERROR] Could not find Trade with id {trade_id} for event logging.")
-                return
-
-            new_log = EventLog(
-                trade_id=trade_id,
-                position_id=position_id,
-                event_type=event_type,
-                details=details
+        trade_ids = [row[0] for row in s.execute(
+            select(TradeDetail.trade_id).where(TradeDetail.position_id.in_(position_ids)).distinct()
+        )]
+        changed = s.execute(
+            update(TradeDetail)
+            .where(TradeDetail.position_id.in_(position_ids), TradeDetail.status == 'running')
+            .values(status='closed', closed_at=now)
+        ).rowcount
+        if trade_ids:
+            s.execute(
+                update(Trades)
+                .where(Trades.id.in_(trade_ids), Trades.status == 'running')
+                .values(status='closed', closed_at=now)
             )
-            s.add(new_log)
+        s.commit()
+    print(f"[DB UPDATE] Marked {changed} TradeDetail row(s) and {len(trade_ids)} Trade(s) as 'closed'.")
+    return changed
+
+def insert_event_logs(rows: list[dict]) -> int:
+    """
+    Inserts a batch of EventLog rows ({trade_id, position_id, event_type,
+    details, created_at}) with one executemany. The trade_id foreign key
+    replaces the per-row existence query: if the batch is rejected, rows
+    are retried one by one and those pointing at unknown trades are dropped.
+    Returns the number of rows written.
+    """
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+
+    if not rows:
+        return 0
+    with SessionSync() as s:
+        try:
+            s.execute(insert(EventLog), rows)
             s.commit()
-            print(f"[DB LOG] Successfully logged '{event_type}' event for Trade {trade_id}, Position {position_id}")
-        except Exception as e:
-            print(f"[DB ERROR] Failed to create event log for trade {trade_id}: {e}")
+            return len(rows)
+        except IntegrityError:
             s.rollback()
+
+        written = 0
+        for row in rows:
+            try:
+                s.execute(insert(EventLog), [row])
+                s.commit()
+                written += 1
+            except IntegrityError as e:
+                s.rollback()
+                print(f"[DB ERROR] Dropped '{row['event_type']}' event for trade {row['trade_id']}: {e.orig}")
+        return written
+
+def create_event_log(trade_id: int, position_id: int, event_type: str, details: dict):
+    """
+    Writes a single EventLog entry synchronously. The bot batches its
+    events through bot/event_log.py instead.
+    """
+    return insert_event_logs([{
+        "trade_id": trade_id,
+        "position_id": position_id,
+        "event_type": event_type,
+        "details": details,
+        "created_at": dt.datetime.now(timezone.utc),
+    }])
+
+def fetch_trade_timeline(trade_id: int, after_id: int = 0, limit: int = 200) -> list[dict]:
+    """
+    A trade's events in order, `limit` at a time. Pass the last id seen as
+    `after_id` for the next page (keyset on the (trade_id, id) index).
+    """
+    with SessionSync() as s:
+        rows = s.execute(
+            select(EventLog)
+            .where(EventLog.trade_id == trade_id, EventLog.id > after_id)
+            .order_by(EventLog.id)
+            .limit(limit)
+        ).scalars().all()
+        return [
+            {
+                "id": row.id,
+                "trade_id": row.trade_id,
+                "position_id": row.position_id,
+                "event_type": row.event_type,
+                "details": row.details,
+                "created_at": row.created_at.isoformat() if row.created_at else None,
+            }
+            for row in rows
+        ]
+
+def try_acquire_lease(subaccount_id: int, holder: str, ttl: float) -> dict:
+    """
+    Takes or renews the trading lease of a subaccount for `ttl` seconds.
+    The lease moves to `holder` only if it is already theirs or has
+    expired; the update is a compare-and-set on (holder, epoch), so two
+    standbys racing for an expired lease cannot both win. Times are naive
+    UTC, like the other DateTime columns.
+
+    Returns {"held", "holder", "epoch", "expires_at", "previous_holder",
+    "previous_expires_at"}.
+    """
+    from sqlalchemy import insert
+    from sqlalchemy.exc import IntegrityError
+
+    now = dt.datetime.now(timezone.utc).replace(tzinfo=None)
+    expires_at = now + dt.timedelta(seconds=ttl)
+    with SessionSync() as s:
+        row = s.execute(
+            select(BotLease.holder, BotLease.epoch, BotLease.expires_at)
+            .where(BotLease.subaccount_id == subaccount_id)
+        ).first()
+
+        if row is None:
+            try:
+                s.execute(insert(BotLease).values(
+                    subaccount_id=subaccount_id, holder=holder, epoch=1,
+                    acquired_at=now, renewed_at=now, expires_at=expires_at,
+                ))
+                s.commit()
+            except IntegrityError:
+                # Another process created it first
+                s.rollback()
+                return {"held": False, "holder": None, "epoch": None, "expires_at": None,
+                        "previous_holder": None, "previous_expires_at": None}
+            return {"held": True, "holder": holder, "epoch": 1, "expires_at": expires_at,
+                    "previous_holder": None, "previous_expires_at": None}
+
+        if row.holder != holder and row.expires_at > now:
+            return {"held": False, "holder": row.holder, "epoch": row.epoch, "expires_at": row.expires_at,
+                    "previous_holder": None, "previous_expires_at": None}
+
+        takeover = row.holder != holder
+        values = {"holder": holder, "renewed_at": now, "expires_at": expires_at,
+                  "epoch": row.epoch + 1 if takeover else row.epoch}
+        if takeover:
+            values["acquired_at"] = now
+        result = s.execute(
+            update(BotLease)
+            .where(BotLease.subaccount_id == subaccount_id,
+                   BotLease.holder == row.holder,
+                   BotLease.epoch == row.epoch)
+            .values(**values)
+        )
+        s.commit()
+        if result.rowcount != 1:
+            return {"held": False, "holder": None, "epoch": None, "expires_at": None,
+                    "previous_holder": None, "previous_expires_at": None}
+        return {"held": True, "holder": holder, "epoch": values["epoch"], "expires_at": expires_at,
+                "previous_holder": row.holder if takeover else None,
+                "previous_expires_at": row.expires_at if takeover else None}
+
+def release_lease(subaccount_id: int, holder: str) -> bool:
+    """Ends `holder`'s lease now so a standby can take over without waiting for it to expire."""
+    now = dt.datetime.now(timezone.utc).replace(tzinfo=None)
+    with SessionSync() as s:
+        result = s.execute(
+            update(BotLease)
+            .where(BotLease.subaccount_id == subaccount_id, BotLease.holder == holder)
+            .values(expires_at=now)
+        )
+        s.commit()
+        return result.rowcount == 1
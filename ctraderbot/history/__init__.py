@@ -0,0 +1 @@
+"""Local market-data history: columnar tick storage and readers."""
@@ -0,0 +1,39 @@
+# file: ctraderbot/history/bar_store.py
+"""
+Columnar, memory-mapped trendbar store.
+
+    <root>/<period>/<symbol_id>/<YYYY-MM-DD>/{ts,open,high,low,close,volume}.i64
+
+`ts` is the bar open time in epoch milliseconds (UTC); prices are in
+points (price * 10^5). See columnar.py for the partition format.
+"""
+from pathlib import Path
+
+import numpy as np
+
+from .columnar import append_rows, iter_range, read_range, last_timestamp as _last_timestamp
+
+COLUMNS = ("ts", "open", "high", "low", "close", "volume")
+
+
+def series_dir(root, symbol_id: int, period: str) -> Path:
+    return Path(root) / period / str(symbol_id)
+
+
+def append_bars(root, symbol_id: int, period: str, bars: dict[str, np.ndarray]) -> int:
+    """Appends bars sorted by ts. Blocking file I/O; run it off the reactor."""
+    return append_rows(series_dir(root, symbol_id, period), {name: bars[name] for name in COLUMNS})
+
+
+def iter_bars(root, symbol_id: int, period: str, start_ms: int, end_ms: int):
+    """Zero-copy {column: view} per daily partition for bars in [start_ms, end_ms)."""
+    return iter_range(series_dir(root, symbol_id, period), COLUMNS, start_ms, end_ms)
+
+
+def read_bars(root, symbol_id: int, period: str, start_ms: int, end_ms: int) -> dict[str, np.ndarray]:
+    """Bars in [start_ms, end_ms); zero-copy unless the range spans several days."""
+    return read_range(series_dir(root, symbol_id, period), COLUMNS, start_ms, end_ms)
+
+
+def last_timestamp(root, symbol_id: int, period: str) -> int | None:
+    return _last_timestamp(series_dir(root, symbol_id, period), COLUMNS)
@@ -0,0 +1,125 @@
+# file: ctraderbot/history/columnar.py
+"""
+Append-only columnar partitions shared by the tick and bar stores.
+
+A series lives in one directory with one sub-directory per UTC day:
+
+    <series_dir>/<YYYY-MM-DD>/<column>.i64
+
+Every column is a flat little-endian int64 array and the first column is
+always the timestamp (epoch ms). Rows must be appended in time order so
+readers can binary-search the memory maps without copying.
+"""
+import datetime as dt
+from pathlib import Path
+
+import numpy as np
+
+DAY_MS = 86_400_000
+DTYPE = np.dtype("<i8")
+
+_EXT = ".i64"
+
+
+def _day_of(day_index: int) -> dt.date:
+    return dt.date(1970, 1, 1) + dt.timedelta(days=int(day_index))
+
+
+def append_rows(series_dir, columns: dict[str, np.ndarray]) -> int:
+    """
+    Appends equal-length columns (the first one being the timestamp) to the
+    daily partitions they fall into. Blocking file I/O; run it off the
+    reactor. Returns the number of rows written.
+
+    Columns left uneven by an interrupted append are first cut back to the
+    last complete row, so the new rows line up in every column.
+    """
+    arrays = {name: np.ascontiguousarray(col, dtype=DTYPE) for name, col in columns.items()}
+    ts = next(iter(arrays.values()))
+    if not len(ts):
+        return 0
+    if any(len(col) != len(ts) for col in arrays.values()):
+        raise ValueError("All columns must have the same length")
+
+    days = ts // DAY_MS
+    # Row offsets where the UTC day changes
+    bounds = [0, *(np.flatnonzero(np.diff(days)) + 1).tolist(), len(ts)]
+
+    for start, end in zip(bounds, bounds[1:]):
+        path = Path(series_dir) / _day_of(days[start]).isoformat()
+        path.mkdir(parents=True, exist_ok=True)
+        size = partition_rows(path, arrays) * DTYPE.itemsize
+        for name, col in arrays.items():
+            file = path / f"{name}{_EXT}"
+            with open(file, "r+b" if file.exists() else "wb") as f:
+                f.truncate(size)
+                f.seek(size)
+                f.write(col[start:end].tobytes())
+    return len(ts)
+
+
+def partition_rows(path: Path, names) -> int:
+    """
+    Complete rows in a partition. A crash mid-append can leave columns of
+    different lengths; the shortest one wins.
+    """
+    sizes = []
+    for name in names:
+        file = path / f"{name}{_EXT}"
+        if not file.exists():
+            return 0
+        sizes.append(file.stat().st_size // DTYPE.itemsize)
+    return min(sizes)
+
+
+def open_partition(path: Path, names) -> dict[str, np.ndarray] | None:
+    """Read-only memory maps of one partition's columns, or None if it is empty."""
+    rows = partition_rows(path, names) if path.is_dir() else 0
+    if rows == 0:
+        return None
+    return {
+        name: np.memmap(path / f"{name}{_EXT}", dtype=DTYPE, mode="r", shape=(rows,))
+        for name in names
+    }
+
+
+def iter_range(series_dir, names, start_ms: int, end_ms: int):
+    """
+    Yields {column: view} per daily partition for rows in [start_ms, end_ms).
+    The arrays are slices of the memory maps — nothing is copied.
+    """
+    ts_name = names[0]
+    for day_index in range(start_ms // DAY_MS, (end_ms - 1) // DAY_MS + 1):
+        part = open_partition(Path(series_dir) / _day_of(day_index).isoformat(), names)
+        if part is None:
+            continue
+        ts = part[ts_name]
+        lo = int(np.searchsorted(ts, start_ms, side="left"))
+        hi = int(np.searchsorted(ts, end_ms, side="left"))
+        if hi > lo:
+            yield {name: col[lo:hi] for name, col in part.items()}
+
+
+def read_range(series_dir, names, start_ms: int, end_ms: int) -> dict[str, np.ndarray]:
+    """
+    Rows in [start_ms, end_ms) as one array per column. Zero-copy when the
+    range sits in a single partition; spanning days concatenates.
+    """
+    parts = list(iter_range(series_dir, names, start_ms, end_ms))
+    if len(parts) == 1:
+        return parts[0]
+    if not parts:
+        return {name: np.empty(0, dtype=DTYPE) for name in names}
+    return {name: np.concatenate([p[name] for p in parts]) for name in names}
+
+
+def last_timestamp(series_dir, names) -> int | None:
+    """Timestamp of the newest stored row, used to resume recording/downloads."""
+    series_dir = Path(series_dir)
+    if not series_dir.is_dir():
+        return None
+    for path in sorted(series_dir.iterdir(), reverse=True):
+        part = open_partition(path, names)
+        if part is not None:
+            return int(part[names[0]][-1])
+    return None
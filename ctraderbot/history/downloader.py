@@ -0,0 +1,424 @@
+# file: ctraderbot/history/downloader.py
+"""
+Bulk historical downloader for trendbars and tick data.
+
+A symbol/date range is split into chunks that fit the Open API limits.
+Chunk requests are pipelined (HISTORY_MAX_IN_FLIGHT at a time, paced at
+HISTORY_REQUESTS_PER_SECOND), decoded with NumPy and committed to the
+columnar stores strictly in time order. The stores therefore always hold
+a clean prefix of the range, and a re-run resumes after the last stored
+row.
+
+Run standalone with:
+    python -m ctraderbot.history.downloader --symbol 1 --period M1 --from 2024-01-01 --to 2024-03-01
+    python -m ctraderbot.history.downloader --symbol 1 --ticks --from 2024-02-01 --to 2024-02-02
+"""
+import time
+from collections import deque
+
+import numpy as np
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, gatherResults
+from twisted.internet.threads import deferToThread
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiMessages_pb2 import *
+from ctrader_open_api.messages.OpenApiModelMessages_pb2 import *       # noqa: F403,E402
+from . import bar_store, tick_store
+from .columnar import DTYPE
+from ..settings import (
+    BAR_STORE_DIR,
+    TICK_STORE_DIR,
+    HISTORY_REQUESTS_PER_SECOND,
+    HISTORY_MAX_IN_FLIGHT,
+    HISTORY_MAX_RETRIES,
+    HISTORY_TICK_CHUNK,
+)
+
+PERIOD_MS = {
+    "M1": 60_000, "M2": 120_000, "M3": 180_000, "M4": 240_000, "M5": 300_000,
+    "M10": 600_000, "M15": 900_000, "M30": 1_800_000, "H1": 3_600_000,
+    "H4": 14_400_000, "H12": 43_200_000, "D1": 86_400_000,
+    "W1": 604_800_000, "MN1": 2_678_400_000,
+}
+
+# Longest fromTimestamp..toTimestamp span the server accepts per trendbar request
+_TRENDBAR_MAX_SPAN_MS = {
+    **dict.fromkeys(("M1", "M2", "M3", "M4", "M5"), 302_400_000),
+    **dict.fromkeys(("M10", "M15", "M30", "H1"), 21_168_000_000),
+    **dict.fromkeys(("H4", "H12", "D1"), 31_622_400_000),
+    **dict.fromkeys(("W1", "MN1"), 158_112_000_000),
+}
+# Keep each response well under the per-request bar cap
+_MAX_BARS_PER_REQUEST = 4000
+_RESPONSE_TIMEOUT = 30
+
+_ERROR_RES = ProtoOAErrorRes().payloadType
+
+
+class HistoryRequestError(RuntimeError):
+    pass
+
+
+def chunk_range(start_ms: int, end_ms: int, span_ms: int) -> list[tuple[int, int]]:
+    return [(lo, min(lo + span_ms, end_ms)) for lo in range(start_ms, end_ms, span_ms)]
+
+
+# --- Vectorized decoding ---
+
+def decode_trendbars(res) -> dict[str, np.ndarray]:
+    """Trendbars carry `low` plus deltas for open/high/close; rebuild absolute OHLC in points."""
+    raw = np.array(
+        [(b.utcTimestampInMinutes, b.low, b.deltaOpen, b.deltaHigh, b.deltaClose, b.volume) for b in res.trendbar],
+        dtype=DTYPE,
+    ).reshape(-1, 6)
+    ts, low = raw[:, 0] * 60_000, raw[:, 1]
+    bars = {
+        "ts": ts,
+        "open": low + raw[:, 2],
+        "high": low + raw[:, 3],
+        "low": low,
+        "close": low + raw[:, 4],
+        "volume": raw[:, 5],
+    }
+    if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+        order = np.argsort(ts, kind="stable")
+        bars = {name: col[order] for name, col in bars.items()}
+    return bars
+
+
+def decode_tick_data(res) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Tick data arrives newest first; the first entry is absolute and every
+    following one is a delta from its predecessor. Returns (ts, price) oldest first.
+    """
+    raw = np.array([(t.timestamp, t.tick) for t in res.tickData], dtype=DTYPE).reshape(-1, 2)
+    values = np.cumsum(raw, axis=0)[::-1]
+    return np.ascontiguousarray(values[:, 0]), np.ascontiguousarray(values[:, 1])
+
+
+def merge_quotes(bid_ts, bid, ask_ts, ask, carry=(0, 0)):
+    """
+    Merges independent bid and ask series into aligned (ts, bid, ask) rows,
+    carrying each side forward. `carry` is the (bid, ask) in force before the
+    first row; rows where a side is still unknown are dropped.
+    """
+    ts = np.concatenate([bid_ts, ask_ts])
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    values = np.concatenate([bid, ask])[order]
+    is_bid = order < len(bid_ts)
+
+    rows = np.arange(len(ts))
+    last_bid = np.maximum.accumulate(np.where(is_bid, rows, -1))
+    last_ask = np.maximum.accumulate(np.where(~is_bid, rows, -1))
+    bid_col = np.where(last_bid >= 0, values[last_bid], carry[0])
+    ask_col = np.where(last_ask >= 0, values[last_ask], carry[1])
+
+    # One row per timestamp (the last one), and only once both sides are known
+    keep = np.append(ts[1:] != ts[:-1], True) & (bid_col > 0) & (ask_col > 0)
+    return ts[keep], bid_col[keep], ask_col[keep]
+
+
+# --- Pipelined download engine ---
+
+class HistoryDownloader:
+    """
+    Downloads history through an authorized Open API client. Safe to share
+    with a running bot: requests are correlated by clientMsgId, so responses
+    never reach the bot's handlers as anything but ignorable payloads.
+    """
+
+    def __init__(self, client, account_id: int,
+                 max_in_flight: int = HISTORY_MAX_IN_FLIGHT,
+                 requests_per_second: float = HISTORY_REQUESTS_PER_SECOND):
+        self.client = client
+        self.account_id = account_id
+        self.max_in_flight = max_in_flight
+        self.requests_per_second = requests_per_second
+        self._send_queue = deque()
+        self._tokens = 1.0
+        self._refilled_at = time.monotonic()
+        self._pump_call = None
+
+    # Rate-limited request path
+
+    def _request(self, message) -> Deferred:
+        d = Deferred()
+        self._send_queue.append((message, d))
+        self._pump()
+        return d
+
+    def _pump(self):
+        self._pump_call = None
+        now = time.monotonic()
+        self._tokens = min(1.0, self._tokens + (now - self._refilled_at) * self.requests_per_second)
+        self._refilled_at = now
+
+        while self._send_queue and self._tokens >= 1:
+            self._tokens -= 1
+            message, d = self._send_queue.popleft()
+            sent = self.client.send(message, responseTimeoutInSeconds=_RESPONSE_TIMEOUT)
+            sent.addCallback(_extract_or_raise)
+            sent.chainDeferred(d)
+
+        if self._send_queue and self._pump_call is None:
+            wait = (1 - self._tokens) / self.requests_per_second
+            self._pump_call = reactor.callLater(wait, self._pump)
+
+    # Public API
+
+    def download_trendbars(self, symbol_id: int, period: str, start_ms: int, end_ms: int,
+                           root=BAR_STORE_DIR) -> Deferred:
+        """Fills the bar store for [start_ms, end_ms). Fires with the run stats."""
+        last = bar_store.last_timestamp(root, symbol_id, period)
+        if last is not None:
+            start_ms = max(start_ms, last + PERIOD_MS[period])
+        span = min(_TRENDBAR_MAX_SPAN_MS[period], _MAX_BARS_PER_REQUEST * PERIOD_MS[period])
+
+        last_written = [last if last is not None else -1]
+
+        def fetch(lo, hi):
+            d = self._request(ProtoOAGetTrendbarsReq(
+                ctidTraderAccountId=self.account_id, symbolId=symbol_id,
+                period=ProtoOATrendbarPeriod.Value(period),
+                fromTimestamp=lo, toTimestamp=hi,
+            ))
+            return d.addCallback(decode_trendbars)
+
+        def write(bars):
+            # Bars are stamped at their open; a resumed chunk can overlap the stored tail
+            fresh = bars["ts"] > last_written[0]
+            bars = {name: col[fresh] for name, col in bars.items()}
+            if len(bars["ts"]):
+                last_written[0] = int(bars["ts"][-1])
+            return bar_store.append_bars(root, symbol_id, period, bars)
+
+        label = f"{period} bars for symbol {symbol_id}"
+        return _Job(self, label, "bars", chunk_range(start_ms, end_ms, span), fetch, write).start()
+
+    def download_ticks(self, symbol_id: int, start_ms: int, end_ms: int, root=TICK_STORE_DIR) -> Deferred:
+        """Fills the tick store (merged bid/ask) for [start_ms, end_ms). Fires with the run stats."""
+        last = tick_store.last_timestamp(root, symbol_id)
+        # (last written ts, bid, ask) carried from one chunk into the next
+        carry = [(-1, 0, 0)]
+        if last is not None:
+            start_ms = max(start_ms, last + 1)
+            tail = tick_store.read_ticks(root, symbol_id, last, last + 1)
+            carry[0] = (last, int(tail["bid"][-1]), int(tail["ask"][-1]))
+
+        def fetch(lo, hi):
+            return gatherResults([
+                self._fetch_tick_side(symbol_id, ProtoOAQuoteType.BID, lo, hi),
+                self._fetch_tick_side(symbol_id, ProtoOAQuoteType.ASK, lo, hi),
+            ], consumeErrors=True)
+
+        def write(sides):
+            (bid_ts, bid), (ask_ts, ask) = sides
+            last_ts, last_bid, last_ask = carry[0]
+            ts, bid_col, ask_col = merge_quotes(bid_ts, bid, ask_ts, ask, (last_bid, last_ask))
+            # Chunk edges may be inclusive on the server side; never rewrite the stored tail
+            fresh = ts > last_ts
+            ts, bid_col, ask_col = ts[fresh], bid_col[fresh], ask_col[fresh]
+            if len(ts):
+                carry[0] = (int(ts[-1]), int(bid_col[-1]), int(ask_col[-1]))
+            return tick_store.append_ticks(root, symbol_id, ts, bid_col, ask_col)
+
+        label = f"ticks for symbol {symbol_id}"
+        return _Job(self, label, "ticks", chunk_range(start_ms, end_ms, int(HISTORY_TICK_CHUNK * 1000)), fetch, write).start()
+
+    def _fetch_tick_side(self, symbol_id, quote_type, lo, hi) -> Deferred:
+        """Pages backwards through [lo, hi) while the server reports hasMore."""
+        pages = []
+        result = Deferred()
+
+        def request(to_ms):
+            d = self._request(ProtoOAGetTickDataReq(
+                ctidTraderAccountId=self.account_id, symbolId=symbol_id,
+                type=quote_type, fromTimestamp=lo, toTimestamp=to_ms,
+            ))
+            d.addCallback(on_page, to_ms)
+            d.addErrback(result.errback)
+
+        def on_page(res, to_ms):
+            ts, price = decode_tick_data(res)
+            if pages and len(ts):
+                # The page boundary may be inclusive; drop what the previous page already had
+                keep = ts < to_ms
+                ts, price = ts[keep], price[keep]
+            pages.append((ts, price))
+            if res.hasMore and len(ts) and ts[0] > lo:
+                request(int(ts[0]))
+                return
+            pages.reverse()
+            result.callback((
+                np.concatenate([p[0] for p in pages]),
+                np.concatenate([p[1] for p in pages]),
+            ))
+
+        request(hi)
+        return result
+
+
+def _extract_or_raise(msg):
+    payload = Protobuf.extract(msg)
+    if msg.payloadType == _ERROR_RES:
+        raise HistoryRequestError(f"{payload.errorCode}: {payload.description}")
+    return payload
+
+
+class _Job:
+    """
+    One download run: keeps up to `max_in_flight` chunks fetching, retries
+    failed chunks with backoff and writes finished chunks in order from a
+    worker thread (one write at a time).
+    """
+
+    def __init__(self, downloader, label, unit, chunks, fetch, write):
+        self.downloader = downloader
+        self.label = label
+        self.unit = unit
+        self.chunks = chunks
+        self.fetch = fetch
+        self.write = write
+        self.done = Deferred()
+        self.next_chunk = 0
+        self.next_write = 0
+        self.in_flight = 0
+        self.ready = {}
+        self.writing = False
+        self.failed = False
+        self.stats = {"chunks": len(chunks), "rows": 0, "requests_retried": 0,
+                      "elapsed_s": 0.0, "rows_per_s": 0.0}
+        self.started_at = None
+
+    def start(self) -> Deferred:
+        self.started_at = time.monotonic()
+        print(f"[HISTORY] Downloading {self.label}: {len(self.chunks)} chunk(s).")
+        if not self.chunks:
+            self._finish()
+        else:
+            self._fill()
+        return self.done
+
+    def _fill(self):
+        while (not self.failed and self.next_chunk < len(self.chunks)
+               and self.in_flight < self.downloader.max_in_flight):
+            index = self.next_chunk
+            self.next_chunk += 1
+            self.in_flight += 1
+            self._fetch(index, attempt=0)
+
+    def _fetch(self, index, attempt):
+        lo, hi = self.chunks[index]
+        d = self.fetch(lo, hi)
+        d.addCallbacks(self._on_fetched, self._on_fetch_failed,
+                       callbackArgs=(index,), errbackArgs=(index, attempt))
+
+    def _on_fetched(self, data, index):
+        self.in_flight -= 1
+        self.ready[index] = data
+        self._write_next()
+        self._fill()
+
+    def _on_fetch_failed(self, failure, index, attempt):
+        if self.failed:
+            return
+        if attempt >= HISTORY_MAX_RETRIES:
+            self._fail(failure)
+            return
+        self.stats["requests_retried"] += 1
+        delay = 2 ** attempt
+        print(f"[HISTORY] Chunk {index} failed ({failure.getErrorMessage()}). Retrying in {delay}s.")
+        reactor.callLater(delay, self._fetch, index, attempt + 1)
+
+    def _write_next(self):
+        if self.writing or self.failed or self.next_write not in self.ready:
+            return
+        data = self.ready.pop(self.next_write)
+        self.writing = True
+        d = deferToThread(self.write, data)
+        d.addCallbacks(self._on_written, self._fail)
+
+    def _on_written(self, rows):
+        self.writing = False
+        self.next_write += 1
+        self.stats["rows"] += rows
+
+        if self.next_write % 10 == 0:
+            elapsed = time.monotonic() - self.started_at
+            print(f"[HISTORY] {self.label}: {self.next_write}/{len(self.chunks)} chunks, "
+                  f"{self.stats['rows']} {self.unit} ({self.stats['rows'] / elapsed:.0f} {self.unit}/s).")
+
+        if self.next_write == len(self.chunks):
+            self._finish()
+        else:
+            self._write_next()
+
+    def _finish(self):
+        elapsed = time.monotonic() - self.started_at
+        self.stats["elapsed_s"] = elapsed
+        self.stats["rows_per_s"] = self.stats["rows"] / elapsed if elapsed else 0.0
+        print(f"[HISTORY] Done: {self.label}, {self.stats['rows']} {self.unit} in {elapsed:.1f}s "
+              f"({self.stats['rows_per_s']:.0f} {self.unit}/s).")
+        self.done.callback(self.stats)
+
+    def _fail(self, failure):
+        if self.failed:
+            return
+        self.failed = True
+        self.writing = False
+        print(f"[HISTORY] Giving up on {self.label} after chunk {self.next_write}: {failure.getErrorMessage()}. "
+              f"Re-run to resume.")
+        self.done.errback(failure)
+
+
+def main():
+    """Standalone entry point: authorize, download, exit."""
+    from ..bridge import setup_asyncio_reactor
+    loop = setup_asyncio_reactor()
+
+    import argparse
+    import datetime as dt
+    from ctrader_open_api import Client, TcpProtocol
+    from ..helpers import fetch_access_token, fetch_main_account
+    from ..settings import HOST, PORT, CLIENT_ID, CLIENT_SECRET, SYMBOL_ID
+
+    parser = argparse.ArgumentParser(description="Download cTrader history into the local columnar store")
+    parser.add_argument("--symbol", type=int, default=SYMBOL_ID)
+    parser.add_argument("--period", default="M1", choices=sorted(PERIOD_MS))
+    parser.add_argument("--ticks", action="store_true", help="Download bid/ask ticks instead of trendbars")
+    parser.add_argument("--from", dest="start", required=True, help="UTC start date, YYYY-MM-DD")
+    parser.add_argument("--to", dest="end", required=True, help="UTC end date (exclusive), YYYY-MM-DD")
+    args = parser.parse_args()
+
+    def to_ms(day):
+        return int(dt.datetime.fromisoformat(day).replace(tzinfo=dt.timezone.utc).timestamp() * 1000)
+
+    async def bootstrap():
+        _, account_id = await fetch_main_account()
+        return await fetch_access_token(), account_id
+
+    token, account_id = loop.run_until_complete(bootstrap())
+    client = Client(HOST, PORT, TcpProtocol)
+    client.setMessageReceivedCallback(lambda _, m: None)
+
+    def run(_):
+        downloader = HistoryDownloader(client, account_id)
+        if args.ticks:
+            return downloader.download_ticks(args.symbol, to_ms(args.start), to_ms(args.end))
+        return downloader.download_trendbars(args.symbol, args.period, to_ms(args.start), to_ms(args.end))
+
+    def on_connected(_):
+        d = client.send(ProtoOAApplicationAuthReq(clientId=CLIENT_ID, clientSecret=CLIENT_SECRET))
+        d.addCallback(lambda _: client.send(ProtoOAAccountAuthReq(ctidTraderAccountId=account_id, accessToken=token)))
+        d.addCallback(run)
+        d.addErrback(lambda f: print(f"[HISTORY] Download failed: {f.getErrorMessage()}"))
+        d.addBoth(lambda _: reactor.stop())
+
+    client.setConnectedCallback(on_connected)
+    client.startService()
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+# file: ctraderbot/history/tick_store.py
+"""
+Columnar, memory-mapped tick store.
+
+    <root>/<symbol_id>/<YYYY-MM-DD>/ts.i64
+                                    bid.i64
+                                    ask.i64
+
+Timestamps are epoch milliseconds (UTC) and prices are in points, the
+integer units cTrader sends (price * 10^5). See columnar.py for the
+partition format.
+"""
+from pathlib import Path
+
+import numpy as np
+
+from .columnar import append_rows, iter_range, read_range, last_timestamp as _last_timestamp
+
+COLUMNS = ("ts", "bid", "ask")
+
+
+def series_dir(root, symbol_id: int) -> Path:
+    return Path(root) / str(symbol_id)
+
+
+def append_ticks(root, symbol_id: int, ts, bid, ask) -> int:
+    """Appends ticks sorted by ts. Blocking file I/O; run it off the reactor."""
+    return append_rows(series_dir(root, symbol_id), {"ts": ts, "bid": bid, "ask": ask})
+
+
+def iter_ticks(root, symbol_id: int, start_ms: int, end_ms: int):
+    """Zero-copy {column: view} per daily partition for ticks in [start_ms, end_ms)."""
+    return iter_range(series_dir(root, symbol_id), COLUMNS, start_ms, end_ms)
+
+
+def read_ticks(root, symbol_id: int, start_ms: int, end_ms: int) -> dict[str, np.ndarray]:
+    """Ticks in [start_ms, end_ms); zero-copy unless the range spans several days."""
+    return read_range(series_dir(root, symbol_id), COLUMNS, start_ms, end_ms)
+
+
+def last_timestamp(root, symbol_id: int) -> int | None:
+    return _last_timestamp(series_dir(root, symbol_id), COLUMNS)
@@ -0,0 +1,171 @@
+# file: ctraderbot/history/wire_log.py
+"""
+Length-prefixed binary log of raw Open API frames.
+
+A capture directory holds rotated files, oldest first by name:
+
+    <dir>/wire-<YYYYMMDDTHHMMSS.ffffff>.bin
+
+Each file starts with MAGIC, followed by records of
+
+    <u32 length> <i64 ts_ns> <u8 direction> <u16 payloadType> <length bytes>
+
+little-endian, where the bytes are the serialized ProtoMessage exactly
+as it went over the socket (without the socket's own length prefix) and
+ts_ns is epoch nanoseconds. A record cut short by a crash ends the file
+cleanly for readers.
+
+Frames that carry credentials (app/account auth, token refresh, account
+list by token) are stored redacted: the secret fields hold REDACTED, the
+rest of the frame (payloadType, clientMsgId, account id) is kept, so a
+replay still pairs requests and responses.
+"""
+import datetime as dt
+import os
+import struct
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage
+
+MAGIC = b"CTWIRE01"
+HEADER = struct.Struct("<IqBH")
+
+INBOUND = 0
+OUTBOUND = 1
+
+REDACTED = "<redacted>"
+
+# payloadType -> fields holding credentials
+_SECRET_FIELDS = {
+    2100: ("clientSecret",),                    # ProtoOAApplicationAuthReq
+    2102: ("accessToken",),                     # ProtoOAAccountAuthReq
+    2149: ("accessToken",),                     # ProtoOAGetAccountListByAccessTokenReq
+    2150: ("accessToken",),                     # ProtoOAGetAccountListByAccessTokenRes
+    2173: ("refreshToken",),                    # ProtoOARefreshTokenReq
+    2174: ("accessToken", "refreshToken"),      # ProtoOARefreshTokenRes
+}
+
+REDACTED_TYPES = frozenset(_SECRET_FIELDS)
+
+_PREFIX = "wire-"
+_SUFFIX = ".bin"
+
+
+class WireRecord(NamedTuple):
+    ts_ns: int
+    direction: int
+    payload_type: int
+    data: bytes
+
+    def message(self) -> ProtoMessage:
+        msg = ProtoMessage()
+        msg.ParseFromString(self.data)
+        return msg
+
+
+def redact(payload_type: int, data: bytes) -> bytes:
+    """The frame with its credential fields replaced by REDACTED (unchanged for other types)."""
+    fields = _SECRET_FIELDS.get(payload_type)
+    if fields is None:
+        return data
+    from ctrader_open_api import Protobuf
+
+    msg = ProtoMessage()
+    try:
+        msg.ParseFromString(data)
+        payload = Protobuf.get(payload_type)
+        payload.ParseFromString(msg.payload)
+        for field in fields:
+            if payload.HasField(field):
+                setattr(payload, field, REDACTED)
+        msg.payload = payload.SerializeToString()
+    except Exception:
+        # Unparseable: keep only the envelope, never the bytes
+        msg = ProtoMessage(payloadType=payload_type)
+    return msg.SerializeToString()
+
+
+def payload_type_of(data: bytes) -> int:
+    """payloadType of a serialized ProtoMessage, read from its leading field without parsing the rest."""
+    # Field 1 (payloadType) is a varint with tag 0x08 and is serialized first
+    if data[:1] == b"\x08":
+        value = shift = 0
+        for byte in data[1:6]:
+            value |= (byte & 0x7F) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+    msg = ProtoMessage()
+    msg.ParseFromString(data)
+    return msg.payloadType
+
+
+def capture_files(directory) -> list[Path]:
+    return sorted(Path(directory).glob(f"{_PREFIX}*{_SUFFIX}"))
+
+
+def _new_file(directory) -> Path:
+    stamp = dt.datetime.now(dt.timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+    path = Path(directory) / f"{_PREFIX}{stamp}{_SUFFIX}"
+    with open(path, "xb") as f:
+        f.write(MAGIC)
+    return path
+
+
+def append_records(directory, records: Iterable[WireRecord], max_bytes: int, keep: int) -> int:
+    """
+    Appends records to the newest file of `directory`, starting a new file
+    whenever it would grow past `max_bytes` and deleting all but the `keep`
+    newest files. Blocking file I/O; run it off the reactor. Returns the
+    number of bytes written.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    files = capture_files(directory)
+    path = files[-1] if files else _new_file(directory)
+    size = path.stat().st_size
+
+    written = 0
+    f = open(path, "ab")
+    try:
+        for rec in records:
+            frame = HEADER.pack(len(rec.data), rec.ts_ns, rec.direction, rec.payload_type) + rec.data
+            if size > len(MAGIC) and size + len(frame) > max_bytes:
+                f.close()
+                path = _new_file(directory)
+                size = path.stat().st_size
+                f = open(path, "ab")
+            f.write(frame)
+            size += len(frame)
+            written += len(frame)
+    finally:
+        f.close()
+
+    for old in capture_files(directory)[:-keep] if keep > 0 else ():
+        os.remove(old)
+    return written
+
+
+def read_records(path) -> Iterator[WireRecord]:
+    """Every complete record of one capture file, in order."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a wire capture")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, ts_ns, direction, payload_type = HEADER.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                return
+            yield WireRecord(ts_ns, direction, payload_type, data)
+
+
+def iter_capture(source) -> Iterator[WireRecord]:
+    """Records of a capture file, or of every file in a capture directory, oldest first."""
+    source = Path(source)
+    paths = capture_files(source) if source.is_dir() else [source]
+    for path in paths:
+        yield from read_records(path)
@@ -14,6 +14,8 @@ from sqlalchemy import (
     String,
     ForeignKey,
     DECIMAL,
+    JSON,
+    Index,
 )
 from .database import Base
 
@@ -97,4 +99,30 @@ class Constant(Base):
     id = Column(Integer, primary_key=True)
     variable = Column(Text)
     value = Column(Text)
-    is_active = Column(Boolean, default=False)
\ No newline at end of file
+    is_active = Column(Boolean, default=False)
+
+class EventLog(Base):
+    __tablename__ = "botcore_eventlog"
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    trade_id = Column(Integer, ForeignKey("botcore_trades.id"), nullable=False)
+    position_id = Column(BigInteger, nullable=True)
+    event_type = Column(String(20), nullable=False)
+    details = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=lambda: dt.datetime.now(timezone.utc))
+
+    __table_args__ = (
+        # A trade's timeline is read in id order: (trade_id, id) serves it from the index alone
+        Index("ix_eventlog_trade_id_id", "trade_id", "id"),
+        Index("ix_eventlog_type_created", "event_type", "created_at"),
+        Index("ix_eventlog_position_id", "position_id"),
+    )
+
+class BotLease(Base):
+    """Which bot process may trade a subaccount (see bot/leader.py)."""
+    __tablename__ = "botcore_botlease"
+    subaccount_id = Column(Integer, ForeignKey("botcore_subaccount.id"), primary_key=True)
+    holder = Column(String(100), nullable=False)
+    epoch = Column(Integer, nullable=False, default=1)  # +1 on every change of holder
+    acquired_at = Column(DateTime)
+    renewed_at = Column(DateTime)
+    expires_at = Column(DateTime, nullable=False)
@@ -0,0 +1,93 @@
+# file: ctraderbot/money.py
+"""
+Fixed-point money for the trading core.
+
+Balances, PnL and thresholds are carried as plain ints in units of
+1/MONEY_SCALE of the account currency (MONEY_DIGITS matches the
+DECIMAL(15, 4) balance columns), so the hot path is exact integer
+arithmetic. Prices use the API's integer points (symbols.PRICE_SCALE)
+and volumes its cents of a unit (symbols.VOLUME_SCALE).
+
+Conversions happen only at the edges:
+
+- from the DB:  to_money(Decimal)             -> int
+- from the API: api_money(amount, moneyDigits) -> int
+- to the DB:    to_decimal(int)               -> Decimal
+- for display:  to_float(int)                 -> float
+
+Rounding is half-even everywhere, like Decimal's default context.
+
+tests/test_money.py checks the threshold path against exact Decimal;
+`python -m ctraderbot.money_bench` times it against float and Decimal.
+"""
+from decimal import Decimal, ROUND_HALF_EVEN
+
+MONEY_DIGITS = 4
+MONEY_SCALE = 10 ** MONEY_DIGITS
+
+_QUANTUM = Decimal(1).scaleb(-MONEY_DIGITS)
+
+# Book entries (bot.positions / bot.trade_couple) that hold money ints
+BOOK_MONEY_FIELDS = ("total_balance", "unrealisedNetProfit", "grossUnrealisedProfit",
+                     "ending_balance", "resulted_balance")
+
+
+def to_money(value) -> int:
+    """
+    Decimal, str or float amount -> money int. None stays None.
+
+    Ints are refused: one could be whole currency units or already a money
+    int, and guessing wrong is off by MONEY_SCALE. Pass Decimal(n) for
+    whole units.
+    """
+    if value is None:
+        return None
+    if isinstance(value, int):
+        raise TypeError(f"to_money() got int {value!r}; pass Decimal({value}) for whole units")
+    if isinstance(value, float):
+        # repr() gives the shortest string that round-trips, i.e. what the float "means"
+        value = repr(value)
+    return int(Decimal(value).quantize(_QUANTUM, rounding=ROUND_HALF_EVEN).scaleb(MONEY_DIGITS))
+
+
+def api_money(amount: int, money_digits: int) -> int:
+    """
+    Integer amount scaled by the API's moneyDigits -> money int. Amounts
+    with more than MONEY_DIGITS decimals are rounded half-even.
+    """
+    shift = MONEY_DIGITS - money_digits
+    if shift >= 0:
+        return amount * 10 ** shift
+    return _div_half_even(amount, 10 ** -shift)
+
+
+def to_decimal(money: int) -> Decimal:
+    """Money int -> Decimal with MONEY_DIGITS places, for the DB."""
+    if money is None:
+        return None
+    return Decimal(money).scaleb(-MONEY_DIGITS)
+
+
+def to_float(money: int) -> float:
+    """Money int -> float, for display and JSON only."""
+    if money is None:
+        return None
+    return money / MONEY_SCALE
+
+
+def halve(money: int) -> int:
+    return _div_half_even(money, 2)
+
+
+def _div_half_even(n: int, d: int) -> int:
+    q, r = divmod(n, d)
+    twice = 2 * r
+    if twice > d or (twice == d and q % 2):
+        q += 1
+    return q
+
+
+def book_view(entry: dict) -> dict:
+    """Copy of a book entry with its money fields as floats, for JSON output."""
+    return {k: to_float(v) if k in BOOK_MONEY_FIELDS and isinstance(v, int) else v
+            for k, v in entry.items()}
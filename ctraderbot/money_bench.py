@@ -0,0 +1,69 @@
+# file: ctraderbot/money_bench.py
+"""
+Per-tick cost of the threshold check on float, Decimal and money ints.
+
+    python -m ctraderbot.money_bench --ticks 200000
+
+Each path takes a tick's (netUnrealisedPnL, moneyDigits) and decides
+whether the side is liquidated or successful, like pnl_event does.
+"""
+import time
+from decimal import Decimal
+
+from .money import api_money, to_money
+from .strategy import resulted_balance, side_outcome
+
+
+def float_pnl_path(net_pnl, money_digits, total_balance, ending_balance):
+    """The per-tick calculation as it was: floats from the API and the DB."""
+    pnl = net_pnl / (10 ** money_digits)
+    balance = float(total_balance)
+    outcome = side_outcome(balance, pnl, float(ending_balance))
+    return outcome, resulted_balance(balance, pnl, outcome) if outcome else None
+
+
+def money_pnl_path(net_pnl, money_digits, total_balance, ending_balance):
+    pnl = api_money(net_pnl, money_digits)
+    outcome = side_outcome(total_balance, pnl, ending_balance)
+    return outcome, resulted_balance(total_balance, pnl, outcome) if outcome else None
+
+
+def decimal_pnl_path(net_pnl, money_digits, total_balance, ending_balance):
+    """Exact reference: everything in Decimal."""
+    pnl = Decimal(net_pnl).scaleb(-money_digits)
+    outcome = side_outcome(total_balance, pnl, ending_balance)
+    return outcome, resulted_balance(total_balance, pnl, outcome) if outcome else None
+
+
+def benchmark(n: int = 200_000) -> dict:
+    balance, ending = Decimal("1234.5600"), Decimal("2469.1200")
+    ticks = [(-123_456 + i % 1000, 2) for i in range(n)]
+    money_balance, money_ending = to_money(balance), to_money(ending)
+
+    results = {}
+    for name, func, args in (
+        ("float", float_pnl_path, (balance, ending)),
+        ("decimal", decimal_pnl_path, (balance, ending)),
+        ("money", money_pnl_path, (money_balance, money_ending)),
+    ):
+        started = time.perf_counter()
+        for pnl, digits in ticks:
+            func(pnl, digits, *args)
+        elapsed = time.perf_counter() - started
+        results[name] = {"total_s": elapsed, "ns_per_tick": elapsed / n * 1e9}
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time fixed-point money against float/Decimal")
+    parser.add_argument("--ticks", type=int, default=200_000)
+    args = parser.parse_args()
+
+    for name, r in benchmark(args.ticks).items():
+        print(f"[MONEY] {name:>8}: {r['ns_per_tick']:8.0f} ns/tick ({r['total_s']:.3f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# file: ctraderbot/replay.py
+"""
+Replays a wire capture (WIRE_CAPTURE_DIR) through a fresh bot.
+
+    python -m ctraderbot.replay data/wire --pace fast
+    python -m ctraderbot.replay data/wire/wire-20250101T000000.000000.bin --pace original --speed 10
+
+The bot gets a ReplayClient instead of a connection, so nothing reaches
+the server, but the handlers run for real: point MYSQL_URL at a scratch
+database. Prints frames/s and handler time per payload type.
+"""
+from __future__ import annotations
+
+
+def main():
+    # The asyncio reactor must be installed before anything imports Twisted's reactor
+    from .bridge import setup_asyncio_reactor
+    setup_asyncio_reactor()
+
+    import argparse
+    import contextlib
+    import io
+    from twisted.internet import reactor
+    from .bot.simple_bot import SimpleBot
+    from .bot.wire_capture import ReplayClient, replay_capture
+    from .settings import SYMBOL_ID
+
+    parser = argparse.ArgumentParser(description="Replay a wire capture through the bot's handlers")
+    parser.add_argument("source", help="capture file or directory")
+    parser.add_argument("--pace", choices=("fast", "original"), default="fast")
+    parser.add_argument("--speed", type=float, default=1.0, help="with --pace original: speed-up factor")
+    parser.add_argument("--account-pk", type=int, default=1)
+    parser.add_argument("--account-id", type=int, default=0, help="ctidTraderAccountId of the capture")
+    parser.add_argument("--symbol", type=int, default=SYMBOL_ID)
+    parser.add_argument("--quiet", action="store_true", help="hide the handlers' output")
+    args = parser.parse_args()
+
+    bot = SimpleBot(ReplayClient(), "replay", args.account_pk, args.account_id, args.symbol)
+    result = {}
+
+    def _run():
+        d = replay_capture(bot, args.source, args.pace, args.speed)
+        d.addCallback(result.update)
+        d.addErrback(lambda f: result.update(error=f.getErrorMessage()))
+        d.addBoth(lambda _: reactor.stop())
+
+    reactor.callWhenRunning(_run)
+    with contextlib.redirect_stdout(io.StringIO()) if args.quiet else contextlib.nullcontext():
+        reactor.run()
+
+    if "error" in result:
+        print(f"[WIRE] Replay failed: {result['error']}")
+        return
+    print(f"[WIRE] {result['frames']} inbound frame(s) in {result['seconds']:.3f}s "
+          f"({result['frames_per_s'] or 0:.0f}/s), handlers {result['handler_s']:.3f}s, "
+          f"{result['errors']} handler error(s), {result['outbound_skipped']} outbound frame(s) skipped, "
+          f"{result['redacted_skipped']} redacted frame(s) skipped")
+    for name, t in result["by_type"].items():
+        print(f"[WIRE]   {name:<40} {t['count']:>8}  mean {t['mean_us']:8.1f} us  max {t['max_us']:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+# file: ctraderbot/scratch_db.py
+"""
+Throwaway SQLite databases for the benchmark scripts.
+
+The benchmarks clear the tables they use, so they only accept SQLite
+URLs and never touch the configured MYSQL_SYNC_URL. They get their own
+sessionmaker; bound_sessions() points the modules under test at it for
+the duration of a run and restores their SessionSync afterwards.
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Integer, Table, create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from .database import Base
+
+
+def scratch_sessionmaker(url: str, tables) -> sessionmaker:
+    """Sessionmaker on a SQLite `url` with `tables` created. Anything but SQLite is refused."""
+    if not url.startswith("sqlite"):
+        raise ValueError(f"Benchmarks clear their tables and only run on SQLite, not {url!r}")
+    engine = create_engine(url, poolclass=StaticPool)
+    # Subaccount's foreign key points at Django's user table
+    if "auth_user" not in Base.metadata.tables:
+        Table("auth_user", Base.metadata, Column("id", Integer, primary_key=True))
+    Base.metadata.create_all(engine, tables=[Base.metadata.tables["auth_user"], *tables])
+    return sessionmaker(bind=engine)
+
+
+@contextmanager
+def bound_sessions(factory: sessionmaker, *modules):
+    """Swaps each module's SessionSync for `factory` while the block runs."""
+    previous = [(module, module.SessionSync) for module in modules]
+    for module, _ in previous:
+        module.SessionSync = factory
+    try:
+        yield factory
+    finally:
+        for module, session_sync in previous:
+            module.SessionSync = session_sync
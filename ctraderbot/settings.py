@@ -28,4 +28,108 @@ SYMBOL_ID: int = int(os.getenv("CTRADER_SYMBOL_ID", 1))  # EUR/USD default
 MYSQL_URL: str | None = os.getenv("MYSQL_URL")
 MYSQL_SYNC_URL = MYSQL_URL.replace("mysql+aiomysql", "mysql+pymysql")
 
-BOT_API_TOKEN: str | None = os.getenv("BOT_API_TOKEN")
\ No newline at end of file
+BOT_API_TOKEN: str | None = os.getenv("BOT_API_TOKEN")
+
+# --- Reconnect supervisor ---
+RECONNECT_INITIAL_DELAY: float = float(os.getenv("RECONNECT_INITIAL_DELAY", 1.0))
+RECONNECT_MAX_DELAY: float = float(os.getenv("RECONNECT_MAX_DELAY", 60.0))
+RECONNECT_FACTOR: float = float(os.getenv("RECONNECT_FACTOR", 2.0))
+
+# --- Token refresh ---
+TOKEN_URL: str = os.getenv("CTRADER_TOKEN_URL", "https://openapi.ctrader.com/apps/token")
+TOKEN_REFRESH_MARGIN: float = float(os.getenv("TOKEN_REFRESH_MARGIN", 3600))  # seconds before expires_at
+TOKEN_REFRESH_RETRY_DELAY: float = float(os.getenv("TOKEN_REFRESH_RETRY_DELAY", 60))
+
+# --- Connection health monitor ---
+HEALTH_CHECK_INTERVAL: float = float(os.getenv("HEALTH_CHECK_INTERVAL", 5))
+STALE_FEED_THRESHOLD: float = float(os.getenv("STALE_FEED_THRESHOLD", 3))  # seconds
+
+# --- Order gateway ---
+# Capped at OUTBOUND_RATE_PER_SECOND / OUTBOUND_BURST, which every order passes through afterwards
+ORDER_RATE_PER_SECOND: float = float(os.getenv("ORDER_RATE_PER_SECOND", 5))
+ORDER_BURST: int = int(os.getenv("ORDER_BURST", 5))
+
+# --- Order state machine timeouts (seconds) ---
+ORDER_ACK_TIMEOUT: float = float(os.getenv("ORDER_ACK_TIMEOUT", 5))
+ORDER_FILL_TIMEOUT: float = float(os.getenv("ORDER_FILL_TIMEOUT", 15))
+ORDER_CLOSE_TIMEOUT: float = float(os.getenv("ORDER_CLOSE_TIMEOUT", 10))
+ORDER_MAX_RETRIES: int = int(os.getenv("ORDER_MAX_RETRIES", 3))
+
+# --- Tick recording ---
+RECORD_TICKS: bool = os.getenv("RECORD_TICKS", "false").lower() in ("1", "true", "yes")
+TICK_STORE_DIR: str = os.getenv("TICK_STORE_DIR", "data/ticks")
+TICK_FLUSH_INTERVAL: float = float(os.getenv("TICK_FLUSH_INTERVAL", 1.0))  # seconds
+
+# --- Historical downloads ---
+BAR_STORE_DIR: str = os.getenv("BAR_STORE_DIR", "data/bars")
+HISTORY_REQUESTS_PER_SECOND: float = float(os.getenv("HISTORY_REQUESTS_PER_SECOND", 5))
+HISTORY_MAX_IN_FLIGHT: int = int(os.getenv("HISTORY_MAX_IN_FLIGHT", 8))
+HISTORY_MAX_RETRIES: int = int(os.getenv("HISTORY_MAX_RETRIES", 5))
+HISTORY_TICK_CHUNK: float = float(os.getenv("HISTORY_TICK_CHUNK", 3600))  # seconds per tick request window
+
+# --- Scheduler ---
+PNL_POLL_INTERVAL: float = float(os.getenv("PNL_POLL_INTERVAL", 1.0))  # seconds, until the first PnL response
+DAILY_TASK_CRON: str = os.getenv("DAILY_TASK_CRON", "0 19 * * *")  # minute hour dom month dow
+SCHEDULER_TIMEZONE: str | None = os.getenv("SCHEDULER_TIMEZONE") or None  # e.g. "Europe/London"; unset: local time
+SCHEDULER_JITTER: float = float(os.getenv("SCHEDULER_JITTER", 0))  # max random delay, seconds
+
+# --- Adaptive PnL polling ---
+# Each poll is one request against OUTBOUND_RATE_PER_SECOND; the minimum is raised so polls
+# never take more than PNL_POLL_MAX_SHARE of it (0.25 s at the default 5/s)
+PNL_POLL_MIN_INTERVAL: float = float(os.getenv("PNL_POLL_MIN_INTERVAL", 0.2))  # seconds, near a threshold
+PNL_POLL_MAX_SHARE: float = float(os.getenv("PNL_POLL_MAX_SHARE", 0.8))  # of OUTBOUND_RATE_PER_SECOND
+PNL_POLL_MAX_INTERVAL: float = float(os.getenv("PNL_POLL_MAX_INTERVAL", 5.0))  # seconds, all positions far
+PNL_POLL_NEAR_MARGIN: float = float(os.getenv("PNL_POLL_NEAR_MARGIN", 0.1))  # fraction of the threshold band
+PNL_POLL_FAR_MARGIN: float = float(os.getenv("PNL_POLL_FAR_MARGIN", 0.6))
+
+# --- Event log writer ---
+EVENT_LOG_FLUSH_INTERVAL: float = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", 1.0))  # seconds
+EVENT_LOG_BATCH_SIZE: int = int(os.getenv("EVENT_LOG_BATCH_SIZE", 500))
+EVENT_LOG_MAX_BUFFER: int = int(os.getenv("EVENT_LOG_MAX_BUFFER", 50000))  # events kept while the DB is down
+
+# --- Read API ---
+API_CACHE_TTL: float = float(os.getenv("API_CACHE_TTL", 2.0))  # seconds history pages are cached
+API_PAGE_LIMIT: int = int(os.getenv("API_PAGE_LIMIT", 500))  # max rows per page
+WS_BOOKS_REFRESH_INTERVAL: float = float(os.getenv("WS_BOOKS_REFRESH_INTERVAL", 5.0))  # seconds
+
+# --- Emergency stop ---
+EMERGENCY_STOP_TIMEOUT: float = float(os.getenv("EMERGENCY_STOP_TIMEOUT", 30))  # seconds to wait for closes
+
+# --- Deal ledger ---
+DEAL_LIST_MAX_ROWS: int = int(os.getenv("DEAL_LIST_MAX_ROWS", 1000))  # deals per ProtoOADealListReq page
+
+# --- Account balance ---
+BALANCE_WRITE_DEBOUNCE: float = float(os.getenv("BALANCE_WRITE_DEBOUNCE", 2.0))  # seconds between Subaccount.balance writes
+
+# --- Leader election ---
+LEADER_ELECTION: bool = os.getenv("LEADER_ELECTION", "false").lower() in ("1", "true", "yes")
+LEADER_LEASE_TTL: float = float(os.getenv("LEADER_LEASE_TTL", 15))  # seconds a lease lasts without renewal
+LEADER_RENEW_INTERVAL: float = float(os.getenv("LEADER_RENEW_INTERVAL", 5))  # seconds between lease attempts
+STANDBY_REFRESH_INTERVAL: float = float(os.getenv("STANDBY_REFRESH_INTERVAL", 10))  # seconds between standby book reloads
+
+# --- Wire capture ---
+WIRE_CAPTURE: bool = os.getenv("WIRE_CAPTURE", "false").lower() in ("1", "true", "yes")
+WIRE_CAPTURE_DIR: str = os.getenv("WIRE_CAPTURE_DIR", "data/wire")
+WIRE_CAPTURE_MAX_BYTES: int = int(os.getenv("WIRE_CAPTURE_MAX_BYTES", 64 * 1024 * 1024))  # per file before rotating
+WIRE_CAPTURE_KEEP: int = int(os.getenv("WIRE_CAPTURE_KEEP", 20))  # rotated files kept
+WIRE_CAPTURE_FLUSH_INTERVAL: float = float(os.getenv("WIRE_CAPTURE_FLUSH_INTERVAL", 1.0))  # seconds
+WIRE_CAPTURE_MAX_BUFFER: int = int(os.getenv("WIRE_CAPTURE_MAX_BUFFER", 100000))  # frames kept while the disk lags
+
+# --- Open API transport ---
+OPENAPI_TRANSPORT: str = os.getenv("OPENAPI_TRANSPORT", "twisted")  # "twisted" or "asyncio" (see transport.py)
+# USE_UVLOOP is read by bridge.setup_asyncio_reactor, which runs before this module can be imported
+
+# --- Shared-memory books ---
+SHARED_BOOKS: bool = os.getenv("SHARED_BOOKS", "false").lower() in ("1", "true", "yes")
+SHARED_BOOKS_NAME: str = os.getenv("SHARED_BOOKS_NAME", "ctraderbot_books")  # one per bot process on a host
+SHARED_BOOKS_SLOTS: int = int(os.getenv("SHARED_BOOKS_SLOTS", 256))  # positions (and trade couples) the segment holds
+SHARED_BOOKS_INTERVAL: float = float(os.getenv("SHARED_BOOKS_INTERVAL", 0.5))  # seconds between publishes besides PnL ticks
+
+# --- Outbound scheduler ---
+# Requests handed to the client per second; the client is built with the same send rate (transport.build_client)
+OUTBOUND_RATE_PER_SECOND: float = float(os.getenv("OUTBOUND_RATE_PER_SECOND", 5))
+OUTBOUND_BURST: int = int(os.getenv("OUTBOUND_BURST", 5))
+OUTBOUND_HISTORY_RATE_PER_SECOND: float = float(os.getenv("OUTBOUND_HISTORY_RATE_PER_SECOND", 5))  # Open API historical-data limit
+OUTBOUND_HISTORY_BURST: int = int(os.getenv("OUTBOUND_HISTORY_BURST", 5))
+# A request that has waited this long goes ahead of higher classes, so PnL polls and history pages never starve
+OUTBOUND_MAX_WAIT_SECONDS: float = float(os.getenv("OUTBOUND_MAX_WAIT_SECONDS", 5))
@@ -0,0 +1,392 @@
+# file: ctraderbot/shm_books.py
+"""
+Position and trade-couple books in shared memory.
+
+The bot (SharedBooksWriter) mirrors bot.positions and bot.trade_couple
+into a fixed-layout POSIX shared-memory segment. Readers in other local
+processes, such as the control API, map the segment with
+SharedBooksReader and read it in place. There is no serialization, no
+lock and no round trip to the reactor thread.
+
+Layout (little-endian):
+
+    header    64 bytes   magic, layout version, slot counts, writer pid
+    summary   record     published_ns, publishes, latest_price
+    positions record x SHARED_BOOKS_SLOTS
+    couples   record x SHARED_BOOKS_SLOTS
+
+Every record is guarded by a seqlock: an 8-byte counter followed by a
+fixed-size payload. The writer makes the counter odd, writes the
+payload, then makes it even again. A reader copies the payload between
+two reads of the counter and retries if the counter was odd or changed
+in between, so it never sees a half-written record. There is a single
+writer, which the leader lease guarantees.
+
+A slot whose id is 0 is free. Money fields hold money ints (money.py).
+None is stored as NONE, and statuses as indexes into the status tables.
+Only the fixed-width fields of a book entry are published: the
+timestamp, clientOrderId and order type stay in the bot.
+
+Run `python -m ctraderbot.shm_books` to print the books a running bot
+is publishing, and `python -m ctraderbot.shm_books_bench` to time
+publishing and reading synthetic books.
+"""
+import os
+import struct
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+MAGIC = b"CTBOOKS1"
+LAYOUT_VERSION = 1
+NONE = -(2 ** 63)               # None in an int64 field
+
+POSITION_STATUSES = (None, "OPEN", "CLOSED")
+SIDE_STATUSES = (None, "running", "liquidated", "successful")
+
+_HEADER = struct.Struct("<8sIIII")               # magic, version, position slots, couple slots, writer pid
+_HEADER_SIZE = 64
+_SEQ = struct.Struct("<Q")
+_SUMMARY = struct.Struct("<qqd")                  # published_ns, publishes, latest_price
+# position_id, symbol_id, trade_side, status, digits, lot_size, volume, entry_price,
+# used_margin, swap, total_balance, unrealisedNetProfit, grossUnrealisedProfit
+_POSITION = struct.Struct("<qIBBBxqqdqqqqq")
+# trade_id, ending_balance, resulted_balance, long_position_id, short_position_id,
+# long_status, short_status
+_COUPLE = struct.Struct("<qqqqqBB6x")
+
+_READ_SPINS = 16              # retries before a reader starts sleeping between attempts
+_READ_TRIES = 10_000
+_READ_BACKOFF_S = 0.00005
+
+
+def _record_size(payload: struct.Struct) -> int:
+    return _SEQ.size + payload.size
+
+
+def segment_size(slots: int) -> int:
+    return (_HEADER_SIZE + _record_size(_SUMMARY)
+            + slots * (_record_size(_POSITION) + _record_size(_COUPLE)))
+
+
+def _offsets(position_slots: int) -> tuple[int, int, int]:
+    summary = _HEADER_SIZE
+    positions = summary + _record_size(_SUMMARY)
+    couples = positions + position_slots * _record_size(_POSITION)
+    return summary, positions, couples
+
+
+def _open_segment(name: str, create: bool = False, size: int = 0):
+    """
+    Maps the segment without handing it to multiprocessing's resource
+    tracker, which would unlink it when this process exits, even if
+    another process is still publishing to it.
+    """
+    shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    return shm
+
+
+def _unlink(shm):
+    # SharedMemory.unlink() also unregisters from the tracker; register again so that is balanced
+    resource_tracker.register(shm._name, "shared_memory")
+    shm.unlink()
+
+
+def _money(value) -> int:
+    return NONE if value is None else int(value)
+
+
+def _unmoney(value: int):
+    return None if value == NONE else value
+
+
+def _status(table: tuple, value) -> int:
+    try:
+        return table.index(value)
+    except ValueError:
+        return 0
+
+
+# --- Writer ---
+
+class SharedBooksWriter:
+    """Publishes the bot's books. One writer per segment; call from the reactor thread."""
+
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = slots
+        size = segment_size(slots)
+        try:
+            self.shm = _open_segment(name, create=True, size=size)
+        except FileExistsError:
+            # Left by a previous run (or the previous leader): reuse it if the layout matches,
+            # so readers that already mapped it keep working
+            self.shm = _open_segment(name)
+            if self.shm.size < size or bytes(self.shm.buf[:8]) != MAGIC or self._slots_in_header() != slots:
+                self.shm.close()
+                _unlink(self.shm)
+                self.shm = _open_segment(name, create=True, size=size)
+
+        self.buf = self.shm.buf
+        self.summary_offset, positions_offset, couples_offset = _offsets(slots)
+        self.positions = _new_section(positions_offset, _POSITION, slots)
+        self.couples = _new_section(couples_offset, _COUPLE, slots)
+        self.publishes = 0
+        self.overflow = 0
+
+        # Clear whatever the previous writer left behind, record by record
+        empty_position = bytes(_POSITION.size)
+        empty_couple = bytes(_COUPLE.size)
+        for slot in range(slots):
+            self._write(self.positions["offset"] + slot * self.positions["size"], empty_position)
+            self._write(self.couples["offset"] + slot * self.couples["size"], empty_couple)
+        _HEADER.pack_into(self.buf, 0, MAGIC, LAYOUT_VERSION, slots, slots, os.getpid())
+
+    def _slots_in_header(self) -> int:
+        _, version, position_slots, couple_slots, _ = _HEADER.unpack_from(self.shm.buf, 0)
+        return position_slots if version == LAYOUT_VERSION and position_slots == couple_slots else -1
+
+    def _write(self, offset: int, payload: bytes):
+        buf = self.buf
+        seq = _SEQ.unpack_from(buf, offset)[0] | 1
+        _SEQ.pack_into(buf, offset, seq)                  # odd: write in progress
+        buf[offset + 8:offset + 8 + len(payload)] = payload
+        _SEQ.pack_into(buf, offset, seq + 1)              # even: consistent
+
+    def publish(self, positions: dict, trade_couple: dict, latest_price: float = 0.0, symbol_of=None) -> int:
+        """
+        Writes the entries that changed since the last publish and returns
+        the number of records written. `symbol_of(symbol_id)` gives the
+        symbol record whose digits and lot size go with each position.
+        """
+        symbol_of = symbol_of or (lambda _: None)
+        written = self._sync(self.positions, positions,
+                             lambda pid, data: _pack_position(pid, data, symbol_of(data.get("symbolId"))))
+        written += self._sync(self.couples, trade_couple, _pack_couple)
+        self.publishes += 1
+        self._write(self.summary_offset,
+                    _SUMMARY.pack(time.time_ns(), self.publishes, float(latest_price or 0.0)))
+        return written
+
+    def _sync(self, section: dict, entries: dict, pack) -> int:
+        slot_of, last, free = section["slot_of"], section["last"], section["free"]
+        offset, size = section["offset"], section["size"]
+        written = 0
+
+        for key in [key for key in slot_of if key not in entries]:
+            slot = slot_of.pop(key)
+            last[slot] = None
+            free.append(slot)
+            self._write(offset + slot * size, section["empty"])
+            written += 1
+
+        for key, entry in entries.items():
+            slot = slot_of.get(key)
+            if slot is None:
+                if not free:
+                    self.overflow += 1
+                    continue
+                slot = slot_of[key] = free.pop()
+            packed = pack(key, entry)
+            if packed != last[slot]:
+                last[slot] = packed
+                self._write(offset + slot * size, packed)
+                written += 1
+        return written
+
+    def close(self, unlink: bool = False):
+        self.buf = None
+        self.shm.close()
+        if unlink:
+            try:
+                _unlink(self.shm)
+            except FileNotFoundError:
+                pass
+
+
+def _new_section(offset: int, payload: struct.Struct, slots: int) -> dict:
+    return {
+        "offset": offset,
+        "size": _record_size(payload),
+        "empty": bytes(payload.size),
+        "slot_of": {},                              # book key -> slot
+        "last": [None] * slots,                     # payload last written per slot
+        "free": list(range(slots - 1, -1, -1)),     # pop() hands out the lowest slot first
+    }
+
+
+def _pack_position(position_id, data: dict, symbol: dict | None) -> bytes:
+    symbol = symbol or {}
+    return _POSITION.pack(
+        position_id,
+        data.get("symbolId") or 0,
+        data.get("tradeSide") or 0,
+        _status(POSITION_STATUSES, data.get("status")),
+        symbol.get("digits", 0),
+        symbol.get("lot_size", 0),
+        data.get("volume") or 0,
+        float(data.get("entry_price") or 0.0),
+        data.get("used_margin") or 0,
+        data.get("swap") or 0,
+        _money(data.get("total_balance")),
+        _money(data.get("unrealisedNetProfit")),
+        _money(data.get("grossUnrealisedProfit")),
+    )
+
+
+def _pack_couple(trade_id, couple: dict) -> bytes:
+    return _COUPLE.pack(
+        trade_id,
+        _money(couple.get("ending_balance")),
+        _money(couple.get("resulted_balance")),
+        couple.get("long_position_id") or 0,
+        couple.get("short_position_id") or 0,
+        _status(SIDE_STATUSES, couple.get("long_status")),
+        _status(SIDE_STATUSES, couple.get("short_status")),
+    )
+
+
+# --- Reader ---
+
+class SharedBooksReader:
+    """
+    Maps a writer's segment read-only in spirit (nothing is ever written)
+    and decodes the books on demand. Safe to use from any thread or
+    process. The segment is mapped on first use and re-mapped when the
+    writer recreated it.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.shm = None
+        self.retries = 0
+
+    def attach(self) -> bool:
+        """True when a writer's segment is mapped (or could be mapped now)."""
+        if self.shm is not None:
+            return True
+        try:
+            shm = _open_segment(self.name)
+        except FileNotFoundError:
+            return False
+        magic, version, position_slots, couple_slots, _ = _HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION or shm.size < segment_size(position_slots):
+            shm.close()
+            return False
+        self.shm = shm
+        self.slots = position_slots
+        self.summary_offset, self.positions_offset, self.couples_offset = _offsets(position_slots)
+        return True
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
+
+    def _read(self, offset: int, payload: struct.Struct):
+        buf = self.shm.buf
+        start, end = offset + 8, offset + 8 + payload.size
+        for attempt in range(_READ_TRIES):
+            before = _SEQ.unpack_from(buf, offset)[0]
+            if not before & 1:
+                data = bytes(buf[start:end])
+                if _SEQ.unpack_from(buf, offset)[0] == before:
+                    return payload.unpack(data)
+            self.retries += 1
+            if attempt >= _READ_SPINS:
+                # The writer may have been preempted mid-record: let it run
+                time.sleep(_READ_BACKOFF_S)
+        raise RuntimeError(f"shared books record at {offset} kept changing")
+
+    def summary(self) -> dict:
+        published_ns, publishes, latest_price = self._read(self.summary_offset, _SUMMARY)
+        writer_pid = _HEADER.unpack_from(self.shm.buf, 0)[4]
+        return {
+            "writer_pid": writer_pid,
+            "publishes": publishes,
+            "latest_price": latest_price,
+            "age_s": (time.time_ns() - published_ns) / 1e9 if published_ns else None,
+        }
+
+    def positions(self) -> dict:
+        """position_id -> book entry, in bot.positions' shape (money ints)."""
+        size = _record_size(_POSITION)
+        positions = {}
+        for slot in range(self.slots):
+            (position_id, symbol_id, trade_side, status, digits, lot_size, volume, entry_price,
+             used_margin, swap, total_balance, net, gross) = self._read(self.positions_offset + slot * size, _POSITION)
+            if not position_id:
+                continue
+            positions[position_id] = {
+                "symbolId": symbol_id,
+                "volume": volume,
+                "entry_price": entry_price,
+                "used_margin": used_margin,
+                "swap": swap,
+                "status": POSITION_STATUSES[status] if status < len(POSITION_STATUSES) else None,
+                "tradeSide": trade_side,
+                "total_balance": _unmoney(total_balance),
+                "unrealisedNetProfit": _unmoney(net),
+                "grossUnrealisedProfit": _unmoney(gross),
+                # Enough of the symbol record for display (volume_to_lots, price rounding)
+                "symbol": {"digits": digits, "lot_size": lot_size} if lot_size else None,
+            }
+        return positions
+
+    def trade_couples(self) -> dict:
+        """trade_id -> book entry, in bot.trade_couple's shape (money ints)."""
+        size = _record_size(_COUPLE)
+        couples = {}
+        for slot in range(self.slots):
+            (trade_id, ending_balance, resulted_balance, long_pid, short_pid,
+             long_status, short_status) = self._read(self.couples_offset + slot * size, _COUPLE)
+            if not trade_id:
+                continue
+            couples[trade_id] = {
+                "trade_id": trade_id,
+                "ending_balance": _unmoney(ending_balance),
+                "resulted_balance": _unmoney(resulted_balance),
+                "long_position_id": long_pid or None,
+                "long_status": SIDE_STATUSES[long_status] if long_status < len(SIDE_STATUSES) else None,
+                "short_position_id": short_pid or None,
+                "short_status": SIDE_STATUSES[short_status] if short_status < len(SIDE_STATUSES) else None,
+            }
+        return couples
+
+    def books(self, stale_after: float | None = None) -> dict | None:
+        """
+        Both books plus the summary, or None when no writer's segment is
+        mapped. With `stale_after`, a segment not published to for that
+        many seconds is re-mapped once, in case the writer recreated it.
+        """
+        if not self.attach():
+            return None
+        summary = self.summary()
+        if stale_after is not None and (summary["age_s"] is None or summary["age_s"] > stale_after):
+            self.close()
+            if not self.attach():
+                return None
+            summary = self.summary()
+        return {"summary": summary, "positions": self.positions(), "trade_couples": self.trade_couples()}
+
+
+
+def main():
+    from .settings import SHARED_BOOKS_NAME
+
+    books = SharedBooksReader(SHARED_BOOKS_NAME).books()
+    if books is None:
+        print(f"[SHM] No books published to {SHARED_BOOKS_NAME}.")
+        return
+    print(f"[SHM] {books['summary']}")
+    for pid, data in books["positions"].items():
+        print(f"[SHM] position {pid}: {data}")
+    for tid, couple in books["trade_couples"].items():
+        print(f"[SHM] trade {tid}: {couple}")
+
+
+if __name__ == "__main__":
+    main()
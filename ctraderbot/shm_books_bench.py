@@ -0,0 +1,77 @@
+# file: ctraderbot/shm_books_bench.py
+"""
+Publish and read cost of the shared-memory books.
+
+    python -m ctraderbot.shm_books_bench --trades 50 --rounds 2000
+
+A writer publishes synthetic books where every position's PnL changes
+each round, as on a PnL response, and a reader in the same process reads
+both books in full. Reports microseconds per publish and per read. The
+segment is private to the run and unlinked afterwards.
+"""
+import time
+
+from .shm_books import SharedBooksReader, SharedBooksWriter
+
+
+def _sample_books(n: int) -> tuple[dict, dict, dict]:
+    symbol = {"digits": 5, "lot_size": 10_000_000}
+    positions, couples = {}, {}
+    for i in range(n):
+        long_pid, short_pid = 1_000_000 + 2 * i, 1_000_001 + 2 * i
+        for pid, side in ((long_pid, 1), (short_pid, 2)):
+            positions[pid] = {
+                "symbolId": 1, "volume": 100_000, "entry_price": 1.08, "used_margin": 2_160,
+                "swap": 0, "status": "OPEN", "tradeSide": side, "total_balance": 5_000_000,
+                "unrealisedNetProfit": 0, "grossUnrealisedProfit": 0,
+            }
+        couples[i + 1] = {
+            "trade_id": i + 1, "ending_balance": 20_000_000, "resulted_balance": None,
+            "long_position_id": long_pid, "long_status": "running",
+            "short_position_id": short_pid, "short_status": "running",
+        }
+    return positions, couples, symbol
+
+
+def benchmark(trades: int = 50, rounds: int = 2000, name: str = "ctraderbot_books_bench") -> dict:
+    """Publish cost per PnL tick (every position's PnL changes) and full read cost, in microseconds."""
+    positions, couples, symbol = _sample_books(trades)
+    writer = SharedBooksWriter(name, max(len(positions), len(couples)))
+    reader = SharedBooksReader(name)
+    try:
+        writer.publish(positions, couples, 1.08, lambda _: symbol)
+        started = time.perf_counter()
+        for r in range(rounds):
+            for data in positions.values():
+                data["unrealisedNetProfit"] = r
+            writer.publish(positions, couples, 1.08, lambda _: symbol)
+        publish_s = (time.perf_counter() - started) / rounds
+
+        started = time.perf_counter()
+        for _ in range(rounds):
+            books = reader.books()
+        read_s = (time.perf_counter() - started) / rounds
+        if len(books["positions"]) != len(positions) or len(books["trade_couples"]) != len(couples):
+            raise RuntimeError("reader did not see every published entry")
+    finally:
+        reader.close()
+        writer.close(unlink=True)
+    return {"positions": len(positions), "trade_couples": len(couples),
+            "publish_us": publish_s * 1e6, "read_us": read_s * 1e6}
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time publishing and reading the shared-memory books")
+    parser.add_argument("--trades", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    r = benchmark(args.trades, args.rounds)
+    print(f"[SHM] {r['positions']} positions, {r['trade_couples']} trade couples: "
+          f"publish {r['publish_us']:.1f} us, full read {r['read_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# file: ctraderbot/strategy.py
+"""
+Pure strategy rules shared by the live bot and the backtester.
+
+Nothing here touches the database, the reactor or the network; the live
+code feeds these functions with values from the DB/memory and the
+backtester feeds them with simulated ones.
+"""
+
+from .symbols import DEFAULT_SYMBOL, lots_to_volume
+
+# Units per standard lot for EURUSD-like symbols (used by the backtester)
+LOT_UNITS = 100_000
+
+# A pivot segment splits once its balance reaches this multiple of the initial milestone
+DEFAULT_EXTEND_MULTIPLE = 2
+# A side is liquidated when balance + PnL falls to this level
+DEFAULT_LIQUIDATION_FLOOR = 0
+
+LIQUIDATED = "liquidated"
+SUCCESSFUL = "successful"
+
+
+def order_volume(lot_size, symbol=DEFAULT_SYMBOL) -> int:
+    """
+    Milestone lot size (in lots) -> ProtoOANewOrderReq volume for `symbol`.
+    Raises ValueError when the lot size is below the symbol's minimum volume.
+    """
+    return lots_to_volume(symbol, lot_size)
+
+
+def pnl_limits(balance, ending_balance, liquidation_floor=DEFAULT_LIQUIDATION_FLOOR):
+    """
+    PnL levels that end a side: (loss_limit, profit_target). The side is
+    liquidated at PnL <= loss_limit and successful at PnL > profit_target.
+    """
+    return liquidation_floor - balance, ending_balance - balance
+
+
+def side_outcome(balance, pnl, ending_balance, liquidation_floor=DEFAULT_LIQUIDATION_FLOOR):
+    """Outcome of one hedge leg for the current PnL: LIQUIDATED, SUCCESSFUL or None (keep running)."""
+    loss_limit, profit_target = pnl_limits(balance, ending_balance, liquidation_floor)
+    if pnl <= loss_limit:
+        return LIQUIDATED
+    if pnl > profit_target:
+        return SUCCESSFUL
+    return None
+
+
+def resulted_balance(balance, pnl, outcome):
+    """Balance a leg leaves behind once it has closed with `outcome`."""
+    return 0 if outcome == LIQUIDATED else balance + pnl
+
+
+def should_extend_segment(pivot_balance, milestone_balance, extend_multiple=DEFAULT_EXTEND_MULTIPLE) -> bool:
+    """The pivot segment splits off a new segment once it has grown `extend_multiple` times."""
+    return pivot_balance >= extend_multiple * milestone_balance
+
+
+def split_pivot_balance(pivot_balance, milestone_balance):
+    """Returns (pivot_balance, new_segment_balance) after an extension."""
+    return milestone_balance, pivot_balance - milestone_balance
+
+
+def milestone_for_balance(milestones, balance):
+    """
+    The milestone whose [starting_balance, ending_balance) band holds
+    `balance`, or None past the last level. `milestones` are dicts or rows
+    with starting_balance / ending_balance attributes.
+    """
+    for milestone in milestones:
+        starting = _field(milestone, "starting_balance")
+        ending = _field(milestone, "ending_balance")
+        if starting <= balance < ending:
+            return milestone
+    return None
+
+
+def _field(row, name):
+    return row[name] if isinstance(row, dict) else getattr(row, name)
@@ -0,0 +1,92 @@
+# file: ctraderbot/symbols.py
+"""
+Per-symbol volume, pip and PnL conversions.
+
+A symbol record is a plain dict built from ProtoOASymbol (see
+bot/symbol_cache.py) with its multipliers precomputed, so conversions
+are integer arithmetic on API units:
+
+- prices: integer points, 1/100000 of the quote currency (PRICE_SCALE)
+- volumes: cents of a unit (VOLUME_SCALE); lot_size is the volume of one lot
+
+DEFAULT_SYMBOL reproduces the old EURUSD constants (100000 units per
+lot, 4th-decimal pips) and is used until the cache is loaded.
+"""
+
+PRICE_SCALE = 100_000
+VOLUME_SCALE = 100
+
+
+def make_symbol(symbol_id=None, name=None, digits=5, pip_position=4, lot_size=10_000_000,
+                min_volume=1, step_volume=1, max_volume=None) -> dict:
+    return {
+        "symbol_id": symbol_id,
+        "name": name,
+        "digits": digits,
+        "pip_position": pip_position,
+        "lot_size": lot_size,
+        "min_volume": min_volume,
+        "step_volume": max(step_volume, 1),
+        "max_volume": max_volume,
+        # Precomputed multipliers
+        "points_per_pip": 10 ** (5 - pip_position),
+        "units_per_lot": lot_size / VOLUME_SCALE,
+    }
+
+
+def symbol_from_proto(symbol, name=None) -> dict:
+    """ProtoOASymbol -> symbol record."""
+    return make_symbol(
+        symbol_id=symbol.symbolId,
+        name=name,
+        digits=symbol.digits,
+        pip_position=symbol.pipPosition,
+        lot_size=symbol.lotSize or DEFAULT_SYMBOL["lot_size"],
+        min_volume=symbol.minVolume or 1,
+        step_volume=symbol.stepVolume or 1,
+        max_volume=symbol.maxVolume or None,
+    )
+
+
+DEFAULT_SYMBOL = make_symbol(name="EURUSD")
+
+
+def lots_to_volume(symbol, lots) -> int:
+    """
+    Lots -> order volume, rounded down to the symbol's step and capped at
+    its maximum. Raises ValueError when that is below the symbol's minimum
+    volume, rather than trading more than asked for.
+    """
+    volume = int(round(float(lots) * symbol["lot_size"]))
+    step = symbol["step_volume"]
+    volume -= volume % step
+    if volume < symbol["min_volume"]:
+        raise ValueError(f"{lots} lots is volume {volume}, below the minimum "
+                         f"{symbol['min_volume']} for {symbol['name'] or symbol['symbol_id']}")
+    if symbol["max_volume"] and volume > symbol["max_volume"]:
+        volume = symbol["max_volume"] - symbol["max_volume"] % step
+    return volume
+
+
+def volume_to_lots(symbol, volume) -> float:
+    return volume / symbol["lot_size"]
+
+
+def price_to_points(price) -> int:
+    return int(round(float(price) * PRICE_SCALE))
+
+
+def pips_between(symbol, entry_price, exit_price, is_short=False) -> float:
+    """Signed pips gained from entry to exit (a short gains when the price falls)."""
+    points = price_to_points(exit_price) - price_to_points(entry_price)
+    if is_short:
+        points = -points
+    return points / symbol["points_per_pip"]
+
+
+def price_pnl(entry_price, exit_price, volume, is_short=False) -> float:
+    """Price PnL in the quote currency for `volume` (API volume units)."""
+    points = price_to_points(exit_price) - price_to_points(entry_price)
+    if is_short:
+        points = -points
+    return points * volume / (PRICE_SCALE * VOLUME_SCALE)
@@ -0,0 +1,141 @@
+# file: ctraderbot/trade_cycle.py
+"""
+Unit of work for starting a trade cycle.
+
+start_trade_cycle() decides whether a cycle starts and writes it in one
+transaction:
+
+- no running pivot segment: insert a pivot segment and its first trade
+- the pivot has grown enough to extend: update the pivot balance, insert
+  the new segment and its trade
+- otherwise: nothing
+
+Rows are inserted with Core INSERTs (keys come back from the insert
+itself, no refresh SELECT), the initial milestone is read with one join,
+and the pivot row is locked (SELECT ... FOR UPDATE) so two cycle starts
+cannot both split it. A segment therefore never exists without its
+trade. Results are plain NamedTuples (TradeRow / SegmentRow), not
+detached ORM objects.
+
+Run `python -m ctraderbot.trade_cycle_bench` to count statements,
+commits and latency of the old multi-session path against this one.
+"""
+import datetime as dt
+import uuid
+from typing import NamedTuple
+
+from sqlalchemy import Integer, cast, insert, select, update
+
+from .database import SessionSync
+from .models import Constant, Milestone, Segments, Trades
+from .money import to_decimal, to_money
+from .strategy import should_extend_segment, split_pivot_balance
+
+
+class SegmentRow(NamedTuple):
+    id: int
+    uuid: str
+    total_balance: object   # Decimal
+    is_pivot: bool
+
+
+class TradeRow(NamedTuple):
+    id: int
+    uuid: str
+    segment_id: int
+    current_level_id: int
+    starting_balance: object   # Decimal
+    profit_goal: object        # Decimal
+    status: str
+
+
+class CycleStart(NamedTuple):
+    trade: TradeRow
+    segment: SegmentRow
+    pivot_balance: object | None   # the pivot's new balance after an extension, else None
+
+
+def _initial_milestone(s):
+    """The milestone named by the active 'initial_level' constant, in one query."""
+    return s.execute(
+        select(Milestone)
+        .join(Constant, Milestone.id == cast(Constant.value, Integer))
+        .where(Constant.variable == 'initial_level', Constant.is_active == True)  # noqa: E712
+        .limit(1)
+    ).scalars().first()
+
+
+def _locked_pivot(s, subaccount_id):
+    return s.execute(
+        select(Segments.id, Segments.uuid, Segments.total_balance)
+        .where(Segments.subaccount_id == subaccount_id)
+        .where(Segments.is_pivot == True)  # noqa: E712
+        .where(Segments.status == 'running')
+        .order_by(Segments.opened_at.desc())
+        .limit(1)
+        .with_for_update()
+    ).first()
+
+
+def _insert_segment(s, subaccount_id, total_balance, pair, is_pivot, now) -> SegmentRow:
+    row = {
+        "uuid": str(uuid.uuid4()),
+        "subaccount_id": subaccount_id,
+        "total_positions": 0,
+        "total_balance": total_balance,
+        "pair": pair,
+        "opened_at": now,
+        "closed_at": None,
+        "status": 'running',
+        "is_pivot": is_pivot,
+    }
+    segment_id = s.execute(insert(Segments).values(**row)).inserted_primary_key[0]
+    return SegmentRow(segment_id, row["uuid"], total_balance, is_pivot)
+
+
+def _insert_trade(s, segment_id, milestone, starting_balance, now) -> TradeRow:
+    row = {
+        "uuid": str(uuid.uuid4()),
+        "segment_id": segment_id,
+        "curr_active": "B",  # 'Both'
+        "current_level_id": milestone.id,
+        "starting_balance": starting_balance,
+        "profit_goal": milestone.profit_goal,
+        "opened_at": now,
+        "status": 'running',
+    }
+    trade_id = s.execute(insert(Trades).values(**row)).inserted_primary_key[0]
+    return TradeRow(trade_id, row["uuid"], segment_id, milestone.id, starting_balance,
+                    milestone.profit_goal, 'running')
+
+
+def start_trade_cycle(subaccount_id: int, pair: str = "EURUSD") -> CycleStart | None:
+    """Creates the pivot or extension segment and its trade in one transaction, or returns None."""
+    now = dt.datetime.now(dt.timezone.utc)
+    with SessionSync() as s:
+        milestone = _initial_milestone(s)
+        if milestone is None:
+            raise RuntimeError("No milestone found for the initial level.")
+        pivot = _locked_pivot(s, subaccount_id)
+
+        if pivot is None:
+            segment = _insert_segment(s, subaccount_id, milestone.starting_balance, pair, True, now)
+            trade = _insert_trade(s, segment.id, milestone, milestone.starting_balance, now)
+            s.commit()
+            print(f"[CYCLE] New pivot Segment {segment.id} with Trade {trade.id}.")
+            return CycleStart(trade, segment, None)
+
+        milestone_balance = to_money(milestone.starting_balance)
+        pivot_balance = to_money(pivot.total_balance)
+        if not should_extend_segment(pivot_balance, milestone_balance):
+            s.rollback()
+            return None
+
+        kept, given = (to_decimal(b) for b in split_pivot_balance(pivot_balance, milestone_balance))
+        s.execute(update(Segments).where(Segments.id == pivot.id).values(total_balance=kept))
+        segment = _insert_segment(s, subaccount_id, given, pair, False, now)
+        trade = _insert_trade(s, segment.id, milestone, given, now)
+        s.commit()
+        print(f"[CYCLE] Pivot Segment {pivot.id} kept {kept}; new Segment {segment.id} "
+              f"with Trade {trade.id} got {given}.")
+        return CycleStart(trade, segment, kept)
@@ -0,0 +1,131 @@
+# file: ctraderbot/trade_cycle_bench.py
+"""
+Legacy multi-session cycle start vs trade_cycle.start_trade_cycle().
+
+    python -m ctraderbot.trade_cycle_bench --runs 200 --rtt-ms 1
+
+Both paths run against a scratch SQLite database (scratch_db), each time
+from a pivot that is due to extend, and report statements, commits and
+latency per cycle start. `--rtt-ms` adds a simulated network round trip
+to every statement and commit, to show what the counts cost against a
+remote MySQL.
+"""
+import datetime as dt
+import time
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import delete, event
+
+from . import helpers, trade_cycle
+from .models import Constant, Milestone, Segments, Subaccount, Trades
+from .money import to_decimal, to_money
+from .scratch_db import bound_sessions, scratch_sessionmaker
+from .strategy import should_extend_segment, split_pivot_balance
+
+
+def _legacy_cycle_start(subaccount_id, pair="EURUSD"):
+    """The previous sequence of sessions (helpers.create_new_segment / create_trade), for comparison."""
+    pivot_segment = helpers.fetch_running_pivot_segment(subaccount_id)
+    with helpers.SessionSync() as s:
+        initial_level = s.query(Constant).where(
+            Constant.variable == 'initial_level', Constant.is_active == True,  # noqa: E712
+        ).first()
+        milestone = s.query(Milestone).where(Milestone.id == int(initial_level.value)).first()
+    if pivot_segment is None:
+        segment = helpers.create_new_segment(subaccount_id, milestone.id, milestone.starting_balance, pair,
+                                             is_pivot=True)
+        return helpers.create_trade(segment.id, milestone.id, milestone.starting_balance)
+
+    milestone_balance = to_money(milestone.starting_balance)
+    pivot_balance = to_money(pivot_segment.total_balance)
+    if not should_extend_segment(pivot_balance, milestone_balance):
+        return None
+    kept, given = (to_decimal(b) for b in split_pivot_balance(pivot_balance, milestone_balance))
+    pivot_segment.total_balance = kept
+    with helpers.SessionSync() as s:
+        s.merge(pivot_segment)
+        s.commit()
+    segment = helpers.create_new_segment(subaccount_id, milestone.id, given, pair)
+    return helpers.create_trade(segment.id, milestone.id, given)
+
+
+def benchmark(url: str = "sqlite://", runs: int = 200, rtt_ms: float = 0.0) -> dict:
+    """Runs both paths `runs` times on a scratch SQLite `url`."""
+    factory = scratch_sessionmaker(url, [Subaccount.__table__, Constant.__table__, Milestone.__table__,
+                                         Segments.__table__, Trades.__table__])
+    engine = factory.kw["bind"]
+    counts = {"statements": 0, "commits": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count_statement(*_):
+        counts["statements"] += 1
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    @event.listens_for(engine, "commit")
+    def _count_commit(*_):
+        counts["commits"] += 1
+        if rtt_ms:
+            time.sleep(rtt_ms / 1000)
+
+    with factory() as s:
+        s.execute(delete(Trades))
+        s.execute(delete(Segments))
+        s.execute(delete(Constant).where(Constant.variable == 'initial_level'))
+        s.merge(Milestone(id=1, starting_balance=Decimal("100"), loss=Decimal("100"),
+                          profit_goal=Decimal("100"), lot_size=Decimal("0.01"), ending_balance=Decimal("200")))
+        s.add(Constant(variable='initial_level', value='1', is_active=True))
+        s.commit()
+
+    def reset_pivot():
+        # A pivot that has doubled, so every run takes the extension branch
+        with factory() as s:
+            s.execute(delete(Trades))
+            s.execute(delete(Segments))
+            s.add(Segments(uuid=str(uuid.uuid4()), subaccount_id=1, total_balance=Decimal("1000"),
+                           opened_at=dt.datetime.now(dt.timezone.utc), status='running', is_pivot=True))
+            s.commit()
+
+    results = {}
+    with bound_sessions(factory, helpers, trade_cycle):
+        for name, func in (("legacy", _legacy_cycle_start), ("unit_of_work", trade_cycle.start_trade_cycle)):
+            statements = commits = 0
+            elapsed = 0.0
+            for _ in range(runs):
+                reset_pivot()
+                counts.update(statements=0, commits=0)
+                started = time.perf_counter()
+                if func(1) is None:
+                    raise RuntimeError(f"{name}: cycle did not start")
+                elapsed += time.perf_counter() - started
+                statements += counts["statements"]
+                commits += counts["commits"]
+            results[name] = {
+                "statements_per_cycle": statements / runs,
+                "commits_per_cycle": commits / runs,
+                "ms_per_cycle": elapsed / runs * 1000,
+            }
+    return results
+
+
+def main():
+    import argparse
+    import contextlib
+    import io
+
+    parser = argparse.ArgumentParser(description="Compare the legacy and unit-of-work trade-cycle start")
+    parser.add_argument("--url", default="sqlite://", help="SQLite URL (default: in-memory)")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated round-trip per statement/commit")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = benchmark(args.url, args.runs, args.rtt_ms)
+    for name, r in results.items():
+        print(f"[CYCLE] {name:>12}: {r['statements_per_cycle']:.1f} statements, "
+              f"{r['commits_per_cycle']:.1f} commits, {r['ms_per_cycle']:.2f} ms per cycle start")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+# file: ctraderbot/transport.py
+"""
+Open API transport on plain asyncio.
+
+AsyncioClient is a drop-in for ctrader_open_api.Client: the same
+callbacks, send() returning a Deferred that fires with the response
+matched by clientMsgId, whenConnected(), and a protocol object with
+heartbeat() / send() / sendString() / stringReceived(). Underneath, it
+is an asyncio.Protocol on loop.create_connection with the ssl module:
+no Twisted endpoint, TLS or ClientService on the I/O path.
+
+- Framing: 4-byte big-endian length + serialized ProtoMessage, like
+  Twisted's Int32StringReceiver.
+- Send rate: at most `messages_per_second` frames in any one second. A
+  frame goes out immediately when the budget allows; the Twisted client
+  only sends on a once-a-second tick.
+- Reconnect: redials after every disconnect or failed attempt, with the
+  delays of retry_policy (reconnect.build_retry_policy).
+
+The bot's own code still uses Deferreds on the asyncio reactor; they
+are fired directly from the protocol callbacks on the same loop. Pick
+the transport with OPENAPI_TRANSPORT (build_client). Run
+`python -m ctraderbot.transport_bench` to compare throughput and request
+latency with the Twisted client against a local server.
+"""
+import asyncio
+import ssl
+import time
+from collections import deque
+
+from ctrader_open_api import Protobuf
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoHeartbeatEvent, ProtoMessage
+from twisted.internet.defer import Deferred, TimeoutError, fail, succeed
+from twisted.internet.error import ConnectionLost
+
+from .settings import HOST, PORT, OPENAPI_TRANSPORT, OUTBOUND_RATE_PER_SECOND
+
+_PREFIX = 4
+MAX_LENGTH = 15_000_000       # same cap as ctrader_open_api.TcpProtocol
+_HEARTBEAT_IDLE_S = 20        # like TcpProtocol: heartbeat after 20s without sending
+_HEARTBEAT_TYPE = ProtoHeartbeatEvent().payloadType
+
+
+class FrameProtocol(asyncio.Protocol):
+    """One connection: length-prefixed ProtoMessage frames in both directions."""
+
+    def __init__(self, client):
+        self.client = client
+        self.transport = None
+        self.closed = asyncio.get_running_loop().create_future()
+        self._buffer = bytearray()
+
+    # --- asyncio.Protocol ---
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        buf = self._buffer
+        buf += data
+        while len(buf) >= _PREFIX:
+            length = int.from_bytes(buf[:_PREFIX], "big")
+            if length > MAX_LENGTH:
+                self.transport.close()
+                return
+            end = _PREFIX + length
+            if len(buf) < end:
+                return
+            frame = bytes(buf[_PREFIX:end])
+            del buf[:end]
+            self.stringReceived(frame)
+
+    def connection_lost(self, exc):
+        if not self.closed.done():
+            self.closed.set_result(exc)
+
+    # --- Same surface as TcpProtocol ---
+
+    def stringReceived(self, data):
+        msg = ProtoMessage()
+        msg.ParseFromString(data)
+        if msg.payloadType == _HEARTBEAT_TYPE:
+            self.heartbeat()
+        self.client._received(msg)
+
+    def sendString(self, data):
+        self.transport.write(len(data).to_bytes(_PREFIX, "big") + data)
+        self.client._last_send = time.monotonic()
+
+    def send(self, message, instant=False, clientMsgId=None, isCanceled=None):
+        if isinstance(message, bytes):
+            data = message
+        elif isinstance(message, ProtoMessage):
+            data = message.SerializeToString()
+        else:
+            data = ProtoMessage(payload=message.SerializeToString(), clientMsgId=clientMsgId,
+                                payloadType=message.payloadType).SerializeToString()
+        if instant:
+            self.sendString(data)
+        else:
+            self.client._enqueue(isCanceled, data)
+
+    def heartbeat(self):
+        self.send(ProtoHeartbeatEvent(), True)
+
+
+class AsyncioClient:
+    def __init__(self, host, port, retryPolicy=None, numberOfMessagesToSendPerSecond=5,
+                 use_ssl=True, protocol_factory=FrameProtocol):
+        self.host = host
+        self.port = port
+        self.retry_policy = retryPolicy or (lambda attempt: min(2 ** attempt, 60))
+        self.numberOfMessagesToSendPerSecond = numberOfMessagesToSendPerSecond
+        self.ssl = ssl.create_default_context() if use_ssl is True else (use_ssl or None)
+        self.protocol_factory = protocol_factory
+        self.isConnected = False
+        self.running = False
+        self.protocol = None
+        self._task = None
+        self._failures = 0
+        self._waiters = []                 # (Deferred, failAfterFailures)
+        self._responseDeferreds = {}       # clientMsgId -> (Deferred, timeout handle)
+        self._queue = deque()              # (isCanceled, frame) waiting for send budget
+        self._sent_at = deque()            # send times inside the last second
+        self._drain_handle = None
+        self._idle_handle = None
+        self._last_send = None
+
+    # --- Callbacks, as in ctrader_open_api.Client ---
+
+    def setConnectedCallback(self, callback):
+        self._connectedCallback = callback
+
+    def setDisconnectedCallback(self, callback):
+        self._disconnectedCallback = callback
+
+    def setMessageReceivedCallback(self, callback):
+        self._messageReceivedCallback = callback
+
+    # --- Service ---
+
+    def startService(self):
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.get_event_loop().create_task(self._run())
+
+    def stopService(self):
+        self.running = False
+        if self.protocol is not None and self.protocol.transport is not None:
+            self.protocol.transport.close()
+        elif self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            try:
+                _, protocol = await loop.create_connection(
+                    lambda: self.protocol_factory(self), self.host, self.port,
+                    ssl=self.ssl, server_hostname=self.host if self.ssl else None,
+                )
+            except OSError as e:
+                self._failures += 1
+                self._fail_waiters(e)
+                delay = self.retry_policy(self._failures)
+                print(f"[TRANSPORT] Connect to {self.host}:{self.port} failed ({e}). Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+                continue
+
+            self._failures = 0
+            self.protocol = protocol
+            self.isConnected = True
+            self._arm_idle_heartbeat()
+            for d, _ in self._waiters:
+                d.callback(protocol)
+            self._waiters = []
+            if hasattr(self, "_connectedCallback"):
+                self._connectedCallback(self)
+
+            reason = await protocol.closed
+            self._disconnected(reason)
+            if self.running:
+                await asyncio.sleep(self.retry_policy(0))
+
+    def _disconnected(self, reason):
+        self.isConnected = False
+        self.protocol = None
+        self._queue.clear()
+        for handle in (self._drain_handle, self._idle_handle):
+            if handle is not None:
+                handle.cancel()
+        self._drain_handle = self._idle_handle = None
+        # Nothing will answer these any more
+        pending, self._responseDeferreds = self._responseDeferreds, {}
+        for d, timeout in pending.values():
+            timeout.cancel()
+            d.errback(ConnectionLost(str(reason or "connection closed")))
+        if hasattr(self, "_disconnectedCallback"):
+            self._disconnectedCallback(self, reason or ConnectionLost("connection closed"))
+
+    def whenConnected(self, failAfterFailures=None):
+        if self.isConnected:
+            return succeed(self.protocol)
+        if failAfterFailures is not None and not self.running:
+            return fail(ConnectionLost("client is not running"))
+        d = Deferred()
+        self._waiters.append((d, failAfterFailures))
+        return d
+
+    def _fail_waiters(self, error):
+        keep = []
+        for d, limit in self._waiters:
+            if limit is not None and self._failures >= limit:
+                d.errback(ConnectionLost(str(error)))
+            else:
+                keep.append((d, limit))
+        self._waiters = keep
+
+    # --- Requests ---
+
+    def send(self, message, clientMsgId=None, responseTimeoutInSeconds=5, **params):
+        if type(message) in [str, int]:
+            message = Protobuf.get(message, **params)
+        d = Deferred(self._cancel_response)
+        if clientMsgId is None:
+            clientMsgId = str(id(d))
+        timeout = asyncio.get_event_loop().call_later(responseTimeoutInSeconds, self._timed_out, clientMsgId)
+        self._responseDeferreds[clientMsgId] = (d, timeout)
+
+        connected = self.whenConnected(failAfterFailures=1)
+        connected.addCallbacks(
+            lambda protocol: protocol.send(message, clientMsgId=clientMsgId,
+                                           isCanceled=lambda: clientMsgId not in self._responseDeferreds),
+            lambda failure: self._fail_response(clientMsgId, failure),
+        )
+        return d
+
+    def _received(self, message):
+        if hasattr(self, "_messageReceivedCallback"):
+            self._messageReceivedCallback(self, message)
+        entry = self._responseDeferreds.pop(message.clientMsgId, None) if message.clientMsgId else None
+        if entry is not None:
+            d, timeout = entry
+            timeout.cancel()
+            d.callback(message)
+
+    def _timed_out(self, clientMsgId):
+        entry = self._responseDeferreds.pop(clientMsgId, None)
+        if entry is not None:
+            entry[0].errback(TimeoutError(f"no response to {clientMsgId}"))
+
+    def _fail_response(self, clientMsgId, failure):
+        entry = self._responseDeferreds.pop(clientMsgId, None)
+        if entry is not None:
+            entry[1].cancel()
+            entry[0].errback(failure)
+
+    def _cancel_response(self, d):
+        entry = self._responseDeferreds.pop(str(id(d)), None)
+        if entry is not None:
+            entry[1].cancel()
+
+    # --- Send budget ---
+
+    def _enqueue(self, isCanceled, data):
+        self._queue.append((isCanceled, data))
+        if self._drain_handle is None:
+            self._drain()
+
+    def _drain(self):
+        self._drain_handle = None
+        if self.protocol is None:
+            return
+        now = time.monotonic()
+        sent_at = self._sent_at
+        while sent_at and now - sent_at[0] >= 1.0:
+            sent_at.popleft()
+        while self._queue and len(sent_at) < self.numberOfMessagesToSendPerSecond:
+            isCanceled, data = self._queue.popleft()
+            if isCanceled is not None and isCanceled():
+                continue
+            self.protocol.sendString(data)
+            sent_at.append(now)
+        if self._queue:
+            self._drain_handle = asyncio.get_event_loop().call_later(1.0 - (now - sent_at[0]), self._drain)
+
+    def _arm_idle_heartbeat(self):
+        self._last_send = time.monotonic()
+        self._idle_handle = asyncio.get_event_loop().call_later(_HEARTBEAT_IDLE_S, self._idle_heartbeat)
+
+    def _idle_heartbeat(self):
+        if self.protocol is None:
+            return
+        idle = time.monotonic() - self._last_send
+        if idle >= _HEARTBEAT_IDLE_S:
+            self.protocol.heartbeat()
+            idle = 0
+        self._idle_handle = asyncio.get_event_loop().call_later(_HEARTBEAT_IDLE_S - idle, self._idle_heartbeat)
+
+
+def build_client(transport: str = OPENAPI_TRANSPORT, host=HOST, port=PORT):
+    """The Open API client for OPENAPI_TRANSPORT: "twisted" (ctrader_open_api.Client) or "asyncio"."""
+    from .bot.reconnect import build_retry_policy
+
+    # The outbound scheduler (bot/outbound.py) hands over no more than this per second
+    per_second = max(1, round(OUTBOUND_RATE_PER_SECOND))
+    if transport == "asyncio":
+        print("[TRANSPORT] Using the asyncio Open API transport.")
+        return AsyncioClient(host, port, retryPolicy=build_retry_policy(), numberOfMessagesToSendPerSecond=per_second)
+    if transport != "twisted":
+        raise ValueError(f"unknown OPENAPI_TRANSPORT {transport!r}")
+    from ctrader_open_api import Client, TcpProtocol
+    return Client(host, port, TcpProtocol, retryPolicy=build_retry_policy(),
+                  numberOfMessagesToSendPerSecond=per_second)
@@ -0,0 +1,192 @@
+# file: ctraderbot/transport_bench.py
+"""
+Twisted vs asyncio Open API transport, against a local server.
+
+    python -m ctraderbot.transport_bench --messages 50000 --requests 10
+    python -m ctraderbot.transport_bench --tls cert.pem key.pem --uvloop
+
+The server speaks the Open API framing: it answers ProtoOAVersionReq
+with ProtoOAVersionRes (same clientMsgId) and answers
+ProtoOASubscribeSpotsReq by pushing --messages spot events back to back.
+For each client it reports push throughput (spot events/s through the
+message callback, counted from the first one received) and the
+round-trip latency of sequential requests through send()'s Deferred,
+including each client's send scheduling.
+"""
+from __future__ import annotations
+
+_SPOT = dict(ctidTraderAccountId=1, symbolId=1, bid=108000, ask=108010)
+
+
+def _server_factory(messages: int):
+    import asyncio
+    from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoMessage
+    from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+        ProtoOASpotEvent, ProtoOASubscribeSpotsReq, ProtoOASubscribeSpotsRes, ProtoOAVersionReq, ProtoOAVersionRes,
+    )
+
+    def frame(message, client_msg_id=None):
+        data = ProtoMessage(payloadType=message.payloadType, payload=message.SerializeToString(),
+                            clientMsgId=client_msg_id).SerializeToString()
+        return len(data).to_bytes(4, "big") + data
+
+    spot = frame(ProtoOASpotEvent(**_SPOT))
+    version_type = ProtoOAVersionReq().payloadType
+    subscribe_type = ProtoOASubscribeSpotsReq().payloadType
+
+    class Server(asyncio.Protocol):
+        def connection_made(self, transport):
+            self.transport = transport
+            self.buffer = bytearray()
+
+        def data_received(self, data):
+            self.buffer += data
+            while len(self.buffer) >= 4:
+                end = 4 + int.from_bytes(self.buffer[:4], "big")
+                if len(self.buffer) < end:
+                    return
+                msg = ProtoMessage()
+                msg.ParseFromString(bytes(self.buffer[4:end]))
+                del self.buffer[:end]
+                if msg.payloadType == version_type:
+                    self.transport.write(frame(ProtoOAVersionRes(version="bench"), msg.clientMsgId))
+                elif msg.payloadType == subscribe_type:
+                    self.transport.write(frame(ProtoOASubscribeSpotsRes(ctidTraderAccountId=1), msg.clientMsgId))
+                    for start in range(0, messages, 1000):
+                        self.transport.write(spot * min(1000, messages - start))
+
+    return Server
+
+
+def _twisted_client(host, port, tls):
+    """ctrader_open_api.Client as the bot uses it, on a TCP or TLS endpoint of our choosing."""
+    from twisted.application.internet import ClientService
+    from twisted.internet import reactor
+    from twisted.internet.endpoints import clientFromString
+    from ctrader_open_api import Client, TcpProtocol
+    from ctrader_open_api.factory import Factory
+
+    class BenchClient(Client):
+        def __init__(self):
+            self._runningReactor = reactor
+            self.numberOfMessagesToSendPerSecond = 10 ** 6
+            endpoint = clientFromString(reactor, f"{'ssl' if tls else 'tcp'}:{host}:{port}")
+            ClientService.__init__(self, endpoint, Factory.forProtocol(TcpProtocol, client=self))
+            self._events = dict()
+            self._responseDeferreds = dict()
+            self.isConnected = False
+
+    return BenchClient()
+
+
+def _asyncio_client(host, port, tls):
+    import ssl
+    from .transport import AsyncioClient
+
+    context = None
+    if tls:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return AsyncioClient(host, port, numberOfMessagesToSendPerSecond=10 ** 6, use_ssl=context)
+
+
+async def _measure(client, messages: int, requests: int) -> dict:
+    import asyncio
+    import time
+    from twisted.internet.defer import Deferred
+    from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+        ProtoOASpotEvent, ProtoOASubscribeSpotsReq, ProtoOAVersionReq,
+    )
+
+    loop = asyncio.get_running_loop()
+    spot_type = ProtoOASpotEvent().payloadType
+    state = {"spots": 0, "first": None, "done": loop.create_future()}
+
+    def on_message(_, msg):
+        if msg.payloadType == spot_type:
+            if state["first"] is None:
+                state["first"] = time.perf_counter()
+            state["spots"] += 1
+            if state["spots"] == messages and not state["done"].done():
+                state["done"].set_result(time.perf_counter())
+
+    client.setMessageReceivedCallback(on_message)
+    client.startService()
+    await Deferred.asFuture(client.whenConnected(), loop)
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await Deferred.asFuture(client.send(ProtoOAVersionReq()), loop)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    client.send(ProtoOASubscribeSpotsReq(ctidTraderAccountId=1, symbolId=[1]))
+    finished = await asyncio.wait_for(state["done"], 120)
+    client.stopService()
+
+    latencies.sort()
+    return {
+        # From the first spot on, so the send scheduling of the subscribe request doesn't count
+        "spots_per_s": (messages - 1) / (finished - state["first"]) if messages > 1 else None,
+        "latency_ms_median": latencies[len(latencies) // 2] if latencies else None,
+        "latency_ms_max": latencies[-1] if latencies else None,
+    }
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compare the Twisted and asyncio Open API transports")
+    parser.add_argument("--messages", type=int, default=50_000, help="spot events pushed by the server")
+    parser.add_argument("--requests", type=int, default=10, help="sequential request/response round trips")
+    parser.add_argument("--tls", nargs=2, metavar=("CERT", "KEY"), help="serve TLS with this certificate")
+    parser.add_argument("--uvloop", action="store_true", help="run on uvloop (if installed)")
+    parser.add_argument("--only", choices=("twisted", "asyncio"))
+    args = parser.parse_args()
+
+    from .bridge import setup_asyncio_reactor
+    loop = setup_asyncio_reactor(use_uvloop=args.uvloop)
+
+    import asyncio
+    import ssl
+    from twisted.internet import reactor
+    from twisted.internet.defer import Deferred
+
+    async def run():
+        context = None
+        if args.tls:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(*args.tls)
+        server = await loop.create_server(_server_factory(args.messages), "127.0.0.1", 0, ssl=context)
+        port = server.sockets[0].getsockname()[1]
+        results = {}
+        for name, make in (("twisted", _twisted_client), ("asyncio", _asyncio_client)):
+            if args.only in (None, name):
+                results[name] = await _measure(make("127.0.0.1", port, bool(args.tls)), args.messages, args.requests)
+        server.close()
+        return results
+
+    out = {}
+
+    def _start():
+        d = Deferred.fromFuture(asyncio.ensure_future(run()))
+        d.addCallback(out.update)
+        d.addErrback(lambda f: out.update(error=f.getTraceback()))
+        d.addBoth(lambda _: reactor.stop())
+
+    reactor.callWhenRunning(_start)
+    reactor.run()
+
+    if "error" in out:
+        print(f"[TRANSPORT] Benchmark failed:\n{out['error']}")
+        return
+    print(f"[TRANSPORT] loop: {type(loop).__module__}.{type(loop).__name__}, "
+          f"{'TLS' if args.tls else 'plain TCP'}")
+    for name, r in out.items():
+        print(f"[TRANSPORT] {name:>8}: {r['spots_per_s']:10.0f} spots/s | request latency "
+              f"median {r['latency_ms_median']:.2f} ms, max {r['latency_ms_max']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,14 @@ import uvicorn
 import threading
 from fastapi import FastAPI, Header, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 
 # --- Only import what's needed for the reactor setup and FastAPI app ---
 from ctraderbot.bridge import setup_asyncio_reactor
+from ctraderbot.api.read import build_read_router
+from ctraderbot.api.stream import PositionStream
+from ctraderbot.shm_books import SharedBooksReader
+from ctraderbot.settings import SHARED_BOOKS, SHARED_BOOKS_NAME
 
 # --- Main Application Setup ---
 
@@ -20,56 +25,35 @@ bot_instance: "SimpleBot" = None
 # 1. Set up the FastAPI app
 app = FastAPI(title="cTrader Bot Control API")
 
+# With SHARED_BOOKS, live books are read from the bot's shared-memory segment (this or another process)
+shared_books = SharedBooksReader(SHARED_BOOKS_NAME) if SHARED_BOOKS else None
+
+# Read-only dashboard endpoints: /positions, /trade-couples, /trades, /trade-details, /segments
+app.include_router(build_read_router(lambda: bot_instance, shared_books))
+
 ####### WEBSOCKET SYNTAX START ##########
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
-        try:
-            await websocket.accept()
-            self.active_connections.append(websocket)
-        except Exception as e:
-            print(f"[!] WebSocket accept failed: {e}")
-
-
-    async def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
-    async def broadcast(self, data: dict):
-        to_remove = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(data)
-            except RuntimeError:
-                # Client already disconnected
-                to_remove.append(connection)
-            except Exception as e:
-                print(f"[!] Unexpected WebSocket error: {e}")
-                to_remove.append(connection)
-        for conn in to_remove:
-            # In some versions of FastAPI/Starlette, this can error if already disconnected
-            # So we just remove it from our list.
-            if conn in self.active_connections:
-               self.active_connections.remove(conn)
-
-
-manager = ConnectionManager()
+# Snapshot on connect, then sequence-numbered deltas (see ctraderbot/api/stream.py)
+stream = PositionStream(lambda: bot_instance, shared_books)
 
 @app.websocket("/ws/positions")
-async def positions_stream(websocket: WebSocket):
-    await manager.connect(websocket)
+async def positions_stream(websocket: WebSocket, encoding: str = "json"):
+    if not await stream.connect(websocket, encoding):
+        return
     try:
         while True:
-            # Keep the connection alive
-            await websocket.receive_text()
+            # Clients send "resync" after a sequence gap; anything else keeps the connection alive
+            if (await websocket.receive_text()).strip() == "resync":
+                await stream.resync(websocket)
     except WebSocketDisconnect:
-        await manager.disconnect(websocket)
+        stream.disconnect(websocket)
 
 @app.post("/broadcast")
 async def broadcast_endpoint(data: dict):
-    await manager.broadcast(data)
-    return {"status": "sent", "data": data}
+    """Position updates pushed by the bot (one position's dashboard fields)."""
+    if data.get("positionId") is None:
+        raise HTTPException(status_code=422, detail="positionId is required")
+    await stream.publish("positions", data["positionId"], data)
+    return {"status": "sent", "seq": stream.seq}
 
 ####### WEBSOCKET SYNTAX END ##########
 
@@ -77,9 +61,12 @@ async def broadcast_endpoint(data: dict):
 async def emergency_stop(authorization: str = Header(None)):
     """
     API endpoint to trigger the emergency stop of all trades.
-    Requires a secret token for authorization.
+    Requires a secret token for authorization. Waits until every position
+    is closed (or EMERGENCY_STOP_TIMEOUT passes) and returns the report.
     """
+    import asyncio
     from twisted.internet import reactor
+    from twisted.internet.threads import blockingCallFromThread
     from ctraderbot.settings import BOT_API_TOKEN
 
     if authorization != f"Bearer {BOT_API_TOKEN}":
@@ -88,10 +75,40 @@ async def emergency_stop(authorization: str = Header(None)):
     if not bot_instance or not reactor.running:
         raise HTTPException(status_code=503, detail="Bot is not currently running.")
     
-    # Safely call the bot's method from the API's thread into the bot's (Twisted) thread
-    reactor.callFromThread(bot_instance.emergency_stop_all_trades)
-    
-    return {"status": "ok", "message": "Emergency stop signal sent to the bot."}
+    # Run the stop on the bot's (Twisted) thread and wait for its Deferred without blocking this loop
+    report = await asyncio.to_thread(blockingCallFromThread, reactor, bot_instance.emergency_stop_all_trades)
+    status_code = 200 if report["flat"] else 504
+    return JSONResponse(status_code=status_code, content={"status": "ok" if report["flat"] else "incomplete", **report})
+
+
+@app.get("/health")
+async def health():
+    """
+    Connection health: RTT, heartbeat counts, message gaps and PnL feed staleness.
+    Responds 503 when the bot is not running or its session is down.
+    """
+    from ctraderbot.bot.health import health_snapshot
+
+    if not bot_instance:
+        return JSONResponse(status_code=503, content={"status": "down", "detail": "Bot is not running."})
+
+    snapshot = health_snapshot(bot_instance)
+    status_code = 503 if snapshot["status"] == "down" else 200
+    return JSONResponse(status_code=status_code, content=snapshot)
+
+
+@app.get("/trades/{trade_id}/events")
+def trade_events(trade_id: int, after_id: int = 0, limit: int = 200):
+    """
+    A trade's event timeline (liquidations, successes, ...) in order.
+    Page with `after_id` = the last id of the previous page.
+    """
+    from ctraderbot.helpers import fetch_trade_timeline
+
+    limit = min(max(limit, 1), 1000)
+    events = fetch_trade_timeline(trade_id, after_id, limit)
+    next_after_id = events[-1]["id"] if len(events) == limit else None
+    return {"trade_id": trade_id, "events": events, "next_after_id": next_after_id}
 
 
 def run_api_server():
@@ -108,11 +125,11 @@ def main():
     loop = setup_asyncio_reactor()
 
     # --- Step 2: Now that the reactor is installed, import everything else. ---
-    from ctrader_open_api import Client, TcpProtocol
     from ctraderbot.bot.simple_bot import SimpleBot
+    from ctraderbot.transport import build_client
     from ctraderbot.database import engine, Base
     from ctraderbot.helpers import fetch_access_token, fetch_main_account
-    from ctraderbot.settings import HOST, PORT, SYMBOL_ID
+    from ctraderbot.settings import SYMBOL_ID
 
     # --- Step 3: DB bootstrap ---
     async def bootstrap():
@@ -130,7 +147,8 @@ def main():
     print(f"[DEBUG] Token retrieved | Account PK: {account_pk} | Account ID: {account_id}")
 
     # --- Step 4: Create the bot instance ---
-    client = Client(HOST, PORT, TcpProtocol)
+    # Twisted's ctrader_open_api.Client or the asyncio transport (OPENAPI_TRANSPORT)
+    client = build_client()
     # Note: We call SimpleBot with the correct number of arguments here.
     bot_instance = SimpleBot(client, token, account_pk, account_id, SYMBOL_ID)
     
@@ -0,0 +1,50 @@
+# file: setup/create_bot_tables.py
+"""
+Creates the tables the bot owns in the botcore_* schema:
+
+    botcore_botlease   leader election lease (ctraderbot/bot/leader.py)
+    botcore_eventlog   trade event timeline (ctraderbot/bot/event_log.py)
+
+The rest of the schema comes from the Django project's botcore app.
+Tables that already exist are left alone.
+
+    python setup/create_bot_tables.py          # create them on MYSQL_SYNC_URL
+    python setup/create_bot_tables.py --sql    # print the DDL only, e.g. for a
+                                              # RunSQL operation in a botcore migration
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy.schema import CreateIndex, CreateTable  # noqa: E402
+
+from ctraderbot.database import Base, SyncEngine  # noqa: E402
+from ctraderbot.models import BotLease, EventLog  # noqa: E402
+
+TABLES = [BotLease.__table__, EventLog.__table__]
+
+
+def print_ddl():
+    for table in TABLES:
+        print(f"{str(CreateTable(table).compile(SyncEngine)).strip()};\n")
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            print(f"{str(CreateIndex(index).compile(SyncEngine)).strip()};")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create the bot-owned botcore tables")
+    parser.add_argument("--sql", action="store_true", help="print the DDL instead of running it")
+    args = parser.parse_args()
+
+    if args.sql:
+        print_ddl()
+        return
+    Base.metadata.create_all(SyncEngine, tables=TABLES, checkfirst=True)
+    print(f"Tables present: {', '.join(t.name for t in TABLES)}")
+
+
+if __name__ == "__main__":
+    main()
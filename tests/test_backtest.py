@@ -0,0 +1,23 @@
+import numpy as np
+
+from ctraderbot.backtest.engine import run_backtest
+
+# 1 lot = 100000 units, so one price point is one unit of account currency
+LADDER = [{"id": 1, "starting_balance": 100, "ending_balance": 200, "lot_size": 1}]
+
+
+def ramp(start, stop):
+    bid = np.arange(start, stop + 1, dtype=np.int64)
+    return {"bid": bid, "ask": bid.copy()}
+
+
+def test_legs_are_held_against_half_the_segment_balance():
+    # Up 151 points: the short is liquidated at -50 (half of 100), then the long passes 200 - 50
+    stats = run_backtest(ramp(108_000, 108_151), LADDER, 1, {"ending_level": 200})
+
+    assert stats["legs_liquidated"] == 1 and stats["legs_successful"] == 1
+    assert stats["trades_successful"] == 1
+    assert stats["realised_pnl"] == -50 + 151
+    # The trade ended on 50 + 151, past the ending level
+    assert stats["segments_successful"] == 1
+
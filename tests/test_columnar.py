@@ -0,0 +1,32 @@
+import numpy as np
+
+from ctraderbot.history.columnar import DAY_MS, DTYPE, append_rows, last_timestamp, partition_rows, read_range
+
+NAMES = ["ts", "bid"]
+
+
+def test_rows_split_into_daily_partitions(tmp_path):
+    ts = np.array([DAY_MS - 2, DAY_MS - 1, DAY_MS, DAY_MS + 5])
+    assert append_rows(tmp_path, {"ts": ts, "bid": ts * 10}) == 4
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["1970-01-01", "1970-01-02"]
+    rows = read_range(tmp_path, NAMES, DAY_MS - 1, DAY_MS + 1)
+    assert rows["ts"].tolist() == [DAY_MS - 1, DAY_MS]
+    assert rows["bid"].tolist() == [(DAY_MS - 1) * 10, DAY_MS * 10]
+    assert last_timestamp(tmp_path, NAMES) == DAY_MS + 5
+
+
+def test_append_realigns_columns_left_uneven(tmp_path):
+    append_rows(tmp_path, {"ts": np.array([1, 2]), "bid": np.array([10, 20])})
+    # An append interrupted after the ts column was written
+    day = tmp_path / "1970-01-01"
+    with open(day / "ts.i64", "ab") as f:
+        f.write(np.array([3], dtype=DTYPE).tobytes())
+    assert partition_rows(day, NAMES) == 2
+
+    append_rows(tmp_path, {"ts": np.array([4]), "bid": np.array([40])})
+
+    rows = read_range(tmp_path, NAMES, 0, DAY_MS)
+    assert rows["ts"].tolist() == [1, 2, 4]
+    assert rows["bid"].tolist() == [10, 20, 40]
+    assert (day / "ts.i64").stat().st_size == (day / "bid.i64").stat().st_size
@@ -0,0 +1,67 @@
+from types import SimpleNamespace
+
+import pytest
+from ctrader_open_api.messages.OpenApiCommonMessages_pb2 import ProtoHeartbeatEvent, ProtoMessage
+from ctrader_open_api.messages.OpenApiMessages_pb2 import (
+    ProtoOAAssetListRes, ProtoOAReconcileRes, ProtoOASpotEvent, ProtoOATraderUpdatedEvent,
+)
+
+from ctraderbot.bot import decoding, event_handlers
+from ctraderbot.bot.health import new_health_stats
+
+
+def frame(message):
+    return ProtoMessage(payloadType=message.payloadType, payload=message.SerializeToString())
+
+
+@pytest.fixture
+def bot():
+    return SimpleNamespace(health=new_health_stats(), decoding=decoding.new_decode_stats())
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """Replaces the spot handler with one that records what it decoded."""
+    seen = []
+    monkeypatch.setitem(event_handlers._HANDLERS, ProtoOASpotEvent().payloadType,
+                        lambda bot, msg: seen.append(decoding.decode(msg)))
+    return seen
+
+
+def test_handled_type_is_decoded_and_dispatched(bot, handled):
+    spot = ProtoOASpotEvent(ctidTraderAccountId=1, symbolId=1, bid=108_000, ask=108_010)
+    event_handlers.on_message(bot, frame(spot))
+
+    assert handled == [spot]
+    assert bot.decoding["decoded"] == {spot.payloadType: 1}
+    assert bot.health["messages_received"] == 1
+
+
+def test_ignored_types_are_counted_without_a_handler(bot, handled):
+    for message in (ProtoHeartbeatEvent(), ProtoHeartbeatEvent(), ProtoOAReconcileRes(ctidTraderAccountId=1)):
+        event_handlers.on_message(bot, frame(message))
+
+    assert handled == []
+    assert decoding.decode_snapshot(bot)["ignored"] == {"ProtoHeartbeatEvent": 2, "ProtoOAReconcileRes": 1}
+    assert bot.decoding["decoded"] == {}
+    assert bot.health["heartbeats_received"] == 2
+
+
+def test_unknown_type_is_counted_as_unhandled(bot, handled):
+    event_handlers.on_message(bot, frame(ProtoOAAssetListRes(ctidTraderAccountId=1)))
+
+    assert decoding.decode_snapshot(bot)["unhandled"] == {"ProtoOAAssetListRes": 1}
+    assert handled == []
+
+
+def test_handler_table_and_ignored_set_do_not_overlap():
+    assert not decoding.IGNORED & set(event_handlers._HANDLERS)
+    assert ProtoOATraderUpdatedEvent().payloadType in event_handlers._HANDLERS
+
+
+def test_decode_uses_the_cached_message_class():
+    spot = ProtoOASpotEvent(ctidTraderAccountId=1, symbolId=1, bid=108_000, ask=108_010)
+    assert decoding.decode(frame(spot)) == spot
+    assert decoding.message_class(spot.payloadType) is ProtoOASpotEvent
+    assert decoding.message_class(65_000) is None
+    assert decoding.payload_name(65_000) == "65000"
@@ -0,0 +1,64 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from ctraderbot.money import api_money, halve, to_decimal, to_float, to_money
+from ctraderbot.money_bench import decimal_pnl_path, money_pnl_path
+
+
+@pytest.mark.parametrize("value, expected", [
+    (Decimal("1234.5600"), 12_345_600),
+    ("0.00005", 0),           # half-even: 0.0000|5 -> 0.0000
+    ("0.00015", 2),           # half-even: 0.0001|5 -> 0.0002
+    ("-0.00015", -2),
+    (0.1, 1_000),
+    (Decimal(12), 120_000),
+    (None, None),
+])
+def test_to_money_rounds_half_even(value, expected):
+    assert to_money(value) == expected
+
+
+@pytest.mark.parametrize("value", [12, 120_000, True])
+def test_to_money_refuses_ints(value):
+    with pytest.raises(TypeError):
+        to_money(value)
+
+
+@pytest.mark.parametrize("amount, digits, expected", [
+    (12_345, 2, 1_234_500),
+    (123_456_789, 8, 12_346),    # 1.23456789 -> 1.2346
+    (50, 6, 0),                  # 0.00005 -> 0.0000
+    (150, 6, 2),                 # 0.00015 -> 0.0002
+    (-150, 6, -2),
+])
+def test_api_money_scales_and_rounds_half_even(amount, digits, expected):
+    assert api_money(amount, digits) == expected
+
+
+def test_conversions_round_trip():
+    assert to_decimal(12_345_600) == Decimal("1234.5600")
+    assert to_money(to_decimal(-987_654_321)) == -987_654_321
+    assert to_float(12_345_600) == 1234.56
+    assert to_decimal(None) is None
+
+
+def test_halve_rounds_half_even():
+    assert [halve(n) for n in (4, 5, 7, -5)] == [2, 2, 4, -2]
+
+
+def test_threshold_path_matches_exact_decimal():
+    """Random ticks on and next to the liquidation and profit thresholds."""
+    rng = random.Random(1)
+    for _ in range(20_000):
+        digits = rng.choice((2, 2, 2, 4))
+        balance = Decimal(rng.randint(1, 5_000_000)).scaleb(-2)   # DECIMAL column values
+        ending = balance + Decimal(rng.randint(1, 5_000_000)).scaleb(-2)
+        target = rng.choice((-balance, ending - balance, Decimal(rng.randint(-10**6, 10**6)).scaleb(-2)))
+        net_pnl = int(target.scaleb(digits)) + rng.choice((-1, 0, 0, 1))
+
+        outcome, result = decimal_pnl_path(net_pnl, digits, balance, ending)
+        # A liquidated leg leaves int 0, whole units
+        exact = (outcome, None if result is None else to_money(Decimal(result)))
+        assert money_pnl_path(net_pnl, digits, to_money(balance), to_money(ending)) == exact
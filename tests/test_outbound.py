@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionLost
+
+from ctraderbot.bot import outbound
+from ctraderbot.bot.leader import new_leader_state
+
+
+class FakeClient:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message, **kwargs):
+        d = Deferred()
+        self.sent.append((message, d))
+        return d
+
+
+def make_bot(session_ready=True, leader=True):
+    return SimpleNamespace(client=FakeClient(), is_session_ready=session_ready,
+                           outbound=outbound.new_outbound_state(), leader=new_leader_state(enabled=not leader))
+
+
+@pytest.fixture(autouse=True)
+def no_timers(monkeypatch):
+    # Drains that would wait for tokens are recorded instead of scheduled
+    monkeypatch.setattr(outbound.reactor, "callLater", lambda delay, *a: SimpleNamespace(
+        delay=delay, active=lambda: False, cancel=lambda: None))
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    # Frozen unless a test advances it, so buckets only refill when asked to
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(outbound, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def sent(bot):
+    return [message for message, _ in bot.client.sent]
+
+
+def test_held_requests_leave_in_priority_order_once_the_session_is_ready():
+    bot = make_bot(session_ready=False)
+    for priority in reversed(outbound.PRIORITIES):
+        outbound.send(bot, priority, priority)
+    assert sent(bot) == [outbound.SESSION]
+
+    bot.is_session_ready = True
+    outbound.session_ready(bot)
+    assert sent(bot) == list(outbound.PRIORITIES)
+
+
+def test_token_bucket_limits_what_reaches_the_client():
+    bot = make_bot()
+    bot.outbound["buckets"]["all"]["tokens"] = 1
+    outbound.send(bot, "a", outbound.ROUTINE)
+    outbound.send(bot, "b", outbound.ROUTINE)
+
+    assert sent(bot) == ["a"]
+    assert bot.outbound["drain_call"].delay > 0
+    assert outbound.outbound_snapshot(bot)[outbound.ROUTINE]["depth"] == 1
+
+
+def test_coalesced_requests_share_one_send_and_response():
+    bot = make_bot(session_ready=False)
+    responses = []
+    for _ in range(3):
+        outbound.send(bot, "pnl", outbound.ROUTINE, coalesce="pnl").addCallback(responses.append)
+
+    bot.is_session_ready = True
+    outbound.session_ready(bot)
+    assert sent(bot) == ["pnl"]
+    bot.client.sent[0][1].callback("res")
+    assert responses == ["res", "res", "res"]
+    assert outbound.outbound_snapshot(bot)[outbound.ROUTINE]["coalesced"] == 2
+
+
+def test_request_past_max_wait_goes_ahead_of_higher_classes(clock):
+    bot = make_bot(session_ready=False)
+    outbound.send(bot, "poll", outbound.ROUTINE)
+    clock.value += outbound.OUTBOUND_MAX_WAIT_SECONDS
+    outbound.send(bot, "open", outbound.OPEN)
+    bot.outbound["buckets"]["all"].update(tokens=1, refilled_at=clock.value)
+
+    bot.is_session_ready = True
+    outbound.session_ready(bot)
+    assert sent(bot) == ["poll"]
+    assert outbound.outbound_snapshot(bot)[outbound.ROUTINE]["aged"] == 1
+
+
+def test_fail_queued_errbacks_waiting_requests():
+    bot = make_bot(session_ready=False)
+    failures = []
+    outbound.send(bot, "open", outbound.OPEN).addErrback(failures.append)
+    outbound.fail_queued(bot, "session lost")
+
+    assert [f.type for f in failures] == [ConnectionLost]
+    assert outbound.outbound_snapshot(bot)[outbound.OPEN]["depth"] == 0
+
+
+def test_opens_and_closes_are_dropped_after_losing_the_lease():
+    bot = make_bot(session_ready=False, leader=False)
+    failures = []
+    for priority in (outbound.OPEN, outbound.CLOSE):
+        outbound.send(bot, priority, priority, coalesce=priority).addErrback(failures.append)
+    outbound.send(bot, "poll", outbound.ROUTINE)
+
+    bot.is_session_ready = True
+    outbound.session_ready(bot)
+
+    assert [f.type for f in failures] == [outbound.NotLeader, outbound.NotLeader]
+    assert [m for m, _ in bot.client.sent] == ["poll"]
+    assert bot.outbound["coalesce"] == {}
+    snapshot = outbound.outbound_snapshot(bot)
+    assert snapshot[outbound.OPEN]["not_leader"] == snapshot[outbound.CLOSE]["not_leader"] == 1
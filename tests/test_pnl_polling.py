@@ -0,0 +1,15 @@
+from ctraderbot.bot import pnl_polling
+from ctraderbot.settings import OUTBOUND_RATE_PER_SECOND, PNL_POLL_MAX_INTERVAL, PNL_POLL_MAX_SHARE
+
+
+def test_interval_runs_from_max_when_far_to_min_when_near():
+    assert pnl_polling.interval_for_margin(None) == PNL_POLL_MAX_INTERVAL
+    assert pnl_polling.interval_for_margin(1.0) == PNL_POLL_MAX_INTERVAL
+    assert pnl_polling.interval_for_margin(0.0) == pnl_polling._MIN_INTERVAL
+    mid = pnl_polling.interval_for_margin(0.35)
+    assert pnl_polling._MIN_INTERVAL < mid < PNL_POLL_MAX_INTERVAL
+
+
+def test_min_interval_is_sub_second_within_the_outbound_budget():
+    assert pnl_polling._MIN_INTERVAL < 1.0
+    assert 1 / pnl_polling._MIN_INTERVAL <= OUTBOUND_RATE_PER_SECOND * PNL_POLL_MAX_SHARE + 1e-9
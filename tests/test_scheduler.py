@@ -0,0 +1,57 @@
+import datetime as dt
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from ctraderbot.bot import scheduler
+
+UTC = dt.timezone.utc
+
+
+def test_parse_cron_lists_ranges_steps():
+    cron = scheduler.parse_cron("*/15 9-10 * * 1,7")
+    assert cron["minute"] == {0, 15, 30, 45}
+    assert cron["hour"] == {9, 10}
+    assert cron["dow"] == {0, 1}          # 7 is Sunday
+    with pytest.raises(ValueError):
+        scheduler.parse_cron("0 24 * * *")
+
+
+def test_cron_follows_dst_in_named_timezone():
+    cron = scheduler.parse_cron("0 19 * * *")
+    london = ZoneInfo("Europe/London")
+    summer = scheduler.next_cron_time(cron, dt.datetime(2026, 7, 1, tzinfo=UTC), london)
+    winter = scheduler.next_cron_time(cron, dt.datetime(2026, 12, 1, tzinfo=UTC), london)
+    assert summer == dt.datetime(2026, 7, 1, 18, tzinfo=UTC)
+    assert winter == dt.datetime(2026, 12, 1, 19, tzinfo=UTC)
+
+
+def test_cron_without_timezone_uses_local_time():
+    cron = scheduler.parse_cron("0 19 * * *")
+    fire_at = scheduler.next_cron_time(cron, dt.datetime(2026, 7, 1, tzinfo=UTC), None)
+    local = fire_at.astimezone()
+    assert (local.hour, local.minute) == (19, 0)
+
+
+def test_task_cancelled_during_its_run_is_not_rearmed():
+    bot = SimpleNamespace(tasks={})
+    task = scheduler.schedule_interval(bot, "job", 60, lambda: scheduler.cancel_task(bot, "job"))
+    scheduler._cancel_timer(task)
+
+    scheduler._fire_interval(task)
+
+    assert task["timer"] is None
+    assert "job" not in bot.tasks
+    assert task["stats"]["runs"] == 1
+
+
+def test_task_keeps_running_when_not_cancelled():
+    bot = SimpleNamespace(tasks={})
+    task = scheduler.schedule_interval(bot, "job", 60, lambda: None)
+    scheduler._cancel_timer(task)
+
+    scheduler._fire_interval(task)
+
+    assert task["timer"].active()
+    scheduler.cancel_all_tasks(bot)
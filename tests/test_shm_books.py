@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+from ctraderbot import shm_books
+from ctraderbot.shm_books import SharedBooksReader, SharedBooksWriter
+
+SYMBOL = {"digits": 5, "lot_size": 10_000_000}
+
+
+@pytest.fixture
+def segment():
+    name = f"ctraderbot_books_test_{os.getpid()}"
+    writer = SharedBooksWriter(name, slots=4)
+    reader = SharedBooksReader(name)
+    yield writer, reader
+    reader.close()
+    writer.close(unlink=True)
+
+
+def position(side, net):
+    return {"symbolId": 1, "volume": 100_000, "entry_price": 1.08, "used_margin": 2_160, "swap": 0,
+            "status": "OPEN", "tradeSide": side, "total_balance": 5_000_000,
+            "unrealisedNetProfit": net, "grossUnrealisedProfit": net}
+
+
+def test_books_round_trip(segment):
+    writer, reader = segment
+    positions = {11: position(1, -1_234), 12: position(2, 1_234)}
+    couples = {7: {"trade_id": 7, "ending_balance": 20_000_000, "resulted_balance": None,
+                   "long_position_id": 11, "long_status": "running",
+                   "short_position_id": 12, "short_status": "liquidated"}}
+    writer.publish(positions, couples, 1.0825, lambda _: SYMBOL)
+
+    books = reader.books()
+    assert books["summary"]["writer_pid"] == os.getpid()
+    assert books["summary"]["latest_price"] == 1.0825
+    assert books["positions"][11]["unrealisedNetProfit"] == -1_234
+    assert books["positions"][12]["status"] == "OPEN"
+    assert books["positions"][12]["symbol"] == SYMBOL
+    assert books["trade_couples"] == couples
+
+
+def test_publish_writes_only_changes_and_frees_slots(segment):
+    writer, reader = segment
+    positions = {11: position(1, 0), 12: position(2, 0)}
+    assert writer.publish(positions, {}) == 2
+    assert writer.publish(positions, {}) == 0
+
+    positions[11]["unrealisedNetProfit"] = 50
+    del positions[12]
+    assert writer.publish(positions, {}) == 2
+    assert set(reader.books()["positions"]) == {11}
+
+
+def test_reader_never_sees_a_record_mid_write(segment, monkeypatch):
+    monkeypatch.setattr(shm_books, "_READ_TRIES", 50)
+    writer, reader = segment
+    writer.publish({11: position(1, 0)}, {})
+    offset = writer.positions["offset"]
+    seq = int.from_bytes(writer.buf[offset:offset + 8], "little")
+    # Leave the record's seqlock odd, as if the writer stopped halfway
+    writer.buf[offset:offset + 8] = (seq | 1).to_bytes(8, "little")
+    reader.attach()
+    with pytest.raises(RuntimeError, match="kept changing"):
+        reader.positions()
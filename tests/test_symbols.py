@@ -0,0 +1,31 @@
+import pytest
+
+from ctraderbot.strategy import order_volume
+from ctraderbot.symbols import make_symbol, lots_to_volume, pips_between
+
+EURUSD = make_symbol(name="EURUSD", lot_size=10_000_000, min_volume=100_000, step_volume=100_000,
+                     max_volume=1_000_000_000)
+
+
+def test_lots_round_down_to_step():
+    assert lots_to_volume(EURUSD, "0.01") == 100_000
+    assert lots_to_volume(EURUSD, "0.019") == 100_000
+    assert order_volume("0.25", EURUSD) == 2_500_000
+
+
+def test_lots_are_capped_at_max_volume():
+    assert lots_to_volume(EURUSD, 500) == 1_000_000_000
+
+
+def test_lots_below_min_volume_are_refused():
+    with pytest.raises(ValueError, match="below the minimum"):
+        lots_to_volume(EURUSD, "0.005")
+    with pytest.raises(ValueError):
+        order_volume(0, EURUSD)
+
+
+def test_pips_follow_pip_position():
+    jpy = make_symbol(name="USDJPY", digits=3, pip_position=2)
+    assert pips_between(EURUSD, "1.10000", "1.10125") == pytest.approx(12.5)
+    assert pips_between(EURUSD, "1.10000", "1.10125", is_short=True) == pytest.approx(-12.5)
+    assert pips_between(jpy, "150.000", "149.900") == pytest.approx(-10)
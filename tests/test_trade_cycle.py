@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import select
+
+from ctraderbot import trade_cycle
+from ctraderbot.models import Constant, Milestone, Segments, Subaccount, Trades
+from ctraderbot.scratch_db import bound_sessions, scratch_sessionmaker
+
+
+@pytest.fixture
+def db():
+    factory = scratch_sessionmaker("sqlite://", [Subaccount.__table__, Constant.__table__, Milestone.__table__,
+                                                 Segments.__table__, Trades.__table__])
+    with factory() as s:
+        s.add(Milestone(id=1, starting_balance=Decimal("100"), loss=Decimal("100"), profit_goal=Decimal("100"),
+                        lot_size=Decimal("0.01"), ending_balance=Decimal("200")))
+        s.add(Constant(variable='initial_level', value='1', is_active=True))
+        s.commit()
+    with bound_sessions(factory, trade_cycle):
+        yield factory
+
+
+def set_pivot_balance(factory, balance):
+    with factory() as s:
+        pivot = s.scalars(select(Segments).where(Segments.is_pivot == True)).one()  # noqa: E712
+        pivot.total_balance = balance
+        s.commit()
+
+
+def test_first_cycle_creates_the_pivot_and_its_trade(db):
+    cycle = trade_cycle.start_trade_cycle(1)
+
+    assert cycle.segment.is_pivot and cycle.pivot_balance is None
+    assert cycle.trade.segment_id == cycle.segment.id
+    assert cycle.trade.starting_balance == Decimal("100")
+    with db() as s:
+        assert s.query(Segments).count() == s.query(Trades).count() == 1
+
+
+def test_pivot_splits_only_once_it_has_doubled(db):
+    trade_cycle.start_trade_cycle(1)
+    set_pivot_balance(db, Decimal("199.9999"))
+    assert trade_cycle.start_trade_cycle(1) is None
+
+    set_pivot_balance(db, Decimal("250"))
+    cycle = trade_cycle.start_trade_cycle(1)
+    assert cycle.pivot_balance == Decimal("100")
+    assert not cycle.segment.is_pivot
+    assert cycle.trade.starting_balance == Decimal("150")
+    with db() as s:
+        assert s.query(Segments).count() == s.query(Trades).count() == 2
+
+
+def test_missing_initial_level_raises(db):
+    with db() as s:
+        s.query(Constant).delete()
+        s.commit()
+    with pytest.raises(RuntimeError):
+        trade_cycle.start_trade_cycle(1)